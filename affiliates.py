@@ -0,0 +1,84 @@
+import re
+
+from metrics import timed
+
+# Affiliate links
+affiliate_links = {
+    "mixer": "https://amzn.to/44QqzQf",
+    "mixing bowl": "https://amzn.to/3SepGJI",
+    "measuring cup": "https://amzn.to/44h5HBt",
+    "spatula": "https://amzn.to/4iILIiP",
+    "scale": "https://amzn.to/4cUBs5t",
+    "rolling pin": "https://amzn.to/3Gy1mQv",
+    "6 inch pan": "https://amzn.to/4lRwo64",
+    "9 inch pan": "https://amzn.to/42xSUtc",
+    "cake decorating": "https://amzn.to/4lUd08m",
+    "whisk": "https://amzn.to/3GwiBlk",
+    "bench scraper": "https://amzn.to/3GzcuN2",
+    "loaf pan": "https://amzn.to/42XzcpD",
+    "almond flour": "https://amzn.to/4iCs3kx",
+    "no sugar added chocolate chips": "https://amzn.to/3SfqlKU",
+    "monk fruit sweetener": "https://amzn.to/4cSRP2u",
+    "coconut sugar": "https://amzn.to/42TZN6S",
+    "whole wheat flour": "https://amzn.to/4jAbpmQ",
+    "cake flour": "https://amzn.to/3YmwUz1",
+    "silicone baking mat": "https://amzn.to/4jJcRmI",
+    "avocado oil": "https://amzn.to/3EwlK43",
+    "digital thermometer": "https://amzn.to/42SIDXr",
+    "food storage containers": "https://amzn.to/4k1U7ip",
+    "baking sheet": "https://amzn.to/44ijPdO",
+    "hand mixer": "https://amzn.to/437UVwi",
+    "wire racks": "https://amzn.to/42Rghg3",
+    "cookie scoop": "https://amzn.to/3EH8Yjd",
+    "food processor": "https://amzn.to/4iLcbvY",
+    "matcha": "https://amzn.to/4d0bGwL",
+    "cocoa powder": "https://amzn.to/42WB3Lp"
+}
+
+class AffiliateMatcher:
+    """All affiliate keywords compiled into one case-insensitive alternation.
+
+    Keywords are ordered longest first, so at any position the longest
+    keyword wins ("hand mixer" over "mixer"). The reply is scanned once, left
+    to right; each keyword is linked at its first occurrence and at most
+    max_links keywords are linked per reply.
+    """
+
+    def __init__(self, links, max_links=4):
+        self.links = {keyword.lower(): url for keyword, url in links.items()}
+        self.max_links = max_links
+        keywords = sorted(self.links, key=len, reverse=True)
+        # The first-character lookahead lets the engine skip most positions
+        # without trying every alternative
+        first_chars = ''.join(sorted({re.escape(k[0]) for k in keywords}))
+        self.pattern = re.compile(
+            r"\b(?=[" + first_chars + r"])(" + "|".join(re.escape(k) for k in keywords) + r")\b",
+            re.IGNORECASE
+        )
+        self.longest = len(keywords[0])
+
+    def link(self, text):
+        """Return text with markdown links added in a single pass"""
+        linked = set()
+        out = []
+        pos = 0
+        for match in self.pattern.finditer(text):
+            keyword = match.group(1).lower()
+            if keyword in linked:
+                continue
+            linked.add(keyword)
+            out.append(text[pos:match.start()])
+            out.append(f"[{match.group(1)}]({self.links[keyword]})")
+            pos = match.end()
+            if len(linked) >= self.max_links:
+                break
+        if not out:
+            return text
+        out.append(text[pos:])
+        return ''.join(out)
+
+affiliate_matcher = AffiliateMatcher(affiliate_links)
+
+@timed('affiliate_links')
+def add_affiliate_links(text):
+    return affiliate_matcher.link(text)
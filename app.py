@@ -1,28 +1,44 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response, g
 from flask_cors import CORS
-import requests
 import os
 from openai import OpenAI
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
-import re
+import json
 import logging
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from functools import wraps
 import jsonschema
 from jsonschema import validate
-from passlib.hash import pbkdf2_sha256
 import jwt
 from datetime import datetime, timedelta
 import uuid
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from email_validator import validate_email, EmailNotValidError
 import secrets
-from flask_session import Session
+from session_store import create_session_interface
+from recipe_cache import create_recipe_cache, RecipeCache
+from semantic_cache import create_semantic_cache
+from conversation_context import create_conversation_context, ContextTooLarge
+from conversation_store import create_conversation_store, ConversationNotFound
+from http_client import get_http_session
+from spoonacular import create_spoonacular_client, EMPTY_RESULT, SpoonacularUnavailable
+from affiliates import add_affiliate_links, affiliate_matcher
+from ingredients import parse_ingredients
+from user_cache import create_user_cache
+from auth_cache import create_revocation_list, create_token_cache
+from mailer import create_mailer
+from password_hashing import create_password_hasher, PasswordHasherBusy
+from pantry import ListItemNotFound, apply_list_delta
+from sanitize import sanitize_input, sanitize_inputs
+from user_index import AlreadyRegistered, check_available, consume_token, create_user, find_token_user, find_user, issue_token
+from conditional import cache_headers, docs_etag, is_not_modified, payload_etag
+import metrics
+from metrics import firestore_timer, stage_timer, upstream_errors
+from streaming import AffiliateLinkStream, sse_event, wants_event_stream, SSE_HEADERS
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -56,28 +72,64 @@ except Exception as e:
     logger.error(f"Failed to initialize Firebase: {str(e)}")
     raise
 
+# Short-lived cache of users/{user_id} documents
+user_cache = create_user_cache(db)
+metrics.registry.register_stats('user', user_cache.stats)
+
 app = Flask(__name__)
 
-# Configure session
-app.config['SESSION_TYPE'] = 'filesystem'
+# Configure session: server-side store (SESSION_BACKEND=sqlite|redis) or stateless, JWT only
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
-Session(app)
-
-# Configure rate limiter
+app.session_interface = create_session_interface()
+
+# Configure rate limiter. Counters live in RATELIMIT_STORAGE_URI (e.g. redis://host:6379/1)
+# so limits hold across workers and instances; memory:// keeps them per process.
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+# Applied to every route without its own @limiter.limit (which overrides them)
+DEFAULT_RATE_LIMITS = ["200 per day", "50 per hour"]
+RATELIMIT_KEY_PREFIX = "kitchen"
 limiter = Limiter(
     app=app,
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
+    key_func=lambda: rate_limit_key(request_token(), get_remote_address()),
+    default_limits=DEFAULT_RATE_LIMITS,
+    storage_uri=RATELIMIT_STORAGE_URI,
+    strategy=os.getenv("RATELIMIT_STRATEGY", "moving-window"),
+    key_prefix=RATELIMIT_KEY_PREFIX,
+    in_memory_fallback_enabled=True
 )
 
 # Configure CORS with specific origins
 CORS(app, resources={r"/*": {"origins": os.getenv("ALLOWED_ORIGINS", "*").split(",")}})
 
+# Per-route latency, and the route label for Firestore timings made deeper down
+@app.before_request
+def start_request_timer():
+    g.metrics_started = time.perf_counter()
+    metrics.current_route.set(request.endpoint or 'unknown')
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        metrics.request_seconds.observe(
+            time.perf_counter() - started,
+            route=request.endpoint or 'unknown',
+            method=request.method,
+            status=response.status_code
+        )
+    return response
+
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
 JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
 
+# Verified tokens are cached until they expire; logout adds them to the revocation list
+token_cache = create_token_cache()
+revoked_tokens = create_revocation_list(db)
+revoked_tokens.start()
+metrics.registry.register_stats('auth', token_cache.stats)
+
 # Email Configuration
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT"))
@@ -85,6 +137,20 @@ SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 APP_URL = os.getenv("APP_URL")
 
+# Outgoing mail is spooled and sent by background workers over a reused connection
+mailer = create_mailer(SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD)
+mailer.start()
+metrics.registry.register_stats('smtp', mailer.stats, prefix='kitchen_mail', label='mailer', counters=('sent', 'failed', 'retries'))
+
+# Password hashing runs on a bounded process pool; PASSWORD_HASH_ROUNDS sets the cost
+password_hasher = create_password_hasher()
+metrics.registry.register_stats('pbkdf2', password_hasher.stats, prefix='kitchen_password_hash', label='scheme', counters=('rejected', 'timed_out', 'rehashed'))
+
+def hasher_busy_response():
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # JSON Schemas for request validation
 recipe_schema = {
     "type": "object",
@@ -134,9 +200,12 @@ gpt_request_schema = {
                 },
                 "required": ["role", "content"]
             }
-        }
+        },
+        # Alternatively just the new turn, with the history kept server-side
+        "message": {"type": "string", "minLength": 1},
+        "conversation_id": {"type": "string", "minLength": 1, "maxLength": 64}
     },
-    "required": ["messages"]
+    "anyOf": [{"required": ["messages"]}, {"required": ["message"]}]
 }
 
 # Authentication schemas
@@ -166,23 +235,45 @@ profile_schema = {
     }
 }
 
+# Batch recipe endpoints; Firestore allows at most 500 writes per batch
+FIRESTORE_BATCH_LIMIT = 500
+
+recipe_batch_schema = {
+    "type": "object",
+    "properties": {
+        "recipes": {"type": "array", "items": {"type": "object"}, "minItems": 1, "maxItems": 1000}
+    },
+    "required": ["recipes"]
+}
+
+recipe_delete_batch_schema = {
+    "type": "object",
+    "properties": {
+        "recipe_ids": {"type": "array", "items": {"type": "string", "minLength": 1}, "minItems": 1, "maxItems": 1000}
+    },
+    "required": ["recipe_ids"]
+}
+
+list_items_schema = {
+    "type": "object",
+    "properties": {
+        "items": {"type": "array", "items": {"type": "string", "minLength": 1}, "minItems": 1, "maxItems": 200}
+    },
+    "required": ["items"]
+}
+
+list_rename_schema = {
+    "type": "object",
+    "properties": {
+        "from": {"type": "string", "minLength": 1},
+        "to": {"type": "string", "minLength": 1}
+    },
+    "required": ["from", "to"]
+}
+
 def send_email(to_email, subject, body):
-    """Send email using configured SMTP server"""
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = SMTP_USERNAME
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'html'))
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send email: {str(e)}")
-        return False
+    """Queue an email for the background mailer; delivery happens off the request path"""
+    return mailer.send(to_email, subject, body)
 
 def generate_token(user_id, token_type='access'):
     """Generate JWT token for user"""
@@ -194,26 +285,51 @@ def generate_token(user_id, token_type='access'):
     }
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256')
 
-def verify_token(token):
-    """Verify JWT token"""
+def decode_token(token):
+    """Claims of a valid, unrevoked JWT, or None. Verified tokens are cached until they expire."""
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
-        return payload['user_id'], payload['type']
+        payload = token_cache.verify(token, lambda t: jwt.decode(t, JWT_SECRET_KEY, algorithms=['HS256']))
     except jwt.ExpiredSignatureError:
-        return None, None
+        return None
     except jwt.InvalidTokenError:
+        return None
+    if revoked_tokens.is_revoked(token):
+        return None
+    return payload
+
+def verify_token(token):
+    """Verify JWT token"""
+    payload = decode_token(token)
+    if payload is None:
         return None, None
+    return payload['user_id'], payload['type']
+
+def token_user_id(token):
+    """user_id of a valid access token, or None (routes where signing in is optional)"""
+    if token:
+        user_id, token_type = verify_token(token)
+        if user_id and token_type == 'access':
+            return user_id
+    return None
+
+def rate_limit_key(token, remote_addr):
+    """Rate limit per user for requests with a valid access token, per client IP otherwise"""
+    user_id = token_user_id(token)
+    return f"user:{user_id}" if user_id else f"ip:{remote_addr}"
+
+def request_token():
+    token = request.headers.get('Authorization')
+    if token and token.startswith('Bearer '):
+        token = token[7:]
+    return token
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
+        token = request_token()
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
         
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
         user_id, token_type = verify_token(token)
         if not user_id or token_type != 'access':
             return jsonify({'error': 'Invalid or expired token'}), 401
@@ -221,6 +337,16 @@ def token_required(f):
         return f(user_id, *args, **kwargs)
     return decorated
 
+def conditional_json(build, etag, last_modified=None):
+    """jsonify(build()) with ETag/Cache-Control headers, or an empty 304 when the
+    client already has this version. build is only called when a body is sent."""
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status=304, headers=headers)
+    response = jsonify(build())
+    response.headers.update(headers)
+    return response
+
 def validate_json(schema):
     def decorator(f):
         @wraps(f)
@@ -235,152 +361,349 @@ def validate_json(schema):
         return decorated_function
     return decorator
 
-def sanitize_input(text):
-    """Basic input sanitization"""
-    if not isinstance(text, str):
-        return ""
-    # Remove any HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
-    # Remove any script tags
-    text = re.sub(r'<script.*?>.*?</script>', '', text, flags=re.DOTALL)
-    # Remove any potentially dangerous characters
-    text = re.sub(r'[<>{}[\]\\]', '', text)
-    return text.strip()
-
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SPOONACULAR_API_KEY = os.getenv("SPOONACULAR_API_KEY")
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
+recipe_cache = create_recipe_cache()
+# Near-duplicate questions ("easy banana bread" / "simple banana bread recipe")
+# reuse a whole earlier response: reply, Spoonacular metadata and ingredients
+semantic_cache = create_semantic_cache()
+metrics.registry.register_stats('recipe', recipe_cache.stats)
+if semantic_cache:
+    metrics.registry.register_stats('semantic', semantic_cache.stats)
+
+def generate_gpt_reply(messages):
+    """Return the GPT reply for a conversation, served from the recipe cache when possible"""
+    cache_key = RecipeCache.make_key(messages)
+    reply = recipe_cache.get(cache_key)
+    if reply is not None:
+        return reply
+
+    with stage_timer('openai'):
+        gpt_response = openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            max_tokens=700,
+            temperature=0.7
+        )
+    reply = gpt_response.choices[0].message.content
+    recipe_cache.set(cache_key, reply)
+    return reply
+
+# Upstream fan-out configuration. Spoonacular runs alongside the OpenAI call and
+# only gets SPOONACULAR_DEADLINE_SECONDS (measured from fan-out start) before
+# the reply is sent without its metadata.
+SPOONACULAR_DEADLINE_SECONDS = float(os.getenv("SPOONACULAR_DEADLINE_SECONDS", "4"))
+upstream_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("UPSTREAM_MAX_WORKERS", "16")),
+    thread_name_prefix="upstream"
+)
 
-affiliate_links = {
-    "mixer": "https://amzn.to/44QqzQf", "mixing bowl": "https://amzn.to/3SepGJI",
-    "measuring cup": "https://amzn.to/44h5HBt", "spatula": "https://amzn.to/4iILIiP",
-    "scale": "https://amzn.to/4cUBs5t", "rolling pin": "https://amzn.to/3Gy1mQv",
-    "6 inch pan": "https://amzn.to/4lRwo64", "9 inch pan": "https://amzn.to/42xSUtc",
-    "cake decorating": "https://amzn.to/4lUd08m", "whisk": "https://amzn.to/3GwiBlk",
-    "bench scraper": "https://amzn.to/3GzcuN2", "loaf pan": "https://amzn.to/42XzcpD",
-    "almond flour": "https://amzn.to/4iCs3kx", "no sugar added chocolate chips": "https://amzn.to/3SfqlKU",
-    "monk fruit sweetener": "https://amzn.to/4cSRP2u", "coconut sugar": "https://amzn.to/42TZN6S",
-    "whole wheat flour": "https://amzn.to/4jAbpmQ", "cake flour": "https://amzn.to/3YmwUz1",
-    "silicone baking mat": "https://amzn.to/4jJcRmI", "avocado oil": "https://amzn.to/3EwlK43",
-    "digital thermometer": "https://amzn.to/42SIDXr", "food storage containers": "https://amzn.to/4k1U7ip",
-    "baking sheet": "https://amzn.to/44ijPdO", "hand mixer": "https://amzn.to/437UVwi",
-    "wire racks": "https://amzn.to/42Rghg3", "cookie scoop": "https://amzn.to/3EH8Yjd",
-    "food processor": "https://amzn.to/4iLcbvY", "matcha": "https://amzn.to/4d0bGwL",
-    "cocoa powder": "https://amzn.to/42WB3Lp"
-}
+spoonacular_client = create_spoonacular_client(SPOONACULAR_API_KEY, http=get_http_session())
+
+def fetch_spoonacular_data(query, timeout=SPOONACULAR_DEADLINE_SECONDS):
+    """Look up image, nutrition, servings and ready time for a recipe query"""
+    return spoonacular_client.lookup(query, timeout=timeout)
 
-def add_affiliate_links(text):
-    added = 0
-    for keyword, url in affiliate_links.items():
-        if re.search(rf"\b{re.escape(keyword)}\b", text, re.IGNORECASE) and added < 4:
-            text = re.sub(rf"\b({re.escape(keyword)})\b", f"[\\1]({url})", text, count=1, flags=re.IGNORECASE)
-            added += 1
-    return text
-
-def extract_ingredients(text):
-    lines = text.split('\n')
-    ingredients = []
-    for line in lines:
-        match = re.match(r'- (.+)', line)
-        if match:
-            ingredient = re.sub(r'\d+([\/\.]?\d+)?\s?(cups?|cup|tbsp|tsp|oz|g|ml)?\s?', '', match.group(1), flags=re.IGNORECASE)
-            ingredients.append(ingredient.strip())
-    return list(set(ingredients))
+def collect_spoonacular_data(future, started_at):
+    """Wait for a Spoonacular lookup only until its deadline budget runs out.
+
+    Returns (data, complete); complete is False when the lookup timed out or
+    failed, so the empty data must not be cached as the answer.
+    """
+    remaining = SPOONACULAR_DEADLINE_SECONDS - (time.monotonic() - started_at)
+    try:
+        return future.result(timeout=max(remaining, 0)), True
+    except FutureTimeoutError:
+        future.cancel()
+        logger.warning(f"Spoonacular lookup exceeded {SPOONACULAR_DEADLINE_SECONDS}s budget, replying without it")
+    except SpoonacularUnavailable as e:
+        logger.warning(f"Spoonacular unavailable, replying without it: {str(e)}")
+    except Exception as e:
+        logger.error(f"Spoonacular lookup failed: {str(e)}")
+    return dict(EMPTY_RESULT), False
 
 @app.route('/')
 def home():
     return jsonify({"message": "Kitchen Companion backend is live!"})
 
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def prometheus_metrics():
+    """Prometheus scrape target; requires METRICS_TOKEN as a bearer token when it is set"""
+    if METRICS_TOKEN and not secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (
+        "You are Jake's Kitchen Companion, a sharp, witty, and sometimes cheeky culinary assistant. You serve up expert-level cooking advice with a splash of humor and a dash of sass. Channel a mix of Martha Stewart's polish, Gordon Ramsay's directness (without the swearing), and a best friend's playful sarcasm. Keep recipes precise and helpful, but don't be afraid to toss in a clever joke or playful banter. Stay charming, confident, and fun — but never mean or offensive. Help users cook amazing meals, suggest creative swaps, and make the kitchen feel like the coolest place in the house."
+        "who channels the refinement of Martha Stewart and the fearless creativity of Julia Child. "
+        "You help users cook confidently with high-quality recipe suggestions, smart ingredient swaps, "
+        "kitchen hacks, prep tips, and clear instructions. Always prioritize accuracy, clarity, and "
+        "trusted sources (like USDA, Mayo Clinic). Default to giving full, detailed recipes when a dish is requested. "
+        "Offer helpful context or background only if the user asks. You handle dietary needs (vegan, gluten-free, "
+        "dairy-free, sugar-free) and scale recipes with precise unit conversions. Your tone is clear, direct, and no-nonsense—"
+        "cut the fluff—but still thoughtful and charming. You've got a chill, sharp, bro-like vibe: work hard, vibe harder. "
+        "Efficient but never stiff. Cool but never careless. You never invent health claims and you always ask clarifying questions "
+        "if the user's request is vague. You also help with meal planning, grocery lists, pantry use, and creative leftovers."
+    )
+}
+
+SUMMARY_PROMPT = (
+    "Summarize this cooking conversation for the assistant's memory in a few sentences. Keep the dishes "
+    "discussed, dietary needs, allergies, equipment, servings and any preferences or decisions the user "
+    "stated. Do not include recipe steps."
+)
+
+def summarize_conversation(previous_summary, messages, max_tokens):
+    """Fold turns that left the context window into the running summary"""
+    transcript = "\n".join(f"{m['role']}: {m['content'][:2000]}" for m in messages)
+    if previous_summary:
+        transcript = f"Summary so far: {previous_summary}\n\n{transcript}"
+    with stage_timer('openai_summary'):
+        response = openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+            max_tokens=max_tokens,
+            temperature=0.2
+        )
+    return response.choices[0].message.content.strip()
+
+# Long chats keep the last CONTEXT_KEEP_TURNS turns verbatim and a cached summary of the rest
+summary_cache = create_recipe_cache()
+metrics.registry.register_stats('summary', summary_cache.stats)
+conversation_context = create_conversation_context(summarize_conversation, summary_cache)
+
+# History for requests that send a conversation_id and only the new message;
+# long conversations fold their oldest turns into a summary message
+conversation_store = create_conversation_store(conversation_context.compact)
+
+def load_conversation(data, user_id=None):
+    """Return (history, new_messages, conversation_id) for an /ask_gpt payload.
+
+    Requests with a full messages array have no stored history and no
+    conversation_id. Raises ConversationNotFound for an unknown or expired
+    id, or one that a different signed-in user (user_id) started.
+    """
+    if 'message' not in data:
+        return [], data['messages'], None
+    conversation_id = data.get('conversation_id')
+    history = conversation_store.load(conversation_id, user_id) if conversation_id else []
+    return history, [{"role": "user", "content": data['message']}], conversation_id or conversation_store.new_id()
+
+def record_turn(conversation_id, user_message, reply, user_id=None):
+    """Append the (sanitized) user message and the model's raw reply (no title line
+    or affiliate links) to a stored conversation owned by user_id"""
+    if conversation_id:
+        conversation_store.append(conversation_id, [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": reply}
+        ], user_id)
+
+def semantic_context(messages):
+    """Key for everything before the last user turn; a semantic hit must share it exactly"""
+    last_user = max(i for i, m in enumerate(messages) if m['role'] == 'user')
+    return RecipeCache.make_key(messages[:last_user])
+
+def prepare_gpt_messages(messages, history=()):
+    """Sanitize new chat messages and fit them, after any stored (already sanitized)
+    history and behind the system prompt, into the token budget.
+
+    Returns (messages, user_message); user_message is None when the
+    conversation has no user turn. Raises ContextTooLarge when the latest
+    message alone is over the budget.
+    """
+    for message in messages:
+        if message.get('role') == 'user':
+            message['content'] = sanitize_input(message['content'])
+    messages = list(history) + messages
+
+    user_messages = [m['content'] for m in messages if m['role'] == 'user']
+    if not user_messages:
+        return messages, None
+    return conversation_context.build(dict(SYSTEM_PROMPT), messages), user_messages[-1]
+
+def stream_gpt_reply(messages, user_message, conversation_id=None, user_id=None):
+    """Stream the GPT reply as Server-Sent Events.
+
+    Emits ``token`` events as text arrives, then a single ``done`` event with
+    the Spoonacular metadata, extracted ingredients and conversation_id (or
+    an ``error`` event).
+    """
+    started_at = time.monotonic()
+    spoonacular_future = upstream_executor.submit(fetch_spoonacular_data, user_message)
+
+    def generate():
+        linker = AffiliateLinkStream(affiliate_matcher)
+        title_line = f"🍽️ Recipe: {user_message.title()}\n\n"
+        reply_parts = [title_line]
+        yield sse_event({"content": title_line}, "token")
+
+        cache_key = RecipeCache.make_key(messages)
+        stream_started = time.perf_counter()
+        try:
+            cached_reply = recipe_cache.get(cache_key)
+            if cached_reply is not None:
+                gpt_chunks = [cached_reply]
+            else:
+                gpt_chunks = (
+                    chunk.choices[0].delta.content
+                    for chunk in openai_client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=messages,
+                        max_tokens=700,
+                        temperature=0.7,
+                        stream=True
+                    )
+                    if chunk.choices and chunk.choices[0].delta.content
+                )
+            raw_parts = []
+            for content in gpt_chunks:
+                raw_parts.append(content)
+                text = linker.feed(content)
+                if text:
+                    reply_parts.append(text)
+                    yield sse_event({"content": text}, "token")
+            text = linker.flush()
+            if text:
+                reply_parts.append(text)
+                yield sse_event({"content": text}, "token")
+            if cached_reply is None:
+                metrics.stage_seconds.observe(time.perf_counter() - stream_started, stage='openai_stream')
+                recipe_cache.set(cache_key, ''.join(raw_parts))
+            record_turn(conversation_id, user_message, ''.join(raw_parts), user_id)
+        except Exception as e:
+            spoonacular_future.cancel()
+            upstream_errors.inc(upstream='openai')
+            logger.error(f"OpenAI API streaming error: {str(e)}")
+            yield sse_event({"error": "Failed to generate recipe response"}, "error")
+            return
+
+        spoonacular_data, _ = collect_spoonacular_data(spoonacular_future, started_at)
+        try:
+            ingredient_details = parse_ingredients(''.join(reply_parts))
+        except Exception as e:
+            logger.error(f"Error extracting ingredients: {str(e)}")
+            ingredient_details = []
+
+        done = {
+            **spoonacular_data,
+            "ingredients": [item['name'] for item in ingredient_details],
+            "ingredient_details": ingredient_details
+        }
+        if conversation_id:
+            done["conversation_id"] = conversation_id
+        yield sse_event(done, "done")
+
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @app.route('/ask_gpt', methods=['POST'])
 @limiter.limit("10 per minute")
 @validate_json(gpt_request_schema)
 def ask_gpt():
     try:
         data = request.get_json()
-        messages = data.get('messages')
-        
-        # Sanitize user messages
-        for message in messages:
-            if message.get('role') == 'user':
-                message['content'] = sanitize_input(message['content'])
-
-        user_message = [m['content'] for m in messages if m['role'] == 'user']
+        user_id = token_user_id(request_token())
+        history, new_messages, conversation_id = load_conversation(data, user_id)
+        messages, user_message = prepare_gpt_messages(new_messages, history)
         if not user_message:
             return jsonify({"error": "No user message found"}), 400
-        user_message = user_message[-1]
-
-        system_prompt = {
-            "role": "system",
-            "content": (
-                "You are Jake's Kitchen Companion, a sharp, witty, and sometimes cheeky culinary assistant. You serve up expert-level cooking advice with a splash of humor and a dash of sass. Channel a mix of Martha Stewart's polish, Gordon Ramsay's directness (without the swearing), and a best friend's playful sarcasm. Keep recipes precise and helpful, but don't be afraid to toss in a clever joke or playful banter. Stay charming, confident, and fun — but never mean or offensive. Help users cook amazing meals, suggest creative swaps, and make the kitchen feel like the coolest place in the house."
-                "who channels the refinement of Martha Stewart and the fearless creativity of Julia Child. "
-                "You help users cook confidently with high-quality recipe suggestions, smart ingredient swaps, "
-                "kitchen hacks, prep tips, and clear instructions. Always prioritize accuracy, clarity, and "
-                "trusted sources (like USDA, Mayo Clinic). Default to giving full, detailed recipes when a dish is requested. "
-                "Offer helpful context or background only if the user asks. You handle dietary needs (vegan, gluten-free, "
-                "dairy-free, sugar-free) and scale recipes with precise unit conversions. Your tone is clear, direct, and no-nonsense—"
-                "cut the fluff—but still thoughtful and charming. You've got a chill, sharp, bro-like vibe: work hard, vibe harder. "
-                "Efficient but never stiff. Cool but never careless. You never invent health claims and you always ask clarifying questions "
-                "if the user's request is vague. You also help with meal planning, grocery lists, pantry use, and creative leftovers."
-            )
-        }
-        messages.insert(0, system_prompt)
+
+        if wants_event_stream(request.headers.get('Accept')):
+            return stream_gpt_reply(messages, user_message, conversation_id, user_id)
+
+        title_line = f"🍽️ Recipe: {user_message.title()}\n\n"
+        context = semantic_context(messages) if semantic_cache else None
+        if semantic_cache:
+            hit, score = semantic_cache.lookup(user_message, context)
+            if hit is not None:
+                logger.info(f"Semantic cache hit (similarity {score:.3f})")
+                gpt_reply, cached = hit
+                record_turn(conversation_id, user_message, gpt_reply, user_id)
+                cached['reply'] = title_line + cached['reply']
+                if conversation_id:
+                    cached['conversation_id'] = conversation_id
+                return jsonify(cached)
+
+        # Spoonacular only depends on the user message, so start it before the
+        # OpenAI call and let both run at once
+        started_at = time.monotonic()
+        spoonacular_future = upstream_executor.submit(fetch_spoonacular_data, user_message)
 
         try:
-            gpt_response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=700,
-                temperature=0.7
-            )
-            reply = gpt_response.choices[0].message.content
-            reply = add_affiliate_links(reply)
-            title_line = f"🍽️ Recipe: {user_message.title()}\n\n"
-            reply = title_line + reply
+            gpt_reply = generate_gpt_reply(messages)
+            body = add_affiliate_links(gpt_reply)
+            reply = title_line + body
         except Exception as e:
+            spoonacular_future.cancel()
+            upstream_errors.inc(upstream='openai')
             logger.error(f"OpenAI API error: {str(e)}")
             return jsonify({"error": "Failed to generate recipe response"}), 500
+        record_turn(conversation_id, user_message, gpt_reply, user_id)
 
-        try:
-            spoonacular_resp = requests.get(
-                "https://api.spoonacular.com/recipes/complexSearch",
-                params={'query': user_message, 'number': 1, 'addRecipeNutrition': True, 'apiKey': SPOONACULAR_API_KEY},
-                timeout=10  # Add timeout
-            )
-            spoonacular_resp.raise_for_status()  # Raise exception for bad status codes
-
-            image_url, nutrition, servings, time = None, None, None, None
-            if spoonacular_resp.status_code == 200:
-                res = spoonacular_resp.json()
-                if res.get('results'):
-                    item = res['results'][0]
-                    image_url = item.get('image')
-                    nutrition = item.get('nutrition', {}).get('nutrients')
-                    servings = item.get('servings')
-                    time = item.get('readyInMinutes')
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Spoonacular API error: {str(e)}")
-            # Continue without Spoonacular data rather than failing completely
-            image_url, nutrition, servings, time = None, None, None, None
+        spoonacular_data, spoonacular_complete = collect_spoonacular_data(spoonacular_future, started_at)
 
         try:
-            ingredients = extract_ingredients(reply)
+            ingredient_details = parse_ingredients(reply)
         except Exception as e:
             logger.error(f"Error extracting ingredients: {str(e)}")
-            ingredients = []
-
-        return jsonify({
-            "reply": reply,
-            "image_url": image_url,
-            "nutrition": nutrition,
-            "servings": servings,
-            "time": time,
-            "ingredients": ingredients
-        })
+            ingredient_details = []
+
+        response = {
+            "reply": body,
+            "image_url": spoonacular_data["image_url"],
+            "nutrition": spoonacular_data["nutrition"],
+            "servings": spoonacular_data["servings"],
+            "time": spoonacular_data["time"],
+            "ingredients": [item['name'] for item in ingredient_details],
+            "ingredient_details": ingredient_details
+        }
+        if semantic_cache and spoonacular_complete:
+            # Stored without the title line, which echoes the exact question, and
+            # with the raw reply that a hit records in the conversation. A
+            # Spoonacular timeout or error is not cached, so the next near-duplicate
+            # retries it; a lookup that found nothing is a complete answer.
+            semantic_cache.store(user_message, (gpt_reply, response), context)
+        response["reply"] = reply
+        if conversation_id:
+            response["conversation_id"] = conversation_id
+        return jsonify(response)
+    except ConversationNotFound:
+        return jsonify({"error": "Conversation not found or expired"}), 404
+    except ContextTooLarge:
+        return jsonify({"error": "Message is too long"}), 413
     except Exception as e:
         logger.error(f"Unexpected error in ask_gpt: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+@app.route('/ask_gpt/stream', methods=['POST'])
+@limiter.limit("10 per minute")
+@validate_json(gpt_request_schema)
+def ask_gpt_stream():
+    try:
+        data = request.get_json()
+        user_id = token_user_id(request_token())
+        history, new_messages, conversation_id = load_conversation(data, user_id)
+        messages, user_message = prepare_gpt_messages(new_messages, history)
+        if not user_message:
+            return jsonify({"error": "No user message found"}), 400
+        return stream_gpt_reply(messages, user_message, conversation_id, user_id)
+    except ConversationNotFound:
+        return jsonify({"error": "Conversation not found or expired"}), 404
+    except ContextTooLarge:
+        return jsonify({"error": "Message is too long"}), 413
+    except Exception as e:
+        logger.error(f"Unexpected error in ask_gpt_stream: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+def already_registered_response(error):
+    message = 'Username already exists' if error.field == 'username' else 'Email already exists'
+    return jsonify({'error': message}), 400
+
 @app.route('/register', methods=['POST'])
 @limiter.limit("5 per minute")
 @validate_json(auth_schema)
@@ -397,21 +720,19 @@ def register():
         except EmailNotValidError:
             return jsonify({'error': 'Invalid email address'}), 400
 
-        # Check if username or email already exists
-        users_ref = db.collection('users')
-        username_query = users_ref.where('username', '==', username).limit(1).get()
-        email_query = users_ref.where('email', '==', email).limit(1).get()
-        
-        if len(username_query) > 0:
-            return jsonify({'error': 'Username already exists'}), 400
-        if len(email_query) > 0:
-            return jsonify({'error': 'Email already exists'}), 400
+        # Turn away taken names before paying for a hash; create_user still has the final say
+        try:
+            check_available(db, {'username': username, 'email': email})
+        except AlreadyRegistered as e:
+            return already_registered_response(e)
 
         # Hash password
-        hashed_password = pbkdf2_sha256.hash(password)
+        with stage_timer('password_hash'):
+            hashed_password = password_hasher.hash(password)
         
         # Generate verification token
         verification_token = secrets.token_urlsafe(32)
+        verification_expires = datetime.utcnow() + timedelta(hours=24)
         
         # Create user document
         user_id = str(uuid.uuid4())
@@ -423,10 +744,14 @@ def register():
             'auth_provider': 'local',
             'is_verified': False,
             'verification_token': verification_token,
-            'verification_token_expires': (datetime.utcnow() + timedelta(hours=24)).isoformat()
+            'verification_token_expires': verification_expires.isoformat()
         }
         
-        users_ref.document(user_id).set(user_data)
+        # Claims the username and email in the same transaction
+        try:
+            create_user(db, user_id, user_data, verification_expires)
+        except AlreadyRegistered as e:
+            return already_registered_response(e)
         
         # Send verification email
         verification_url = f"{APP_URL}/verify-email?token={verification_token}"
@@ -448,6 +773,8 @@ def register():
             'user_id': user_id
         }), 201
         
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f"Registration error: {str(e)}")
         return jsonify({'error': 'Failed to register user'}), 500
@@ -460,13 +787,10 @@ def verify_email():
             return jsonify({'error': 'Verification token is missing'}), 400
 
         # Find user with this verification token
-        users_ref = db.collection('users')
-        query = users_ref.where('verification_token', '==', token).limit(1).get()
-        
-        if len(query) == 0:
+        user_doc = find_token_user(db, 'verify', token)
+        if user_doc is None:
             return jsonify({'error': 'Invalid verification token'}), 400
             
-        user_doc = query[0]
         user_data = user_doc.to_dict()
         
         # Check if token is expired
@@ -475,11 +799,8 @@ def verify_email():
             return jsonify({'error': 'Verification token has expired'}), 400
             
         # Update user as verified
-        user_doc.reference.update({
-            'is_verified': True,
-            'verification_token': None,
-            'verification_token_expires': None
-        })
+        consume_token(db, user_doc, 'verify', {'is_verified': True})
+        user_cache.invalidate(user_doc.id)
         
         return jsonify({'message': 'Email verified successfully'})
         
@@ -497,18 +818,23 @@ def login():
         password = data.get('password')
 
         # Find user by username
-        users_ref = db.collection('users')
-        query = users_ref.where('username', '==', username).limit(1).get()
-        
-        if len(query) == 0:
+        user_doc = find_user(db, 'username', username)
+        if user_doc is None:
             return jsonify({'error': 'Invalid username or password'}), 401
             
-        user_doc = query[0]
         user_data = user_doc.to_dict()
         
         # Verify password
-        if not pbkdf2_sha256.verify(password, user_data['password']):
+        with stage_timer('password_verify'):
+            password_ok, new_hash = password_hasher.verify_and_update(password, user_data['password'])
+        if not password_ok:
             return jsonify({'error': 'Invalid username or password'}), 401
+
+        # Upgrade hashes made with an older PASSWORD_HASH_ROUNDS
+        if new_hash:
+            with firestore_timer('write'):
+                user_doc.reference.update({'password': new_hash})
+            user_cache.invalidate(user_doc.id)
             
         # Check if email is verified
         if not user_data.get('is_verified', False):
@@ -518,7 +844,8 @@ def login():
         access_token = generate_token(user_doc.id, 'access')
         refresh_token = generate_token(user_doc.id, 'refresh')
         
-        # Store session data
+        # Store session data under a fresh id so a planted session cookie is never promoted
+        session.regenerate()
         session['user_id'] = user_doc.id
         session['last_activity'] = datetime.utcnow().isoformat()
         
@@ -529,6 +856,8 @@ def login():
             'user_id': user_doc.id
         })
         
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f"Login error: {str(e)}")
         return jsonify({'error': 'Failed to login'}), 500
@@ -564,23 +893,17 @@ def forgot_password():
             return jsonify({'error': 'Email is required'}), 400
             
         # Find user by email
-        users_ref = db.collection('users')
-        query = users_ref.where('email', '==', email).limit(1).get()
-        
-        if len(query) == 0:
+        user_doc = find_user(db, 'email', email)
+        if user_doc is None:
             return jsonify({'error': 'No account found with this email'}), 404
-            
-        user_doc = query[0]
         
         # Generate password reset token
         reset_token = secrets.token_urlsafe(32)
         reset_token_expires = datetime.utcnow() + timedelta(hours=1)
         
         # Update user document
-        user_doc.reference.update({
-            'reset_token': reset_token,
-            'reset_token_expires': reset_token_expires.isoformat()
-        })
+        issue_token(db, user_doc, 'reset', reset_token, reset_token_expires)
+        user_cache.invalidate(user_doc.id)
         
         # Send password reset email
         reset_url = f"{APP_URL}/reset-password?token={reset_token}"
@@ -609,13 +932,10 @@ def reset_password():
             return jsonify({'error': 'Token and new password are required'}), 400
             
         # Find user with this reset token
-        users_ref = db.collection('users')
-        query = users_ref.where('reset_token', '==', token).limit(1).get()
-        
-        if len(query) == 0:
+        user_doc = find_token_user(db, 'reset', token)
+        if user_doc is None:
             return jsonify({'error': 'Invalid reset token'}), 400
             
-        user_doc = query[0]
         user_data = user_doc.to_dict()
         
         # Check if token is expired
@@ -624,17 +944,17 @@ def reset_password():
             return jsonify({'error': 'Reset token has expired'}), 400
             
         # Hash new password
-        hashed_password = pbkdf2_sha256.hash(new_password)
+        with stage_timer('password_hash'):
+            hashed_password = password_hasher.hash(new_password)
         
         # Update user document
-        user_doc.reference.update({
-            'password': hashed_password,
-            'reset_token': None,
-            'reset_token_expires': None
-        })
+        consume_token(db, user_doc, 'reset', {'password': hashed_password})
+        user_cache.invalidate(user_doc.id)
         
         return jsonify({'message': 'Password reset successful'})
         
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f"Password reset error: {str(e)}")
         return jsonify({'error': 'Failed to reset password'}), 500
@@ -643,11 +963,10 @@ def reset_password():
 @token_required
 def get_profile(user_id):
     try:
-        user_doc = db.collection('users').document(user_id).get()
-        if not user_doc.exists:
+        user_data = user_cache.get(user_id)
+        if user_data is None:
             return jsonify({'error': 'User not found'}), 404
             
-        user_data = user_doc.to_dict()
         # Remove sensitive data
         user_data.pop('password', None)
         user_data.pop('reset_token', None)
@@ -655,7 +974,7 @@ def get_profile(user_id):
         user_data.pop('verification_token', None)
         user_data.pop('verification_token_expires', None)
         
-        return jsonify(user_data)
+        return conditional_json(lambda: user_data, payload_etag(user_data))
         
     except Exception as e:
         logger.error(f"Get profile error: {str(e)}")
@@ -669,11 +988,14 @@ def update_profile(user_id):
         data = request.get_json()
         
         # Update user document
-        db.collection('users').document(user_id).update({
+        profile = {
             'display_name': sanitize_input(data.get('display_name')),
             'bio': sanitize_input(data.get('bio')),
             'preferences': data.get('preferences', {})
-        })
+        }
+        with firestore_timer('write'):
+            db.collection('users').document(user_id).update(profile)
+        user_cache.update(user_id, profile)
         
         return jsonify({'message': 'Profile updated successfully'})
         
@@ -693,26 +1015,31 @@ def change_password(user_id):
             return jsonify({'error': 'Current password and new password are required'}), 400
             
         # Get user document
-        user_doc = db.collection('users').document(user_id).get()
-        if not user_doc.exists:
+        user_data = user_cache.get(user_id)
+        if user_data is None:
             return jsonify({'error': 'User not found'}), 404
-            
-        user_data = user_doc.to_dict()
         
         # Verify current password
-        if not pbkdf2_sha256.verify(current_password, user_data['password']):
+        with stage_timer('password_verify'):
+            password_ok = password_hasher.verify(current_password, user_data['password'])
+        if not password_ok:
             return jsonify({'error': 'Current password is incorrect'}), 401
             
         # Hash new password
-        hashed_password = pbkdf2_sha256.hash(new_password)
+        with stage_timer('password_hash'):
+            hashed_password = password_hasher.hash(new_password)
         
         # Update password
-        user_doc.reference.update({
-            'password': hashed_password
-        })
+        with firestore_timer('write'):
+            db.collection('users').document(user_id).update({
+                'password': hashed_password
+            })
+        user_cache.update(user_id, {'password': hashed_password})
         
         return jsonify({'message': 'Password changed successfully'})
         
+    except PasswordHasherBusy:
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f"Change password error: {str(e)}")
         return jsonify({'error': 'Failed to change password'}), 500
@@ -721,6 +1048,14 @@ def change_password(user_id):
 @token_required
 def logout(user_id):
     try:
+        # Revoke the access token, and the refresh token if the client sent it
+        access_token = request_token()
+        revoked_tokens.revoke(access_token, decode_token(access_token)['exp'])
+        refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+        refresh_claims = decode_token(refresh_token) if refresh_token else None
+        if refresh_claims and refresh_claims['user_id'] == user_id:
+            revoked_tokens.revoke(refresh_token, refresh_claims['exp'])
+        
         # Clear session data
         session.clear()
         return jsonify({'message': 'Logged out successfully'})
@@ -739,11 +1074,13 @@ def save_recipe(user_id):
         
         # Sanitize recipe data
         recipe['title'] = sanitize_input(recipe['title'])
-        recipe['ingredients'] = [sanitize_input(ing) for ing in recipe['ingredients']]
+        recipe['ingredients'] = sanitize_inputs(recipe['ingredients'])
         recipe['instructions'] = sanitize_input(recipe['instructions'])
+        recipe['created_at'] = datetime.utcnow().isoformat()
 
         try:
-            db.collection('users').document(user_id).collection('recipes').add(recipe)
+            with firestore_timer('write'):
+                db.collection('users').document(user_id).collection('recipes').add(recipe)
             return jsonify({"status": "Recipe saved"})
         except Exception as e:
             logger.error(f"Firebase error saving recipe: {str(e)}")
@@ -752,18 +1089,205 @@ def save_recipe(user_id):
         logger.error(f"Unexpected error in save_recipe: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+# Fields clients may project, and sort orders for /get_recipes ('-' prefix = descending)
+RECIPE_FIELDS = {'title', 'ingredients', 'instructions', 'created_at'}
+RECIPE_SORT_FIELDS = {'title', 'created_at'}
+RECIPES_DEFAULT_PAGE_SIZE = 20
+RECIPES_MAX_PAGE_SIZE = 100
+
+def build_recipes_query(recipes_ref, args):
+    """Build the recipes query from limit/fields/order_by args.
+
+    Returns (query, limit, error); limit is None when the caller asked for
+    every recipe. The start_after cursor is applied by the caller, since it
+    needs a document read.
+    """
+    query = recipes_ref
+
+    fields = args.get('fields')
+    if fields:
+        field_list = [f.strip() for f in fields.split(',') if f.strip() and f.strip() != 'id']
+        unknown = set(field_list) - RECIPE_FIELDS
+        if unknown:
+            return None, None, f"Unknown fields: {', '.join(sorted(unknown))}"
+        # An empty projection returns only document IDs
+        query = query.select(field_list)
+
+    order_by = args.get('order_by')
+    if order_by:
+        direction = firestore.Query.DESCENDING if order_by.startswith('-') else firestore.Query.ASCENDING
+        field = order_by.lstrip('-')
+        if field not in RECIPE_SORT_FIELDS:
+            return None, None, f"Cannot sort by {field}"
+        query = query.order_by(field, direction=direction)
+
+    limit = None
+    if 'limit' in args or 'start_after' in args:
+        try:
+            limit = int(args.get('limit', RECIPES_DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return None, None, "limit must be an integer"
+        if limit < 1 or limit > RECIPES_MAX_PAGE_SIZE:
+            return None, None, f"limit must be between 1 and {RECIPES_MAX_PAGE_SIZE}"
+        # Fetch one extra document to know whether another page exists
+        query = query.limit(limit + 1)
+
+    return query, limit, None
+
+def stream_recipes(docs, limit=None):
+    """Yield the recipes JSON one recipe at a time so memory stays flat.
+
+    Without a limit this is the plain array; with one it is the paged
+    {"recipes": [...], "next_cursor": ...} object, docs holding the one
+    extra document that tells whether another page exists.
+    """
+    if limit is None:
+        yield '['
+        for i, doc in enumerate(docs):
+            yield (',' if i else '') + recipe_json(doc)
+        yield ']'
+        return
+
+    yield '{"recipes": ['
+    next_cursor = None
+    for i, doc in enumerate(docs):
+        if i == limit:
+            next_cursor = previous_id
+            break
+        yield (',' if i else '') + recipe_json(doc)
+        previous_id = doc.id
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+def recipe_json(doc):
+    r = doc.to_dict()
+    r['id'] = doc.id
+    return json.dumps(r, default=str)
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+@app.route('/recipes/batch', methods=['POST'])
+@limiter.limit("10 per minute")
+@token_required
+@validate_json(recipe_batch_schema)
+def save_recipes_batch(user_id):
+    try:
+        recipes = request.get_json().get('recipes')
+        recipes_ref = db.collection('users').document(user_id).collection('recipes')
+        results = [None] * len(recipes)
+
+        # Validate and sanitize every recipe up front; only valid ones are written
+        pending = []
+        created_at = datetime.utcnow().isoformat()
+        for i, recipe in enumerate(recipes):
+            try:
+                validate(instance=recipe, schema=recipe_schema['properties']['recipe'])
+            except jsonschema.exceptions.ValidationError as e:
+                results[i] = {"index": i, "status": "invalid", "error": e.message}
+                continue
+            recipe['title'] = sanitize_input(recipe['title'])
+            recipe['ingredients'] = sanitize_inputs(recipe['ingredients'])
+            recipe['instructions'] = sanitize_input(recipe['instructions'])
+            recipe['created_at'] = created_at
+            pending.append((i, recipes_ref.document(), recipe))
+
+        for chunk in chunked(pending, FIRESTORE_BATCH_LIMIT):
+            batch = db.batch()
+            for _, ref, recipe in chunk:
+                batch.set(ref, recipe)
+            try:
+                with firestore_timer('write'):
+                    batch.commit()
+                for i, ref, _ in chunk:
+                    results[i] = {"index": i, "status": "saved", "id": ref.id}
+            except Exception as e:
+                logger.error(f"Firebase error saving recipe batch: {str(e)}")
+                for i, _, _ in chunk:
+                    results[i] = {"index": i, "status": "failed", "error": "Failed to save recipe"}
+
+        saved = sum(1 for r in results if r['status'] == 'saved')
+        return jsonify({"saved": saved, "failed": len(results) - saved, "results": results})
+    except Exception as e:
+        logger.error(f"Unexpected error in save_recipes_batch: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/recipes/batch', methods=['DELETE'])
+@limiter.limit("10 per minute")
+@token_required
+@validate_json(recipe_delete_batch_schema)
+def delete_recipes_batch(user_id):
+    try:
+        recipe_ids = list(dict.fromkeys(request.get_json().get('recipe_ids')))
+        recipes_ref = db.collection('users').document(user_id).collection('recipes')
+        results = {}
+
+        for chunk in chunked(recipe_ids, FIRESTORE_BATCH_LIMIT):
+            try:
+                # One get_all round trip tells us which IDs exist, then one batched delete
+                with firestore_timer('read'):
+                    snapshots = db.get_all([recipes_ref.document(recipe_id) for recipe_id in chunk])
+                existing = [snap for snap in snapshots if snap.exists]
+                found = {snap.id for snap in existing}
+                batch = db.batch()
+                for snap in existing:
+                    batch.delete(snap.reference)
+                with firestore_timer('write'):
+                    batch.commit()
+                for recipe_id in chunk:
+                    results[recipe_id] = "deleted" if recipe_id in found else "not_found"
+            except Exception as e:
+                logger.error(f"Firebase error deleting recipe batch: {str(e)}")
+                for recipe_id in chunk:
+                    results[recipe_id] = "failed"
+
+        deleted = sum(1 for status in results.values() if status == 'deleted')
+        return jsonify({
+            "deleted": deleted,
+            "results": [{"id": recipe_id, "status": status} for recipe_id, status in results.items()]
+        })
+    except Exception as e:
+        logger.error(f"Unexpected error in delete_recipes_batch: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
 @app.route('/get_recipes', methods=['GET'])
 @token_required
 def get_recipes(user_id):
     try:
+        recipes_ref = db.collection('users').document(user_id).collection('recipes')
+        query, limit, error = build_recipes_query(recipes_ref, request.args)
+        if error:
+            return jsonify({"error": error}), 400
+
         try:
-            recipes = []
-            docs = db.collection('users').document(user_id).collection('recipes').stream()
-            for doc in docs:
-                r = doc.to_dict()
-                r['id'] = doc.id
-                recipes.append(r)
-            return jsonify(recipes)
+            start_after = request.args.get('start_after')
+            if start_after:
+                with firestore_timer('read'):
+                    cursor = recipes_ref.document(start_after).get()
+                if not cursor.exists:
+                    return jsonify({"error": "Invalid start_after cursor"}), 400
+                query = query.start_after(cursor)
+
+            docs = query.stream()
+            if request.args.get('stream', '').lower() in ('1', 'true'):
+                return Response(stream_recipes(docs, limit), mimetype='application/json')
+
+            with firestore_timer('read'):
+                docs = list(docs)
+
+            def build():
+                recipes = []
+                for doc in docs:
+                    r = doc.to_dict()
+                    r['id'] = doc.id
+                    recipes.append(r)
+                if limit is None:
+                    return recipes
+                next_cursor = recipes[limit - 1]['id'] if len(recipes) > limit else None
+                return {"recipes": recipes[:limit], "next_cursor": next_cursor}
+
+            # Deletes don't move any update_time, so lists get an ETag but no Last-Modified
+            return conditional_json(build, docs_etag(docs))
         except Exception as e:
             logger.error(f"Firebase error getting recipes: {str(e)}")
             return jsonify({"error": "Failed to retrieve recipes"}), 500
@@ -781,10 +1305,13 @@ def delete_recipe(user_id):
 
         try:
             recipe_ref = db.collection('users').document(user_id).collection('recipes').document(recipe_id)
-            if not recipe_ref.get().exists:
+            with firestore_timer('read'):
+                recipe_exists = recipe_ref.get().exists
+            if not recipe_exists:
                 return jsonify({'error': 'Recipe not found'}), 404
 
-            recipe_ref.delete()
+            with firestore_timer('write'):
+                recipe_ref.delete()
             return jsonify({'message': 'Recipe deleted successfully'}), 200
         except Exception as e:
             logger.error(f"Firebase error deleting recipe: {str(e)}")
@@ -800,10 +1327,15 @@ def delete_recipe(user_id):
 def update_pantry(user_id):
     try:
         data = request.get_json()
-        pantry_items = [sanitize_input(item) for item in data.get('pantry')]
+        pantry_items = sanitize_inputs(data.get('pantry'))
 
         try:
-            db.collection('users').document(user_id).update({'pantry': pantry_items})
+            with firestore_timer('write'):
+                db.collection('users').document(user_id).update({
+                    'pantry': pantry_items,
+                    'pantry_version': firestore.Increment(1)
+                })
+            user_cache.invalidate(user_id)
             return jsonify({"status": "Pantry updated"})
         except Exception as e:
             logger.error(f"Firebase error updating pantry: {str(e)}")
@@ -819,10 +1351,15 @@ def update_pantry(user_id):
 def update_grocery_list(user_id):
     try:
         data = request.get_json()
-        grocery_items = [sanitize_input(item) for item in data.get('grocery_list')]
+        grocery_items = sanitize_inputs(data.get('grocery_list'))
 
         try:
-            db.collection('users').document(user_id).update({'grocery_list': grocery_items})
+            with firestore_timer('write'):
+                db.collection('users').document(user_id).update({
+                    'grocery_list': grocery_items,
+                    'grocery_list_version': firestore.Increment(1)
+                })
+            user_cache.invalidate(user_id)
             return jsonify({"status": "Grocery list updated"})
         except Exception as e:
             logger.error(f"Firebase error updating grocery list: {str(e)}")
@@ -831,6 +1368,54 @@ def update_grocery_list(user_id):
         logger.error(f"Unexpected error in update_grocery_list: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+# Item-level pantry and grocery list edits. Each request carries only the
+# items that changed and gets back the resulting list and its version, so
+# clients never have to re-send or re-fetch the whole array.
+LIST_LABELS = {'pantry': 'pantry', 'grocery_list': 'grocery list'}
+
+def list_delta_response(user_id, list_name, operation, **delta):
+    try:
+        items, version = apply_list_delta(db, user_id, list_name, operation, **delta)
+    except ListItemNotFound:
+        return jsonify({"error": f"Item not found in {LIST_LABELS[list_name]}"}), 404
+    except Exception as e:
+        logger.error(f"Firebase error updating {LIST_LABELS[list_name]}: {str(e)}")
+        return jsonify({"error": f"Failed to update {LIST_LABELS[list_name]}"}), 500
+    user_cache.update(user_id, {list_name: items, f"{list_name}_version": version})
+    return jsonify({list_name: items, "version": version})
+
+@app.route('/<any(pantry, grocery_list):list_name>/items', methods=['POST', 'DELETE'])
+@limiter.limit("60 per minute")
+@token_required
+@validate_json(list_items_schema)
+def update_list_items(user_id, list_name):
+    try:
+        items = sanitize_inputs(request.get_json().get('items'))
+        items = [item for item in items if item]
+        if not items:
+            return jsonify({"error": "No valid items provided"}), 400
+        operation = 'add' if request.method == 'POST' else 'remove'
+        return list_delta_response(user_id, list_name, operation, items=items)
+    except Exception as e:
+        logger.error(f"Unexpected error in update_list_items: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+@app.route('/<any(pantry, grocery_list):list_name>/items/rename', methods=['POST'])
+@limiter.limit("60 per minute")
+@token_required
+@validate_json(list_rename_schema)
+def rename_list_item(user_id, list_name):
+    try:
+        data = request.get_json()
+        rename_from = sanitize_input(data.get('from'))
+        rename_to = sanitize_input(data.get('to'))
+        if not rename_from or not rename_to:
+            return jsonify({"error": "Both 'from' and 'to' are required"}), 400
+        return list_delta_response(user_id, list_name, 'rename', rename_from=rename_from, rename_to=rename_to)
+    except Exception as e:
+        logger.error(f"Unexpected error in rename_list_item: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
 @app.route('/save_pantry', methods=['POST'])
 @token_required
 def save_pantry(user_id):
@@ -844,7 +1429,12 @@ def save_pantry(user_id):
             return jsonify({"error": "Missing pantry"}), 400
             
         try:
-            db.collection('users').document(user_id).set({'pantry': pantry}, merge=True)
+            with firestore_timer('write'):
+                db.collection('users').document(user_id).set({
+                    'pantry': pantry,
+                    'pantry_version': firestore.Increment(1)
+                }, merge=True)
+            user_cache.invalidate(user_id)
             return jsonify({"status": "Pantry saved"})
         except Exception as e:
             logger.error(f"Firebase error saving pantry: {str(e)}")
@@ -858,9 +1448,13 @@ def save_pantry(user_id):
 def get_pantry(user_id):
     try:
         try:
-            doc = db.collection('users').document(user_id).get()
-            pantry = doc.to_dict().get('pantry', []) if doc.exists else []
-            return jsonify({"pantry": pantry})
+            user_data = user_cache.get(user_id)
+            user_data = user_data or {}
+            payload = {
+                "pantry": user_data.get('pantry', []),
+                "version": user_data.get('pantry_version', 0)
+            }
+            return conditional_json(lambda: payload, payload_etag(payload))
         except Exception as e:
             logger.error(f"Firebase error getting pantry: {str(e)}")
             return jsonify({"error": "Failed to retrieve pantry"}), 500
@@ -877,10 +1471,11 @@ def get_recipe_detail(user_id):
             return jsonify({"error": "Missing recipe_id"}), 400
             
         try:
-            doc = db.collection('users').document(user_id).collection('recipes').document(recipe_id).get()
+            with firestore_timer('read'):
+                doc = db.collection('users').document(user_id).collection('recipes').document(recipe_id).get()
             if not doc.exists:
                 return jsonify({"error": "Recipe not found"}), 404
-            return jsonify(doc.to_dict())
+            return conditional_json(doc.to_dict, docs_etag([doc]), doc.update_time)
         except Exception as e:
             logger.error(f"Firebase error getting recipe detail: {str(e)}")
             return jsonify({"error": "Failed to retrieve recipe details"}), 500
@@ -0,0 +1,557 @@
+"""ASGI entry point for production.
+
+The OpenAI- and Firestore-bound routes are served natively on the event loop
+with the async OpenAI client and async Firestore, so one worker can hold
+hundreds of in-flight GPT calls. Every other route falls through to the
+Flask app, each request on its own thread from a pool of WSGI_THREADS.
+
+Run with ``gunicorn -c gunicorn.conf.py`` (see that file for the knobs).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import wraps
+
+import jsonschema
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from firebase_admin import firestore_async
+from jsonschema import validate
+from limits import parse
+from openai import AsyncOpenAI
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as kitchen
+from affiliates import add_affiliate_links
+from conditional import cache_headers, docs_etag, is_not_modified, payload_etag
+from conversation_context import ContextTooLarge
+from conversation_store import ConversationNotFound
+import metrics
+from metrics import firestore_timer, stage_timer, upstream_errors
+from ingredients import parse_ingredients
+from spoonacular import EMPTY_RESULT, SpoonacularUnavailable
+from streaming import AffiliateLinkStream, sse_event, wants_event_stream, SSE_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# Threads shared by the Flask fallback and blocking helpers (Spoonacular, caches)
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "32"))
+
+async_db = firestore_async.client()
+async_openai_client = AsyncOpenAI(api_key=kitchen.OPENAI_API_KEY)
+
+def bearer_token(request):
+    token = request.headers.get('Authorization')
+    if token and token.startswith('Bearer '):
+        token = token[7:]
+    return token
+
+async def hit_limit(limit, *identifiers):
+    """Count a hit in the Flask limiter's storage, so both servers share one set of counters.
+
+    identifiers must be in Flask-Limiter's order (key prefix, rate limit key,
+    endpoint) for the storage keys to match.
+    """
+    strategy = kitchen.limiter.limiter
+    if kitchen.RATELIMIT_STORAGE_URI.startswith('memory://'):
+        return strategy.hit(limit, *identifiers)
+    try:
+        return await asyncio.to_thread(strategy.hit, limit, *identifiers)
+    except Exception as e:
+        logger.warning(f"Rate limit storage unavailable, allowing request: {str(e)}")
+        return True
+
+def rate_limit(*limit_strings):
+    """Per-user (or per-client-IP) limits, mirroring the Flask routes' @limiter.limit.
+
+    Like Flask-Limiter, the limits are checked shortest window first and the
+    first breach stops the rest from being counted. The endpoint scope is the
+    function name, which matches the Flask endpoint of the same route.
+    """
+    limits = sorted((parse(limit_string), limit_string) for limit_string in limit_strings)
+
+    def decorator(f):
+        @wraps(f)
+        async def decorated(request, *args, **kwargs):
+            if not kitchen.limiter.enabled:
+                return await f(request, *args, **kwargs)
+            client_ip = request.client.host if request.client else '127.0.0.1'
+            key = kitchen.rate_limit_key(bearer_token(request), client_ip)
+            for limit, limit_string in limits:
+                if not await hit_limit(limit, kitchen.RATELIMIT_KEY_PREFIX, key, f.__name__):
+                    return JSONResponse({"error": f"Rate limit exceeded: {limit_string}"}, status_code=429)
+            return await f(request, *args, **kwargs)
+        return decorated
+    return decorator
+
+# Routes without their own limit get the app-wide defaults, as in Flask
+default_rate_limit = rate_limit(*kitchen.DEFAULT_RATE_LIMITS)
+
+def token_required(f):
+    @wraps(f)
+    async def decorated(request, *args, **kwargs):
+        token = bearer_token(request)
+        if not token:
+            return JSONResponse({'error': 'Token is missing'}, status_code=401)
+
+        user_id, token_type = kitchen.verify_token(token)
+        if not user_id or token_type != 'access':
+            return JSONResponse({'error': 'Invalid or expired token'}, status_code=401)
+
+        return await f(request, user_id, *args, **kwargs)
+    return decorated
+
+def validate_json(schema):
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(request, *args, **kwargs):
+            if request.headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+                return JSONResponse({"error": "Content-Type must be application/json"}, status_code=400)
+            try:
+                request.state.json = await request.json()
+                validate(instance=request.state.json, schema=schema)
+            except ValueError:
+                return JSONResponse({"error": "Invalid JSON body"}, status_code=400)
+            except jsonschema.exceptions.ValidationError as e:
+                return JSONResponse({"error": f"Invalid request data: {str(e)}"}, status_code=400)
+            return await f(request, *args, **kwargs)
+        return decorated_function
+    return decorator
+
+def conditional_json(request, build, etag, last_modified=None):
+    """Starlette twin of kitchen.conditional_json"""
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request.headers, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(build(), headers=headers)
+
+async def generate_gpt_reply(messages):
+    """Async twin of app.generate_gpt_reply, sharing its recipe cache"""
+    cache_key = kitchen.RecipeCache.make_key(messages)
+    reply = await asyncio.to_thread(kitchen.recipe_cache.get, cache_key)
+    if reply is not None:
+        return reply
+
+    with stage_timer('openai'):
+        gpt_response = await async_openai_client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            max_tokens=700,
+            temperature=0.7
+        )
+    reply = gpt_response.choices[0].message.content
+    await asyncio.to_thread(kitchen.recipe_cache.set, cache_key, reply)
+    return reply
+
+async def collect_spoonacular_data(task, started_at):
+    """Async twin of app.collect_spoonacular_data, returning (data, complete)"""
+    remaining = kitchen.SPOONACULAR_DEADLINE_SECONDS - (time.monotonic() - started_at)
+    try:
+        return await asyncio.wait_for(task, timeout=max(remaining, 0)), True
+    except asyncio.TimeoutError:
+        logger.warning(f"Spoonacular lookup exceeded {kitchen.SPOONACULAR_DEADLINE_SECONDS}s budget, replying without it")
+    except SpoonacularUnavailable as e:
+        logger.warning(f"Spoonacular unavailable, replying without it: {str(e)}")
+    except Exception as e:
+        logger.error(f"Spoonacular lookup failed: {str(e)}")
+    return dict(EMPTY_RESULT), False
+
+def start_spoonacular_lookup(user_message):
+    # The Spoonacular client is blocking (pooled requests + SQLite cache), so it runs on a thread
+    return asyncio.ensure_future(asyncio.to_thread(kitchen.fetch_spoonacular_data, user_message))
+
+def stream_gpt_reply(messages, user_message, conversation_id=None, user_id=None):
+    """Async twin of app.stream_gpt_reply"""
+    started_at = time.monotonic()
+    spoonacular_task = start_spoonacular_lookup(user_message)
+
+    async def generate():
+        linker = AffiliateLinkStream(kitchen.affiliate_matcher)
+        title_line = f"🍽️ Recipe: {user_message.title()}\n\n"
+        reply_parts = [title_line]
+        yield sse_event({"content": title_line}, "token")
+
+        cache_key = kitchen.RecipeCache.make_key(messages)
+        try:
+            cached_reply = await asyncio.to_thread(kitchen.recipe_cache.get, cache_key)
+            raw_parts = []
+            if cached_reply is not None:
+                raw_parts.append(cached_reply)
+                text = linker.feed(cached_reply)
+                if text:
+                    reply_parts.append(text)
+                    yield sse_event({"content": text}, "token")
+            else:
+                gpt_stream = await async_openai_client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=700,
+                    temperature=0.7,
+                    stream=True
+                )
+                async for chunk in gpt_stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    raw_parts.append(chunk.choices[0].delta.content)
+                    text = linker.feed(chunk.choices[0].delta.content)
+                    if text:
+                        reply_parts.append(text)
+                        yield sse_event({"content": text}, "token")
+            text = linker.flush()
+            if text:
+                reply_parts.append(text)
+                yield sse_event({"content": text}, "token")
+            if cached_reply is None:
+                await asyncio.to_thread(kitchen.recipe_cache.set, cache_key, ''.join(raw_parts))
+            await asyncio.to_thread(kitchen.record_turn, conversation_id, user_message, ''.join(raw_parts), user_id)
+        except Exception as e:
+            spoonacular_task.cancel()
+            upstream_errors.inc(upstream='openai')
+            logger.error(f"OpenAI API streaming error: {str(e)}")
+            yield sse_event({"error": "Failed to generate recipe response"}, "error")
+            return
+
+        spoonacular_data, _ = await collect_spoonacular_data(spoonacular_task, started_at)
+        try:
+            ingredient_details = await asyncio.to_thread(parse_ingredients, ''.join(reply_parts))
+        except Exception as e:
+            logger.error(f"Error extracting ingredients: {str(e)}")
+            ingredient_details = []
+
+        done = {
+            **spoonacular_data,
+            "ingredients": [item['name'] for item in ingredient_details],
+            "ingredient_details": ingredient_details
+        }
+        if conversation_id:
+            done["conversation_id"] = conversation_id
+        yield sse_event(done, "done")
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+@rate_limit("10 per minute")
+@validate_json(kitchen.gpt_request_schema)
+async def ask_gpt(request):
+    try:
+        user_id = kitchen.token_user_id(bearer_token(request))
+        # Both may block (conversation store, OpenAI summary), so keep them off the event loop
+        history, new_messages, conversation_id = await asyncio.to_thread(kitchen.load_conversation, request.state.json, user_id)
+        messages, user_message = await asyncio.to_thread(kitchen.prepare_gpt_messages, new_messages, history)
+        if not user_message:
+            return JSONResponse({"error": "No user message found"}, status_code=400)
+
+        if wants_event_stream(request.headers.get('accept')):
+            return stream_gpt_reply(messages, user_message, conversation_id, user_id)
+
+        title_line = f"🍽️ Recipe: {user_message.title()}\n\n"
+        semantic_cache = kitchen.semantic_cache
+        # Embedding, the similarity scan and a Redis-backed cache all block
+        context = await asyncio.to_thread(kitchen.semantic_context, messages) if semantic_cache else None
+        if semantic_cache:
+            hit, score = await asyncio.to_thread(semantic_cache.lookup, user_message, context)
+            if hit is not None:
+                logger.info(f"Semantic cache hit (similarity {score:.3f})")
+                gpt_reply, cached = hit
+                await asyncio.to_thread(kitchen.record_turn, conversation_id, user_message, gpt_reply, user_id)
+                cached['reply'] = title_line + cached['reply']
+                if conversation_id:
+                    cached['conversation_id'] = conversation_id
+                return JSONResponse(cached)
+
+        started_at = time.monotonic()
+        spoonacular_task = start_spoonacular_lookup(user_message)
+
+        try:
+            gpt_reply = await generate_gpt_reply(messages)
+            body = add_affiliate_links(gpt_reply)
+            reply = title_line + body
+        except Exception as e:
+            spoonacular_task.cancel()
+            upstream_errors.inc(upstream='openai')
+            logger.error(f"OpenAI API error: {str(e)}")
+            return JSONResponse({"error": "Failed to generate recipe response"}, status_code=500)
+        await asyncio.to_thread(kitchen.record_turn, conversation_id, user_message, gpt_reply, user_id)
+
+        spoonacular_data, spoonacular_complete = await collect_spoonacular_data(spoonacular_task, started_at)
+
+        try:
+            ingredient_details = await asyncio.to_thread(parse_ingredients, reply)
+        except Exception as e:
+            logger.error(f"Error extracting ingredients: {str(e)}")
+            ingredient_details = []
+
+        response = {
+            "reply": body,
+            **spoonacular_data,
+            "ingredients": [item['name'] for item in ingredient_details],
+            "ingredient_details": ingredient_details
+        }
+        if semantic_cache and spoonacular_complete:
+            await asyncio.to_thread(semantic_cache.store, user_message, (gpt_reply, response), context)
+        response["reply"] = reply
+        if conversation_id:
+            response["conversation_id"] = conversation_id
+        return JSONResponse(response)
+    except ConversationNotFound:
+        return JSONResponse({"error": "Conversation not found or expired"}, status_code=404)
+    except ContextTooLarge:
+        return JSONResponse({"error": "Message is too long"}, status_code=413)
+    except Exception as e:
+        logger.error(f"Unexpected error in ask_gpt: {str(e)}")
+        return JSONResponse({"error": "An unexpected error occurred"}, status_code=500)
+
+@rate_limit("10 per minute")
+@validate_json(kitchen.gpt_request_schema)
+async def ask_gpt_stream(request):
+    try:
+        user_id = kitchen.token_user_id(bearer_token(request))
+        # Both may block (conversation store, OpenAI summary), so keep them off the event loop
+        history, new_messages, conversation_id = await asyncio.to_thread(kitchen.load_conversation, request.state.json, user_id)
+        messages, user_message = await asyncio.to_thread(kitchen.prepare_gpt_messages, new_messages, history)
+        if not user_message:
+            return JSONResponse({"error": "No user message found"}, status_code=400)
+        return stream_gpt_reply(messages, user_message, conversation_id, user_id)
+    except ConversationNotFound:
+        return JSONResponse({"error": "Conversation not found or expired"}, status_code=404)
+    except ContextTooLarge:
+        return JSONResponse({"error": "Message is too long"}, status_code=413)
+    except Exception as e:
+        logger.error(f"Unexpected error in ask_gpt_stream: {str(e)}")
+        return JSONResponse({"error": "An unexpected error occurred"}, status_code=500)
+
+@rate_limit("20 per minute")
+@token_required
+@validate_json(kitchen.recipe_schema)
+async def save_recipe(request, user_id):
+    try:
+        recipe = request.state.json.get('recipe')
+
+        # Sanitize recipe data
+        recipe['title'] = kitchen.sanitize_input(recipe['title'])
+        recipe['ingredients'] = kitchen.sanitize_inputs(recipe['ingredients'])
+        recipe['instructions'] = kitchen.sanitize_input(recipe['instructions'])
+        recipe['created_at'] = datetime.utcnow().isoformat()
+
+        try:
+            with firestore_timer('write'):
+                await async_db.collection('users').document(user_id).collection('recipes').add(recipe)
+            return JSONResponse({"status": "Recipe saved"})
+        except Exception as e:
+            logger.error(f"Firebase error saving recipe: {str(e)}")
+            return JSONResponse({"error": "Failed to save recipe"}, status_code=500)
+    except Exception as e:
+        logger.error(f"Unexpected error in save_recipe: {str(e)}")
+        return JSONResponse({"error": "An unexpected error occurred"}, status_code=500)
+
+async def stream_recipes(docs, limit=None):
+    """Async twin of app.stream_recipes"""
+    if limit is None:
+        yield '['
+        first = True
+        async for doc in docs:
+            yield ('' if first else ',') + kitchen.recipe_json(doc)
+            first = False
+        yield ']'
+        return
+
+    yield '{"recipes": ['
+    count = 0
+    next_cursor = None
+    async for doc in docs:
+        if count == limit:
+            next_cursor = previous_id
+            break
+        yield (',' if count else '') + kitchen.recipe_json(doc)
+        previous_id = doc.id
+        count += 1
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+@default_rate_limit
+@token_required
+async def get_recipes(request, user_id):
+    try:
+        recipes_ref = async_db.collection('users').document(user_id).collection('recipes')
+        query, limit, error = kitchen.build_recipes_query(recipes_ref, request.query_params)
+        if error:
+            return JSONResponse({"error": error}, status_code=400)
+
+        try:
+            start_after = request.query_params.get('start_after')
+            if start_after:
+                with firestore_timer('read'):
+                    cursor = await recipes_ref.document(start_after).get()
+                if not cursor.exists:
+                    return JSONResponse({"error": "Invalid start_after cursor"}, status_code=400)
+                query = query.start_after(cursor)
+
+            docs = query.stream()
+            if request.query_params.get('stream', '').lower() in ('1', 'true'):
+                return StreamingResponse(stream_recipes(docs, limit), media_type='application/json')
+
+            with firestore_timer('read'):
+                docs = [doc async for doc in docs]
+
+            def build():
+                recipes = []
+                for doc in docs:
+                    r = doc.to_dict()
+                    r['id'] = doc.id
+                    recipes.append(r)
+                if limit is None:
+                    return recipes
+                next_cursor = recipes[limit - 1]['id'] if len(recipes) > limit else None
+                return {"recipes": recipes[:limit], "next_cursor": next_cursor}
+
+            return conditional_json(request, build, docs_etag(docs))
+        except Exception as e:
+            logger.error(f"Firebase error getting recipes: {str(e)}")
+            return JSONResponse({"error": "Failed to retrieve recipes"}, status_code=500)
+    except Exception as e:
+        logger.error(f"Unexpected error in get_recipes: {str(e)}")
+        return JSONResponse({"error": "An unexpected error occurred"}, status_code=500)
+
+@default_rate_limit
+@token_required
+async def get_recipe_detail(request, user_id):
+    try:
+        recipe_id = request.query_params.get('recipe_id')
+        if not recipe_id:
+            return JSONResponse({"error": "Missing recipe_id"}, status_code=400)
+
+        try:
+            with firestore_timer('read'):
+                doc = await async_db.collection('users').document(user_id).collection('recipes').document(recipe_id).get()
+            if not doc.exists:
+                return JSONResponse({"error": "Recipe not found"}, status_code=404)
+            return conditional_json(request, doc.to_dict, docs_etag([doc]), doc.update_time)
+        except Exception as e:
+            logger.error(f"Firebase error getting recipe detail: {str(e)}")
+            return JSONResponse({"error": "Failed to retrieve recipe details"}, status_code=500)
+    except Exception as e:
+        logger.error(f"Unexpected error in get_recipe_detail: {str(e)}")
+        return JSONResponse({"error": "An unexpected error occurred"}, status_code=500)
+
+@default_rate_limit
+@token_required
+async def delete_recipe(request, user_id):
+    try:
+        recipe_id = request.query_params.get('recipe_id')
+        if not recipe_id:
+            return JSONResponse({'error': 'Missing recipe_id'}, status_code=400)
+
+        try:
+            recipe_ref = async_db.collection('users').document(user_id).collection('recipes').document(recipe_id)
+            with firestore_timer('read'):
+                exists = (await recipe_ref.get()).exists
+            if not exists:
+                return JSONResponse({'error': 'Recipe not found'}, status_code=404)
+
+            with firestore_timer('write'):
+                await recipe_ref.delete()
+            return JSONResponse({'message': 'Recipe deleted successfully'})
+        except Exception as e:
+            logger.error(f"Firebase error deleting recipe: {str(e)}")
+            return JSONResponse({"error": "Failed to delete recipe"}, status_code=500)
+    except Exception as e:
+        logger.error(f"Unexpected error in delete_recipe: {str(e)}")
+        return JSONResponse({"error": "An unexpected error occurred"}, status_code=500)
+
+async def get_user_data(user_id):
+    """Read a user document through the shared user cache"""
+    found, data = kitchen.user_cache.lookup(user_id)
+    if found:
+        return data
+    with firestore_timer('read'):
+        doc = await async_db.collection('users').document(user_id).get()
+    return kitchen.user_cache.store(user_id, doc.to_dict() if doc.exists else None)
+
+@default_rate_limit
+@token_required
+async def get_pantry(request, user_id):
+    try:
+        try:
+            user_data = await get_user_data(user_id)
+            user_data = user_data or {}
+            payload = {
+                "pantry": user_data.get('pantry', []),
+                "version": user_data.get('pantry_version', 0)
+            }
+            return conditional_json(request, lambda: payload, payload_etag(payload))
+        except Exception as e:
+            logger.error(f"Firebase error getting pantry: {str(e)}")
+            return JSONResponse({"error": "Failed to retrieve pantry"}, status_code=500)
+    except Exception as e:
+        logger.error(f"Unexpected error in get_pantry: {str(e)}")
+        return JSONResponse({"error": "An unexpected error occurred"}, status_code=500)
+
+@asynccontextmanager
+async def lifespan(application):
+    # The one pool behind the Flask fallback (PooledWsgiToAsgi) and asyncio.to_thread
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+    )
+    yield
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs the WSGI app thread-sensitively, i.e. every request of the
+    # worker on one shared thread; run each on the default executor instead
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func, thread_sensitive=False)
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi serving concurrent requests on the event loop's default executor"""
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+def instrumented(endpoint):
+    """Record request_seconds and label Firestore timings the way app.py's request hooks do"""
+    @wraps(endpoint)
+    async def timed_endpoint(request):
+        started = time.perf_counter()
+        metrics.current_route.set(endpoint.__name__)
+        status = 500
+        try:
+            response = await endpoint(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.request_seconds.observe(
+                time.perf_counter() - started,
+                route=endpoint.__name__,
+                method=request.method,
+                status=status
+            )
+    return timed_endpoint
+
+def native_route(path, endpoint, method):
+    """Async route with the same CORS policy Flask-CORS applies to the Flask routes"""
+    return Route(path, instrumented(endpoint), methods=[method, 'OPTIONS'], middleware=[Middleware(
+        CORSMiddleware,
+        allow_origins=os.getenv("ALLOWED_ORIGINS", "*").split(","),
+        allow_methods=['*'],
+        allow_headers=['*']
+    )])
+
+application = Starlette(
+    routes=[
+        native_route('/ask_gpt', ask_gpt, 'POST'),
+        native_route('/ask_gpt/stream', ask_gpt_stream, 'POST'),
+        native_route('/save_recipe', save_recipe, 'POST'),
+        native_route('/get_recipes', get_recipes, 'GET'),
+        native_route('/get_recipe_detail', get_recipe_detail, 'GET'),
+        native_route('/delete_recipe', delete_recipe, 'DELETE'),
+        native_route('/get_pantry', get_pantry, 'GET'),
+        # Everything else is served by the Flask app on the thread pool
+        Mount('/', app=PooledWsgiToAsgi(kitchen.app))
+    ],
+    lifespan=lifespan
+)
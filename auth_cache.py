@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from google.auth import jwt as google_jwt
+
+from metrics import firestore_timer
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+def token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+class TokenCache:
+    """Bounded LRU of verified token -> claims.
+
+    Each entry is dropped once the token's own exp has passed, so a cached
+    token is never accepted for longer than a fresh decode would accept it.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is not None and entry['exp'] > time.time():
+                self.entries.move_to_end(token)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self.entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token, claims):
+        if 'exp' not in claims:
+            return
+        with self.lock:
+            self.entries[token] = claims
+            self.entries.move_to_end(token)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def verify(self, token, decode):
+        """Cached claims for token, or decode(token) (which raises on invalid tokens) cached until exp"""
+        claims = self.get(token)
+        if claims is None:
+            claims = decode(token)
+            self.put(token, claims)
+        return claims
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self.entries),
+                'capacity': self.capacity,
+                'evictions': self.evictions
+            }
+
+class RevocationList:
+    """Tokens revoked before their exp, checked in memory on every request.
+
+    revoke() records the token's sha256 locally and, when a db is given, in
+    the revoked_tokens collection; each worker polls that collection every
+    refresh seconds for documents created since its last poll, so a logout
+    reaches the other workers within that window. Entries are forgotten (and
+    their documents deleted) once the token would have expired anyway.
+    """
+
+    def __init__(self, db=None, collection='revoked_tokens', refresh=30, overlap=60, purge_batch=500):
+        self.db = db
+        self.collection = collection
+        self.refresh = refresh
+        self.overlap = overlap  # re-read window covering clock skew between workers
+        self.purge_batch = purge_batch
+        self.revoked = {}  # sha256 -> exp timestamp
+        self.last_poll = None
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started or self.db is None:
+                return
+            self.started = True
+        threading.Thread(target=self._poll, name="revocation-refresh", daemon=True).start()
+
+    def revoke(self, token, exp):
+        digest = token_digest(token)
+        with self.lock:
+            self.revoked[digest] = exp
+        if self.db is not None:
+            with firestore_timer('write'):
+                self.db.collection(self.collection).document(digest).set({'exp': exp, 'created_at': time.time()})
+
+    def is_revoked(self, token):
+        with self.lock:
+            return token_digest(token) in self.revoked
+
+    def load(self):
+        """Merge in the entries revoked since the last poll, then drop and delete the expired ones.
+
+        The first load reads the whole collection; after that only documents
+        with created_at > the previous poll (less the overlap) are read, so an
+        idle poll costs no document reads for the revocations already known.
+        """
+        now = time.time()
+        collection = self.db.collection(self.collection)
+        query = collection
+        if self.last_poll is not None:
+            query = collection.where('created_at', '>', self.last_poll - self.overlap)
+        with firestore_timer('read'):
+            docs = list(query.stream())
+        with self.lock:
+            for doc in docs:
+                exp = doc.to_dict().get('exp', 0)
+                if exp > now:
+                    self.revoked[doc.id] = exp
+            self.revoked = {digest: exp for digest, exp in self.revoked.items() if exp > now}
+        self.last_poll = now
+
+        with firestore_timer('read'):
+            expired = list(collection.where('exp', '<=', now).limit(self.purge_batch).stream())
+        for doc in expired:
+            doc.reference.delete()
+
+    def _poll(self):
+        while True:
+            try:
+                self.load()
+            except Exception as e:
+                logger.warning(f"Failed to refresh revoked tokens: {str(e)}")
+            time.sleep(self.refresh)
+
+    def stats(self):
+        with self.lock:
+            return {'revoked': len(self.revoked)}
+
+class FirebaseTokenVerifier:
+    """Verifies Firebase ID tokens locally against a prefetched certificate set.
+
+    The Google signing certificates are fetched at start() and refreshed in
+    the background shortly before their Cache-Control max-age runs out, so a
+    request never waits on the certificate download. Verified claims are
+    cached until the token expires. The checks match
+    firebase_admin.auth.verify_id_token (without check_revoked).
+    """
+
+    def __init__(self, project_id, http, token_cache=None, clock_skew=0):
+        self.project_id = project_id
+        self.issuer = f"https://securetoken.google.com/{project_id}"
+        self.http = http
+        self.token_cache = token_cache or TokenCache()
+        self.clock_skew = clock_skew
+        self.certs = {}
+        self.fetched_at = 0
+        self.lock = threading.Lock()
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        try:
+            max_age = self._fetch_certs()
+        except Exception as e:
+            logger.warning(f"Failed to prefetch Firebase certificates: {str(e)}")
+            max_age = 0
+        threading.Thread(target=self._refresh, args=(max_age,), name="firebase-certs", daemon=True).start()
+
+    def verify(self, token):
+        """Decoded claims with 'uid' set; raises ValueError for an invalid token"""
+        return self.token_cache.verify(token, self._decode)
+
+    def _decode(self, token):
+        header = google_jwt.decode_header(token)
+        if header.get('alg') != 'RS256' or 'kid' not in header:
+            raise ValueError("Firebase ID token has an unexpected header")
+        with self.lock:
+            certs = self.certs
+        if header['kid'] not in certs and time.time() - self.fetched_at > 60:
+            # Keys rotated since the last refresh
+            self._fetch_certs()
+            with self.lock:
+                certs = self.certs
+        claims = google_jwt.decode(token, certs=certs, audience=self.project_id,
+                                   clock_skew_in_seconds=self.clock_skew)
+        if claims.get('iss') != self.issuer:
+            raise ValueError("Firebase ID token has an incorrect issuer")
+        subject = claims.get('sub')
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError("Firebase ID token has an invalid subject")
+        claims['uid'] = subject
+        return claims
+
+    def _fetch_certs(self):
+        """Download the signing certificates; returns their max-age in seconds"""
+        response = self.http.get(FIREBASE_CERTS_URL)
+        response.raise_for_status()
+        certs = response.json()
+        with self.lock:
+            self.certs = certs
+            self.fetched_at = time.time()
+        match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+        return int(match.group(1)) if match else 3600
+
+    def _refresh(self, max_age):
+        while True:
+            # Refresh at 90% of max-age; retry after a minute if a fetch fails
+            time.sleep(max(60, max_age * 0.9))
+            try:
+                max_age = self._fetch_certs()
+            except Exception as e:
+                logger.warning(f"Failed to refresh Firebase certificates: {str(e)}")
+                max_age = 0
+
+def create_token_cache():
+    return TokenCache(capacity=int(os.getenv("AUTH_CACHE_SIZE", "10000")))
+
+def create_revocation_list(db):
+    return RevocationList(db, refresh=float(os.getenv("AUTH_REVOCATION_REFRESH_SECONDS", "30")))
@@ -0,0 +1,66 @@
+"""Micro-benchmark: single-pass affiliate matcher vs the original per-keyword loop.
+
+Run from the repository root:
+
+    python benchmarks/bench_affiliate_links.py [--iterations 2000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from affiliates import affiliate_links, add_affiliate_links
+
+def legacy_add_affiliate_links(text):
+    """The implementation add_affiliate_links replaced"""
+    added = 0
+    for keyword, url in affiliate_links.items():
+        if re.search(rf"\b{re.escape(keyword)}\b", text, re.IGNORECASE) and added < 4:
+            text = re.sub(rf"\b({re.escape(keyword)})\b", f"[\\1]({url})", text, count=1, flags=re.IGNORECASE)
+            added += 1
+    return text
+
+FILLER = (
+    "Preheat the oven to 350°F and line the tin with parchment. Cream the butter and sugar until "
+    "light and fluffy, about three minutes. Beat in the eggs one at a time, scraping down the bowl "
+    "between additions. Fold the dry ingredients in gently so the crumb stays tender. Bake until a "
+    "toothpick comes out with a few moist crumbs, then cool for ten minutes before slicing."
+).split()
+
+def make_reply(keyword_count, rng, target_words=520):
+    """Build a ~700-token reply with keyword_count affiliate keywords sprinkled in"""
+    words = [rng.choice(FILLER) for _ in range(target_words)]
+    keywords = list(affiliate_links)
+    for _ in range(keyword_count):
+        words.insert(rng.randrange(len(words)), rng.choice(keywords).title() if rng.random() < 0.3 else rng.choice(keywords))
+    lines = [' '.join(words[i:i + 14]) for i in range(0, len(words), 14)]
+    return '\n'.join(f"- {line}" if i % 5 == 0 else line for i, line in enumerate(lines))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    corpus = {
+        "no keywords": [make_reply(0, rng) for _ in range(20)],
+        "few keywords (2)": [make_reply(2, rng) for _ in range(20)],
+        "many keywords (12)": [make_reply(12, rng) for _ in range(20)],
+    }
+
+    print(f"{'corpus':<20} {'legacy µs':>11} {'matcher µs':>11} {'speedup':>8}")
+    for name, replies in corpus.items():
+        for reply in replies:
+            assert len(re.findall(r"\]\(https://amzn\.to/", add_affiliate_links(reply))) <= 4
+
+        def run(fn):
+            return min(timeit.repeat(lambda: [fn(r) for r in replies], number=max(args.iterations // len(replies), 1), repeat=3))
+
+        calls = max(args.iterations // len(replies), 1) * len(replies)
+        legacy = run(legacy_add_affiliate_links) / calls * 1e6
+        current = run(add_affiliate_links) / calls * 1e6
+        print(f"{name:<20} {legacy:>11.1f} {current:>11.1f} {legacy / current:>7.1f}x")
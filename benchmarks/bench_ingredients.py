@@ -0,0 +1,52 @@
+"""Benchmark: structured ingredient parser vs the original extract_ingredients.
+
+Parses the saved replies in benchmarks/data/recipe_replies.json with both
+implementations and reports time per reply. Run from the repository root:
+
+    python benchmarks/bench_ingredients.py [--iterations 2000] [--show]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from ingredients import parse_ingredients
+
+def legacy_extract_ingredients(text):
+    """The implementation parse_ingredients replaced"""
+    lines = text.split('\n')
+    ingredients = []
+    for line in lines:
+        match = re.match(r'- (.+)', line)
+        if match:
+            ingredient = re.sub(r'\d+([\/\.]?\d+)?\s?(cups?|cup|tbsp|tsp|oz|g|ml)?\s?', '', match.group(1), flags=re.IGNORECASE)
+            ingredients.append(ingredient.strip())
+    return list(set(ingredients))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--show", action="store_true", help="Print what each parser extracts")
+    args = parser.parse_args()
+
+    with open(os.path.join(BENCH_DIR, 'data', 'recipe_replies.json'), 'r') as f:
+        replies = json.load(f)
+
+    if args.show:
+        for reply in replies:
+            print(reply.splitlines()[0])
+            print(f"  legacy: {len(legacy_extract_ingredients(reply))} items")
+            for record in parse_ingredients(reply):
+                print(f"  {record}")
+
+    number = max(args.iterations // len(replies), 1)
+    calls = number * len(replies)
+    for name, fn in (("legacy extract_ingredients", legacy_extract_ingredients), ("parse_ingredients", parse_ingredients)):
+        best = min(timeit.repeat(lambda: [fn(r) for r in replies], number=number, repeat=3))
+        found = sum(len(fn(r)) for r in replies)
+        print(f"{name:<28} {best / calls * 1e6:8.1f} µs/reply  {found:3d} ingredients found")
@@ -0,0 +1,100 @@
+"""Login hashing throughput: inline on request threads vs the process pool.
+
+Runs pbkdf2_sha256 verifies the way /login does, from --threads concurrent
+"request" threads, first inline and then through PasswordHasher with 1..N
+pool workers, and prints logins per second overall and per core. A last
+burst shows how quickly requests past PASSWORD_HASH_MAX_PENDING are turned
+away. Run from the repository root:
+
+    python benchmarks/bench_password_hashing.py [--rounds 29000] [--threads 16] [--duration 5]
+
+For the end-to-end view through the app, use loadtest.py --scenarios login.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from passlib.hash import pbkdf2_sha256
+
+from password_hashing import PasswordHasher, PasswordHasherBusy
+
+def run(hasher, stored_hash, threads, duration):
+    """Verify from `threads` threads for `duration` seconds; returns (logins, rejected, seconds)"""
+    counts = {'ok': 0, 'rejected': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop():
+        ok = rejected = 0
+        while time.perf_counter() < deadline:
+            try:
+                if hasher.verify('bench-password', stored_hash):
+                    ok += 1
+            except PasswordHasherBusy:
+                rejected += 1
+                time.sleep(0.001)
+        with lock:
+            counts['ok'] += ok
+            counts['rejected'] += rejected
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return counts['ok'], counts['rejected'], time.perf_counter() - started
+
+def burst(hasher, stored_hash, size):
+    """Fire `size` verifies at once; returns (served, rejected, slowest rejection in ms)"""
+    def attempt(_):
+        started = time.perf_counter()
+        try:
+            hasher.verify('bench-password', stored_hash)
+            return True, 0.0
+        except PasswordHasherBusy:
+            return False, (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(size) as executor:
+        results = list(executor.map(attempt, range(size)))
+    rejections = [ms for ok, ms in results if not ok]
+    return len(results) - len(rejections), len(rejections), max(rejections, default=0.0)
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=pbkdf2_sha256.default_rounds)
+    parser.add_argument("--threads", type=int, default=max(8, cores * 2), help="Concurrent request threads")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per configuration")
+    parser.add_argument("--max-workers", type=int, default=cores)
+    args = parser.parse_args()
+
+    stored_hash = pbkdf2_sha256.using(rounds=args.rounds).hash('bench-password')
+    print(f"pbkdf2_sha256, {args.rounds} rounds, {args.threads} request threads, {cores} cores")
+    print(f"{'mode':<14}{'logins/s':>10}{'per core':>10}{'rejected':>10}")
+
+    configs = [('inline', 0)] + [(f"pool x{n}", n) for n in range(1, args.max_workers + 1)]
+    for label, workers in configs:
+        hasher = PasswordHasher(rounds=args.rounds, workers=workers, max_pending=args.threads)
+        hasher.verify('bench-password', stored_hash)  # start the pool outside the timing
+        logins, rejected, seconds = run(hasher, stored_hash, args.threads, args.duration)
+        used_cores = min(max(workers, 1), cores)
+        rate = logins / seconds
+        print(f"{label:<14}{rate:>10.1f}{rate / used_cores:>10.1f}{rejected:>10}")
+        if hasher.executor is not None:
+            hasher.executor.shutdown()
+
+    hasher = PasswordHasher(rounds=args.rounds, workers=cores, max_pending=cores * 2)
+    hasher.verify('bench-password', stored_hash)
+    served, rejected, slowest = burst(hasher, stored_hash, cores * 8)
+    print(f"\nburst of {cores * 8} with max_pending={cores * 2}: {served} served, "
+          f"{rejected} rejected (slowest rejection {slowest:.2f} ms)")
+    hasher.executor.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Micro-benchmark: precompiled sanitize_input / batch sanitize_inputs vs the original three-pass version.
+
+That both give exactly the original function's output is checked by
+tests/test_sanitize.py. Run from the repository root:
+
+    python benchmarks/bench_sanitize.py [--iterations 2000]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sanitize import sanitize_input, sanitize_inputs
+
+def legacy_sanitize_input(text):
+    """The implementation sanitize_input replaced"""
+    if not isinstance(text, str):
+        return ""
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'<script.*?>.*?</script>', '', text, flags=re.DOTALL)
+    text = re.sub(r'[<>{}[\]\\]', '', text)
+    return text.strip()
+
+INGREDIENTS = [
+    "2 cups all-purpose flour", "1 tsp baking soda", "1/2 cup unsalted butter, softened",
+    "3 large eggs", "salt [to taste]", "1 cup milk (whole)", "2 cloves garlic, minced",
+    "1 can (14 oz) diced tomatoes", "fresh basil", "olive oil", "<b>1 lb</b> chicken thighs",
+]
+
+INSTRUCTIONS = (
+    "Preheat the oven to 350°F and line the tin with parchment. Cream the butter and sugar until "
+    "light and fluffy, about three minutes. Beat in the eggs one at a time, scraping down the bowl "
+    "between additions. Fold the dry ingredients in gently so the crumb stays tender. "
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    corpus = {
+        "pantry (200 items)": [rng.choice(INGREDIENTS) for _ in range(200)],
+        "ingredients (25)": [rng.choice(INGREDIENTS) for _ in range(25)],
+        "instructions (2 KB)": [INSTRUCTIONS * 8],
+        "markup (2 KB)": ["<p>Mix the <b>{flour}</b> and [sugar], then fold.</p> " * 40],
+    }
+    print(f"{'corpus':<22} {'legacy µs':>11} {'single µs':>11} {'batch µs':>11} {'speedup':>8}")
+    for name, items in corpus.items():
+        number = max(args.iterations // len(items), 1)
+
+        def run(fn):
+            return min(timeit.repeat(lambda: fn(items), number=number, repeat=3)) / number * 1e6
+
+        legacy = run(lambda items: [legacy_sanitize_input(item) for item in items])
+        single = run(lambda items: [sanitize_input(item) for item in items])
+        batch = run(sanitize_inputs)
+        print(f"{name:<22} {legacy:>11.1f} {single:>11.1f} {batch:>11.1f} {legacy / min(single, batch):>7.1f}x")
@@ -0,0 +1,255 @@
+"""In-memory stand-in for the parts of the Firestore client the app uses.
+
+Covers collection/document reads and writes, where/select/order_by/limit/
+start_after queries, batches, get_all, transactions and Increment transforms.
+Everything is guarded by one lock, so it is consistent but not meant to model
+Firestore latency; loadtest.py uses it to measure the app itself.
+"""
+import copy
+import operator
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+class NotFound(Exception):
+    pass
+
+class Conflict(Exception):
+    pass
+
+OPERATORS = {'==': operator.eq, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def _apply_transforms(current, data):
+    """Resolve Increment / ArrayUnion / ArrayRemove values against the stored fields"""
+    result = {}
+    for field, value in data.items():
+        kind = type(value).__name__
+        if kind == 'Increment':
+            result[field] = current.get(field, 0) + value.value
+        elif kind == 'ArrayUnion':
+            existing = list(current.get(field) or [])
+            result[field] = existing + [v for v in value.values if v not in existing]
+        elif kind == 'ArrayRemove':
+            result[field] = [v for v in current.get(field) or [] if v not in value.values]
+        else:
+            result[field] = copy.deepcopy(value)
+    return result
+
+class FakeSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None, fields=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self._fields = fields
+        self.create_time = create_time
+        self.update_time = update_time
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        if self._fields is not None:
+            return {k: copy.deepcopy(v) for k, v in self._data.items() if k in self._fields}
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+class FakeDocumentReference:
+    def __init__(self, db, path):
+        self._db = db
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollectionReference(self._db, self.path + (name,))
+
+    def get(self, transaction=None, field_paths=None):
+        with self._db.lock:
+            entry = self._db.entry(self.path)
+            if entry is None:
+                return FakeSnapshot(self, None)
+            return FakeSnapshot(self, entry['data'], entry['create_time'], entry['update_time'], field_paths)
+
+    def create(self, data):
+        with self._db.lock:
+            if self._db.entry(self.path) is not None:
+                raise Conflict(f"Document already exists: {'/'.join(self.path)}")
+            self._db.write(self.path, _apply_transforms({}, data))
+
+    def set(self, data, merge=False):
+        with self._db.lock:
+            entry = self._db.entry(self.path)
+            current = entry['data'] if entry and merge else {}
+            new_data = dict(current)
+            new_data.update(_apply_transforms(current, data))
+            self._db.write(self.path, new_data)
+
+    def update(self, data):
+        with self._db.lock:
+            entry = self._db.entry(self.path)
+            if entry is None:
+                raise NotFound(f"No document to update: {'/'.join(self.path)}")
+            new_data = dict(entry['data'])
+            new_data.update(_apply_transforms(entry['data'], data))
+            self._db.write(self.path, new_data)
+
+    def delete(self):
+        with self._db.lock:
+            self._db.collections[self.path[:-1]].pop(self.id, None)
+
+    def on_snapshot(self, callback):
+        raise NotImplementedError("Snapshot listeners are not supported by the in-memory Firestore")
+
+class FakeQuery:
+    def __init__(self, db, path, filters=(), fields=None, orders=(), limit_count=None, cursor=None):
+        self._db = db
+        self._path = path
+        self._filters = tuple(filters)
+        self._fields = fields
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, fields=self._fields, orders=self._orders,
+                     limit_count=self._limit, cursor=self._cursor)
+        state.update(changes)
+        return FakeQuery(self._db, self._path, **state)
+
+    def where(self, field, op, value):
+        if op not in OPERATORS:
+            raise NotImplementedError(f"Unsupported operator: {op}")
+        return self._copy(filters=self._filters + ((field, OPERATORS[op], value),))
+
+    def select(self, field_paths):
+        return self._copy(fields=set(field_paths))
+
+    def order_by(self, field, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, snapshot):
+        return self._copy(cursor=snapshot)
+
+    def stream(self, transaction=None):
+        with self._db.lock:
+            rows = []
+            for doc_id, entry in self._db.collections[self._path].items():
+                data = entry['data']
+                # As in Firestore, a document without the field never matches a filter on it
+                if any(field not in data or not compare(data[field], value) for field, compare, value in self._filters):
+                    continue
+                if any(field not in data for field, _ in self._orders):
+                    continue
+                rows.append((self._path + (doc_id,), entry))
+
+            # Firestore sorts on each order_by field in turn, then on the document id;
+            # stable sorts applied last key first give the same order
+            rows.sort(key=lambda row: row[0][-1])
+            for field, direction in reversed(self._orders):
+                rows.sort(key=lambda row: row[1]['data'][field], reverse=str(direction).upper().startswith('DESC'))
+
+            if self._cursor is not None:
+                ids = [path[-1] for path, _ in rows]
+                if self._cursor.id in ids:
+                    rows = rows[ids.index(self._cursor.id) + 1:]
+            if self._limit is not None:
+                rows = rows[:self._limit]
+
+            snapshots = [
+                FakeSnapshot(FakeDocumentReference(self._db, path), entry['data'],
+                             entry['create_time'], entry['update_time'], self._fields)
+                for path, entry in rows
+            ]
+        return iter(snapshots)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, db, path):
+        super().__init__(db, path)
+        self.id = path[-1]
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._db, self._path + (document_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data, document_id=None):
+        ref = self.document(document_id)
+        ref.set(data)
+        return _now(), ref
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def create(self, ref, data):
+        self._ops.append(lambda: ref.create(data))
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self._ops.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self._ops.append(ref.delete)
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        with self._db.lock:
+            for op in ops:
+                op()
+
+class FakeTransaction(FakeWriteBatch):
+    pass
+
+def transactional(fn):
+    """Replacement for firestore.transactional: run fn and its writes under the store lock"""
+    def wrapper(transaction, *args, **kwargs):
+        with transaction._db.lock:
+            result = fn(transaction, *args, **kwargs)
+            transaction.commit()
+        return result
+    return wrapper
+
+class FakeFirestore:
+    def __init__(self):
+        # collection path tuple -> {document id: {'data', 'create_time', 'update_time'}}
+        self.collections = defaultdict(dict)
+        self.lock = threading.RLock()
+
+    def entry(self, path):
+        return self.collections[path[:-1]].get(path[-1])
+
+    def write(self, path, data):
+        now = _now()
+        entry = self.entry(path)
+        self.collections[path[:-1]][path[-1]] = {
+            'data': data,
+            'create_time': entry['create_time'] if entry else now,
+            'update_time': now
+        }
+
+    def collection(self, name):
+        return FakeCollectionReference(self, (name,))
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        return [ref.get(field_paths=field_paths) for ref in references]
@@ -0,0 +1,307 @@
+"""Offline load test: drive the app against stub upstreams and report latency percentiles.
+
+Starts the OpenAI/Spoonacular/SMTP stubs and the app (serve_offline.py, with
+the in-memory Firestore) in subprocesses, then runs each scenario for
+--duration seconds at --concurrency and prints throughput and p50/p95/p99.
+Run from the repository root:
+
+    python benchmarks/loadtest.py [--scenarios ask_gpt,login,get_recipes] [--concurrency 8] [--duration 10]
+
+Save a run with --json results.json; pass it back as --baseline on a later
+run to exit non-zero when any scenario loses more than --max-regression of
+its throughput or gains as much p95 latency.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.join(BENCH_DIR, '..')
+
+DISHES = [
+    "banana bread", "chicken curry", "vegan lasagna", "chocolate chip cookies", "beef stew",
+    "gluten free pancakes", "shrimp tacos", "mushroom risotto", "lemon bars", "pad thai",
+    "french onion soup", "carrot cake", "falafel", "chicken pot pie", "matcha cheesecake"
+]
+
+class Worker:
+    """Per-thread HTTP session, auth token and counter"""
+
+    def __init__(self, base_url, index, users):
+        self.base_url = base_url
+        self.index = index
+        self.username = f"bench-user-{index % users}"
+        self.session = requests.Session()
+        self.token = None
+        self.count = 0
+
+    def url(self, path):
+        return self.base_url + path
+
+    def auth(self):
+        return {'Authorization': f"Bearer {self.token}"}
+
+    def login(self):
+        response = self.session.post(self.url('/login'), json={
+            'username': self.username,
+            'password': os.getenv("BENCH_PASSWORD", "bench-password"),
+            'email': f"{self.username}@bench.test"
+        })
+        response.raise_for_status()
+        self.token = response.json()['access_token']
+
+def ask_gpt(worker, distinct):
+    dish = DISHES[worker.count % len(DISHES)]
+    if distinct:
+        # A fresh question every time, so neither the exact nor the semantic cache can answer it
+        dish = f"{dish} variation {uuid.uuid4().hex[:8]}"
+    return worker.session.post(worker.url('/ask_gpt'), json={'messages': [{'role': 'user', 'content': f"How do I make {dish}?"}]})
+
+def ask_gpt_stream(worker, distinct):
+    dish = DISHES[worker.count % len(DISHES)]
+    if distinct:
+        dish = f"{dish} variation {uuid.uuid4().hex[:8]}"
+    response = worker.session.post(
+        worker.url('/ask_gpt/stream'),
+        json={'messages': [{'role': 'user', 'content': f"How do I make {dish}?"}]},
+        stream=True
+    )
+    for _ in response.iter_content(chunk_size=None):
+        pass
+    return response
+
+def login(worker, distinct):
+    return worker.session.post(worker.url('/login'), json={
+        'username': worker.username,
+        'password': os.getenv("BENCH_PASSWORD", "bench-password"),
+        'email': f"{worker.username}@bench.test"
+    })
+
+def register(worker, distinct):
+    name = f"load-{uuid.uuid4().hex[:12]}"
+    return worker.session.post(worker.url('/register'), json={
+        'username': name,
+        'password': 'bench-password',
+        'email': f"{name}@bench.test"
+    })
+
+def get_recipes(worker, distinct):
+    return worker.session.get(worker.url('/get_recipes'), params={'limit': 20, 'order_by': '-created_at'}, headers=worker.auth())
+
+def pantry(worker, distinct):
+    # Add, remove, then read back, in rotation
+    step = worker.count % 3
+    item = f"bench item {worker.index}-{worker.count // 3}"
+    if step == 0:
+        return worker.session.post(worker.url('/pantry/items'), json={'items': [item]}, headers=worker.auth())
+    if step == 1:
+        return worker.session.delete(worker.url('/pantry/items'), json={'items': [item]}, headers=worker.auth())
+    return worker.session.get(worker.url('/get_pantry'), headers=worker.auth())
+
+SCENARIOS = {
+    'ask_gpt': ask_gpt,
+    'ask_gpt_stream': ask_gpt_stream,
+    'login': login,
+    'register': register,
+    'get_recipes': get_recipes,
+    'pantry': pantry
+}
+AUTHENTICATED = {'get_recipes', 'pantry'}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def run_scenario(name, base_url, concurrency, duration, users, distinct):
+    """Run one scenario; returns a summary dict with latencies in milliseconds"""
+    fn = SCENARIOS[name]
+    workers = [Worker(base_url, i, users) for i in range(concurrency)]
+    if name in AUTHENTICATED:
+        for worker in workers:
+            worker.login()
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def loop(worker):
+        local_latencies = []
+        local_errors = []
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = fn(worker, distinct)
+                ok = response.status_code < 400
+                if not ok:
+                    local_errors.append(str(response.status_code))
+            except requests.RequestException as e:
+                ok = False
+                local_errors.append(type(e).__name__)
+            if ok:
+                local_latencies.append(time.perf_counter() - started)
+            worker.count += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors.extend(local_errors)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=loop, args=(worker,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'requests': len(latencies) + len(errors),
+        'errors': len(errors),
+        'error_kinds': sorted(set(errors)),
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000
+    }
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not come up at {url}")
+
+def start_server(args, ports, workdir):
+    port = free_port()
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=f"http://127.0.0.1:{ports['openai']}/v1",
+        SPOONACULAR_BASE_URL=f"http://127.0.0.1:{ports['spoonacular']}",
+        SPOONACULAR_CACHE_PATH=os.path.join(workdir, 'spoonacular_cache.sqlite3'),
+        SMTP_SERVER='127.0.0.1',
+        SMTP_PORT=str(ports['smtp']),
+        SMTP_STARTTLS='false',
+        BENCH_USERS=str(args.users),
+        BENCH_RECIPES=str(args.recipes),
+        PYTHONUNBUFFERED='1'
+    )
+    if args.cold:
+        env.update(RECIPE_CACHE_TTL_SECONDS='0', SEMANTIC_CACHE_ENABLED='false', SPOONACULAR_CACHE_TTL_SECONDS='0')
+
+    if args.server == 'gunicorn':
+        env.update(SERVER_MODE='wsgi', PORT=str(port))
+        command = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT_DIR, 'gunicorn.conf.py'),
+                   '--pythonpath', BENCH_DIR, 'serve_offline:app']
+    else:
+        command = [sys.executable, os.path.join(BENCH_DIR, 'serve_offline.py'), '--port', str(port)]
+
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    process = subprocess.Popen(command, env=env, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    wait_for(base_url + '/', process)
+    return process, base_url
+
+def compare(results, baseline, max_regression):
+    """Return the list of regressions against a saved run"""
+    previous = {r['scenario']: r for r in baseline}
+    failures = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if not before:
+            continue
+        if result['throughput'] < before['throughput'] * (1 - max_regression):
+            failures.append(f"{result['scenario']}: throughput {before['throughput']:.1f} -> {result['throughput']:.1f} req/s")
+        if result['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            failures.append(f"{result['scenario']}: p95 {before['p95_ms']:.1f} -> {result['p95_ms']:.1f} ms")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=','.join(SCENARIOS), help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--server", choices=['flask', 'gunicorn'], default='flask')
+    parser.add_argument("--users", type=int, default=20, help="Seeded users")
+    parser.add_argument("--recipes", type=int, default=50, help="Seeded recipes per user")
+    parser.add_argument("--openai-latency", type=float, default=0.8)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--spoonacular-latency", type=float, default=0.3)
+    parser.add_argument("--distinct", action="store_true", help="Make every /ask_gpt question unique")
+    parser.add_argument("--cold", action="store_true", help="Disable the recipe, semantic and Spoonacular caches")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    parser.add_argument("--keep-logs", action="store_true", help="Leave the server log in the temp directory")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix='kitchen-loadtest-')
+    stubs = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'stubs.py'),
+         '--openai-latency', str(args.openai_latency),
+         '--token-delay', str(args.token_delay),
+         '--spoonacular-latency', str(args.spoonacular_latency)],
+        stdout=subprocess.PIPE, text=True
+    )
+    server = None
+    try:
+        ports = json.loads(stubs.stdout.readline())
+        server, base_url = start_server(args, ports, workdir)
+
+        print(f"{'scenario':<16} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        results = []
+        for name in scenarios:
+            result = run_scenario(name, base_url, args.concurrency, args.duration, args.users, args.distinct)
+            results.append(result)
+            print(f"{name:<16} {result['requests']:>8} {result['errors']:>6} {result['throughput']:>8.1f} "
+                  f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['max_ms']:>8.1f}"
+                  + (f"  ({', '.join(result['error_kinds'])})" if result['errors'] else ''))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        stubs.terminate()
+        stubs.wait()
+        if args.keep_logs:
+            print(f"Server log: {os.path.join(workdir, 'server.log')}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        if failures:
+            print("Regressions:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.max_regression:.0%}")
@@ -0,0 +1,95 @@
+"""Serve app.py with Firebase swapped for the in-memory Firestore.
+
+OpenAI, Spoonacular and SMTP are pointed at the stubs through environment
+variables (OPENAI_BASE_URL, SPOONACULAR_BASE_URL, SMTP_SERVER/SMTP_PORT),
+which loadtest.py sets. Rate limiting is switched off and BENCH_USERS
+verified users (bench-user-<n>, password BENCH_PASSWORD) are seeded with
+BENCH_RECIPES recipes each. Run by hand with:
+
+    python benchmarks/serve_offline.py --port 5055
+
+or under gunicorn (SERVER_MODE=wsgi):
+
+    gunicorn -c gunicorn.conf.py --pythonpath benchmarks serve_offline:app
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, BENCH_DIR)
+
+import email_validator
+import firebase_admin
+from firebase_admin import credentials, firestore
+from passlib.hash import pbkdf2_sha256
+
+from fake_firestore import FakeFirestore, transactional
+
+BENCH_PASSWORD = os.getenv("BENCH_PASSWORD", "bench-password")
+
+for name, value in {
+    "OPENAI_API_KEY": "sk-bench",
+    "SPOONACULAR_API_KEY": "bench",
+    "JWT_SECRET_KEY": "bench-secret",
+    "SMTP_SERVER": "127.0.0.1",
+    "SMTP_PORT": "2525",
+    "SMTP_USERNAME": "bench@example.com",
+    "SMTP_PASSWORD": "bench",
+    "SMTP_STARTTLS": "false",
+    "APP_URL": "http://127.0.0.1",
+}.items():
+    os.environ.setdefault(name, value)
+
+db = FakeFirestore()
+credentials.Certificate = lambda *args, **kwargs: None
+firebase_admin.initialize_app = lambda *args, **kwargs: None
+firestore.client = lambda *args, **kwargs: db
+firestore.transactional = transactional
+# Accept *.test addresses and skip the DNS deliverability check
+email_validator.TEST_ENVIRONMENT = True
+
+import app as kitchen  # noqa: E402  (must come after the patches above)
+import user_index  # noqa: E402
+
+kitchen.limiter.enabled = False
+app = kitchen.app
+
+def seed(users, recipes_per_user):
+    """Create verified users with a pantry and saved recipes"""
+    password_hash = pbkdf2_sha256.hash(BENCH_PASSWORD)
+    created_at = datetime.utcnow()
+    for i in range(users):
+        user_ref = db.collection('users').document(f"bench-user-{i}")
+        user_ref.set({
+            'username': f"bench-user-{i}",
+            'email': f"bench-user-{i}@bench.test",
+            'password': password_hash,
+            'created_at': created_at.isoformat(),
+            'auth_provider': 'local',
+            'is_verified': True,
+            'pantry': ['flour', 'sugar', 'eggs', 'butter', 'milk'],
+            'grocery_list': []
+        })
+        for j in range(recipes_per_user):
+            user_ref.collection('recipes').document(f"recipe-{j:04d}").set({
+                'title': f"Benchmark Recipe {j}",
+                'ingredients': ['2 cups flour', '1 cup sugar', '3 eggs'],
+                'instructions': 'Mix everything, bake at 350F for 30 minutes.',
+                'created_at': (created_at - timedelta(minutes=j)).isoformat()
+            })
+    user_index.backfill(db)
+
+seed(int(os.getenv("BENCH_USERS", "20")), int(os.getenv("BENCH_RECIPES", "50")))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app.run(host=args.host, port=args.port, threaded=True)
@@ -0,0 +1,185 @@
+"""Local stand-ins for OpenAI, Spoonacular and the SMTP server.
+
+The OpenAI and Spoonacular stubs answer with canned data after a configurable
+delay; the OpenAI stub also streams its reply chunk by chunk. The SMTP sink
+accepts and discards mail. loadtest.py starts them in a subprocess; to run
+them by hand:
+
+    python benchmarks/stubs.py [--openai-latency 0.8] [--token-delay 0.01] [--spoonacular-latency 0.3]
+
+The ports are printed as one JSON line on stdout.
+"""
+import argparse
+import itertools
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(BENCH_DIR, 'data', 'recipe_replies.json'), 'r') as f:
+    REPLIES = json.load(f)
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeOpenAIHandler(QuietHandler):
+    """POST /v1/chat/completions, plain or streamed"""
+    latency = 0.8
+    token_delay = 0.01
+    chunk_words = 3
+    replies = itertools.cycle(REPLIES)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self.send_json({'error': {'message': 'Not found'}}, 404)
+        request = self.read_json()
+        reply = next(self.replies)
+        words = reply.split(' ')
+        chunks = [' '.join(words[i:i + self.chunk_words]) + ' ' for i in range(0, len(words), self.chunk_words)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get('model', 'gpt-3.5-turbo')
+
+        time.sleep(self.latency)
+        if not request.get('stream'):
+            time.sleep(self.token_delay * len(chunks))
+            return self.send_json({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 200, 'completion_tokens': len(words), 'total_tokens': 200 + len(words)}
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        for content in chunks:
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+class FakeSpoonacularHandler(QuietHandler):
+    """GET /recipes/complexSearch with one canned result"""
+    latency = 0.3
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if not self.path.startswith('/recipes/complexSearch'):
+            return self.send_json({'message': 'Not found'}, 404)
+        self.send_json({
+            'results': [{
+                'id': 1,
+                'title': 'Benchmark Recipe',
+                'image': 'https://img.spoonacular.com/recipes/1-556x370.jpg',
+                'servings': 4,
+                'readyInMinutes': 45,
+                'nutrition': {'nutrients': [
+                    {'name': 'Calories', 'amount': 320.5, 'unit': 'kcal'},
+                    {'name': 'Protein', 'amount': 12.1, 'unit': 'g'}
+                ]}
+            }],
+            'offset': 0,
+            'number': 1,
+            'totalResults': 1
+        })
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, QUIT"""
+    messages = 0
+    lock = threading.Lock()
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost benchmark SMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.wfile.write(b'250-localhost\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n')
+            elif command.startswith(('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command.startswith('AUTH'):
+                self.reply('235 Authentication successful')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                with self.lock:
+                    SMTPSinkHandler.messages += 1
+                self.reply('250 Queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+class ThreadingSMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+def start_stubs(openai_latency=0.8, token_delay=0.01, spoonacular_latency=0.3, host='127.0.0.1'):
+    """Start all three stubs on free ports and return {'openai': port, 'spoonacular': port, 'smtp': port}"""
+    FakeOpenAIHandler.latency = openai_latency
+    FakeOpenAIHandler.token_delay = token_delay
+    FakeSpoonacularHandler.latency = spoonacular_latency
+    return {
+        'openai': serve(ThreadingHTTPServer((host, 0), FakeOpenAIHandler)),
+        'spoonacular': serve(ThreadingHTTPServer((host, 0), FakeSpoonacularHandler)),
+        'smtp': serve(ThreadingSMTPServer((host, 0), SMTPSinkHandler))
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--openai-latency", type=float, default=0.8, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed chunks")
+    parser.add_argument("--spoonacular-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    ports = start_stubs(args.openai_latency, args.token_delay, args.spoonacular_latency)
+    print(json.dumps(ports), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -1,14 +1,21 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import requests
 import os
 import json
 import logging
 from openai import OpenAI
 from dotenv import load_dotenv
 import firebase_admin
-from firebase_admin import credentials, firestore, auth
-import re
+from firebase_admin import credentials, firestore
+from recipe_cache import create_recipe_cache, RecipeCache
+from http_client import get_http_session
+from spoonacular import create_spoonacular_client, EMPTY_RESULT
+from affiliates import add_affiliate_links, affiliate_matcher
+from ingredients import parse_ingredients
+from user_cache import create_user_cache
+from auth_cache import FirebaseTokenVerifier, create_token_cache
+from pantry import ListItemNotFound, apply_list_delta
+from streaming import AffiliateLinkStream, sse_event, wants_event_stream, SSE_HEADERS
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -35,6 +42,9 @@ except Exception as e:
     logger.error(f"Error initializing Firebase: {str(e)}")
     raise
 
+# Short-lived cache of users/{user_id} documents
+user_cache = create_user_cache(db)
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app, resources={r"/*": {
@@ -44,7 +54,7 @@ CORS(app, resources={r"/*": {
         "https://kitchen-companion.onrender.com",
         "https://byjake.com"
     ],
-    "methods": ["GET", "POST", "OPTIONS"],
+    "methods": ["GET", "POST", "DELETE", "OPTIONS"],
     "allow_headers": ["Content-Type", "Authorization"]
 }})
 
@@ -52,57 +62,12 @@ CORS(app, resources={r"/*": {
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SPOONACULAR_API_KEY = os.getenv("SPOONACULAR_API_KEY")
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
+recipe_cache = create_recipe_cache()
+spoonacular_client = create_spoonacular_client(SPOONACULAR_API_KEY, http=get_http_session())
 
-# Affiliate links
-affiliate_links = {
-    "mixer": "https://amzn.to/44QqzQf",
-    "mixing bowl": "https://amzn.to/3SepGJI",
-    "measuring cup": "https://amzn.to/44h5HBt",
-    "spatula": "https://amzn.to/4iILIiP",
-    "scale": "https://amzn.to/4cUBs5t",
-    "rolling pin": "https://amzn.to/3Gy1mQv",
-    "6 inch pan": "https://amzn.to/4lRwo64",
-    "9 inch pan": "https://amzn.to/42xSUtc",
-    "cake decorating": "https://amzn.to/4lUd08m",
-    "whisk": "https://amzn.to/3GwiBlk",
-    "bench scraper": "https://amzn.to/3GzcuN2",
-    "loaf pan": "https://amzn.to/42XzcpD",
-    "almond flour": "https://amzn.to/4iCs3kx",
-    "no sugar added chocolate chips": "https://amzn.to/3SfqlKU",
-    "monk fruit sweetener": "https://amzn.to/4cSRP2u",
-    "coconut sugar": "https://amzn.to/42TZN6S",
-    "whole wheat flour": "https://amzn.to/4jAbpmQ",
-    "cake flour": "https://amzn.to/3YmwUz1",
-    "silicone baking mat": "https://amzn.to/4jJcRmI",
-    "avocado oil": "https://amzn.to/3EwlK43",
-    "digital thermometer": "https://amzn.to/42SIDXr",
-    "food storage containers": "https://amzn.to/4k1U7ip",
-    "baking sheet": "https://amzn.to/44ijPdO",
-    "hand mixer": "https://amzn.to/437UVwi",
-    "wire racks": "https://amzn.to/42Rghg3",
-    "cookie scoop": "https://amzn.to/3EH8Yjd",
-    "food processor": "https://amzn.to/4iLcbvY",
-    "matcha": "https://amzn.to/4d0bGwL",
-    "cocoa powder": "https://amzn.to/42WB3Lp"
-}
-
-def add_affiliate_links(text):
-    added = 0
-    for keyword, url in affiliate_links.items():
-        if re.search(rf"\b{re.escape(keyword)}\b", text, re.IGNORECASE) and added < 4:
-            text = re.sub(rf"\b({re.escape(keyword)})\b", f"[\\1]({url})", text, count=1, flags=re.IGNORECASE)
-            added += 1
-    return text
-
-def extract_ingredients(text):
-    lines = text.split('\n')
-    ingredients = []
-    for line in lines:
-        match = re.match(r'- (.+)', line)
-        if match:
-            ingredient = re.sub(r'\d+([\/\.]?\d+)?\s?(cups?|cup|tbsp|tsp|oz|g|ml)?\s?', '', match.group(1), flags=re.IGNORECASE)
-            ingredients.append(ingredient.strip())
-    return list(set(ingredients))
+# ID tokens are verified locally against prefetched Google certificates and cached until they expire
+firebase_tokens = FirebaseTokenVerifier(cred_dict['project_id'], get_http_session(), create_token_cache())
+firebase_tokens.start()
 
 def verify_firebase_token():
     auth_header = request.headers.get('Authorization')
@@ -112,7 +77,7 @@ def verify_firebase_token():
 
     token = auth_header.split('Bearer ')[1]
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = firebase_tokens.verify(token)
         return decoded_token['uid']
     except Exception as e:
         logger.error(f"Error verifying token: {str(e)}")
@@ -129,6 +94,7 @@ def update_preferences():
         return jsonify({'error': 'Unauthorized'}), 401
     prefs = request.get_json().get('preferences', [])
     db.collection('users').document(user_id).set({'preferences': prefs}, merge=True)
+    user_cache.update(user_id, {'preferences': prefs})
     return jsonify({'status': 'ok'})
 
 @app.route('/update_pantry', methods=['POST', 'OPTIONS'])
@@ -137,17 +103,166 @@ def update_pantry():
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
     items = request.get_json().get('items', [])
-    db.collection('users').document(user_id).set({'pantry': items}, merge=True)
+    db.collection('users').document(user_id).set({'pantry': items, 'pantry_version': firestore.Increment(1)}, merge=True)
+    user_cache.invalidate(user_id)
     return jsonify({'status': 'ok'})
 
+def pantry_delta_response(user_id, operation, **delta):
+    try:
+        pantry, version = apply_list_delta(db, user_id, 'pantry', operation, **delta)
+    except ListItemNotFound:
+        return jsonify({'error': 'Item not found in pantry'}), 404
+    user_cache.update(user_id, {'pantry': pantry, 'pantry_version': version})
+    return jsonify({'pantry': pantry, 'version': version})
+
+@app.route('/pantry/items', methods=['POST', 'DELETE', 'OPTIONS'])
+def update_pantry_items():
+    """Add (POST) or remove (DELETE) just the given pantry items"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    user_id = verify_firebase_token()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    items = [item.strip() for item in request.get_json().get('items', []) if isinstance(item, str) and item.strip()]
+    if not items:
+        return jsonify({'error': 'No items provided'}), 400
+    operation = 'add' if request.method == 'POST' else 'remove'
+    return pantry_delta_response(user_id, operation, items=items)
+
+@app.route('/pantry/items/rename', methods=['POST', 'OPTIONS'])
+def rename_pantry_item():
+    if request.method == 'OPTIONS':
+        return '', 200
+    user_id = verify_firebase_token()
+    if not user_id:
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = request.get_json()
+    rename_from = (data.get('from') or '').strip()
+    rename_to = (data.get('to') or '').strip()
+    if not rename_from or not rename_to:
+        return jsonify({'error': "Both 'from' and 'to' are required"}), 400
+    return pantry_delta_response(user_id, 'rename', rename_from=rename_from, rename_to=rename_to)
+
 @app.route('/get_pantry', methods=['GET'])
 def get_pantry():
     user_id = verify_firebase_token()
     if not user_id:
         return jsonify({'error': 'Unauthorized'}), 401
-    doc = db.collection('users').document(user_id).get()
-    pantry = doc.to_dict().get('pantry', []) if doc.exists else []
-    return jsonify({'pantry': pantry})
+    user_data = user_cache.get(user_id)
+    user_data = user_data or {}
+    return jsonify({'pantry': user_data.get('pantry', []), 'version': user_data.get('pantry_version', 0)})
+
+def get_request_user_id():
+    """Return the Firebase uid for the request, or None for anonymous callers"""
+    try:
+        return verify_firebase_token()
+    except Exception as auth_error:
+        logger.info(f"No valid auth token: {str(auth_error)}")
+        return None
+
+def build_gpt_messages(user_id, messages):
+    """Prepend a system prompt tailored to the user's preferences and pantry.
+
+    Returns (messages, cache_key) where the key covers the conversation, the
+    system prompt, and the preferences and pantry it was built from.
+    """
+    dietary_prefs = []
+    pantry_items = []
+    if user_id:
+        try:
+            prefs = user_cache.get(user_id) or {}
+            dietary_prefs = prefs.get('preferences', [])
+            pantry_items = prefs.get('pantry', [])
+        except Exception as pref_error:
+            logger.warning(f"Failed to get user preferences: {str(pref_error)}")
+
+    system_prompt = {
+        "role": "system",
+        "content": (
+            f"You are Jake's Kitchen Companion, a clever and charming assistant with expert culinary advice. "
+            f"Tailor recipes to these dietary preferences: {', '.join(dietary_prefs)}. "
+            f"Use available pantry items: {', '.join(pantry_items)}. "
+            f"Keep responses detailed, practical, and engaging."
+        )
+    }
+    messages = [system_prompt] + messages
+    return messages, RecipeCache.make_key(messages, preferences=dietary_prefs, pantry=pantry_items)
+
+def generate_gpt_reply(messages, cache_key):
+    """Return the GPT reply, served from the recipe cache when possible"""
+    reply = recipe_cache.get(cache_key)
+    if reply is not None:
+        return reply
+
+    gpt_response = openai_client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        max_tokens=700,
+        temperature=0.7
+    )
+    reply = gpt_response.choices[0].message.content
+    recipe_cache.set(cache_key, reply)
+    return reply
+
+def get_spoonacular_data(user_message):
+    """Fetch image, nutrition, servings and ready time for the recipe"""
+    try:
+        return spoonacular_client.lookup(user_message)
+    except Exception as spoonacular_error:
+        logger.warning(f"Failed to get Spoonacular data: {str(spoonacular_error)}")
+        return dict(EMPTY_RESULT)
+
+def stream_gpt_reply(messages, cache_key, user_message, user_id):
+    """Stream the GPT reply as Server-Sent Events, ending with a metadata event"""
+    def generate():
+        linker = AffiliateLinkStream(affiliate_matcher)
+        raw_parts = []
+        yield sse_event({"content": f"<strong>🍽️ Recipe: {user_message.title()}</strong><br><br>"}, "token")
+
+        try:
+            cached_reply = recipe_cache.get(cache_key)
+            if cached_reply is not None:
+                gpt_chunks = [cached_reply]
+            else:
+                gpt_chunks = (
+                    chunk.choices[0].delta.content
+                    for chunk in openai_client.chat.completions.create(
+                        model="gpt-3.5-turbo",
+                        messages=messages,
+                        max_tokens=700,
+                        temperature=0.7,
+                        stream=True
+                    )
+                    if chunk.choices and chunk.choices[0].delta.content
+                )
+            gpt_parts = []
+            for content in gpt_chunks:
+                gpt_parts.append(content)
+                text = linker.feed(content)
+                if text:
+                    raw_parts.append(text)
+                    yield sse_event({"content": text.replace("\n", "<br>")}, "token")
+            text = linker.flush()
+            if text:
+                raw_parts.append(text)
+                yield sse_event({"content": text.replace("\n", "<br>")}, "token")
+            if cached_reply is None:
+                recipe_cache.set(cache_key, ''.join(gpt_parts))
+        except Exception as e:
+            logger.error(f"Error streaming /ask_gpt: {str(e)}", exc_info=True)
+            yield sse_event({"error": "An unexpected error occurred"}, "error")
+            return
+
+        # Ingredients are parsed from the raw text so bullet lines survive
+        ingredient_details = parse_ingredients(''.join(raw_parts))
+        logger.info(f"Successfully streamed response for user {user_id}")
+        yield sse_event({
+            **get_spoonacular_data(user_message),
+            "ingredients": [item['name'] for item in ingredient_details],
+            "ingredient_details": ingredient_details
+        }, "done")
+
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 @app.route('/ask_gpt', methods=['POST', 'OPTIONS'])
 def ask_gpt():
@@ -156,25 +271,7 @@ def ask_gpt():
 
     logger.info("Request received at /ask_gpt")
     try:
-        # Try to get user_id from token, but don't require it
-        user_id = None
-        try:
-            user_id = verify_firebase_token()
-        except Exception as auth_error:
-            logger.info(f"No valid auth token: {str(auth_error)}")
-            # Continue without user authentication
-
-        # Get user preferences if authenticated
-        dietary_prefs = []
-        pantry_items = []
-        if user_id:
-            try:
-                doc = db.collection('users').document(user_id).get()
-                prefs = doc.to_dict() if doc.exists else {}
-                dietary_prefs = prefs.get('preferences', [])
-                pantry_items = prefs.get('pantry', [])
-            except Exception as pref_error:
-                logger.warning(f"Failed to get user preferences: {str(pref_error)}")
+        user_id = get_request_user_id()
 
         data = request.get_json()
         logger.info(f"Request JSON: {data}")
@@ -183,65 +280,51 @@ def ask_gpt():
             return jsonify({"error": "No messages provided"}), 400
 
         user_message = [m['content'] for m in messages if m['role'] == 'user'][-1]
+        messages, cache_key = build_gpt_messages(user_id, messages)
 
-        system_prompt = {
-            "role": "system",
-            "content": (
-                f"You are Jake's Kitchen Companion, a clever and charming assistant with expert culinary advice. "
-                f"Tailor recipes to these dietary preferences: {', '.join(dietary_prefs)}. "
-                f"Use available pantry items: {', '.join(pantry_items)}. "
-                f"Keep responses detailed, practical, and engaging."
-            )
-        }
-        messages.insert(0, system_prompt)
-
-        gpt_response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=700,
-            temperature=0.7
-        )
+        if wants_event_stream(request.headers.get('Accept')):
+            return stream_gpt_reply(messages, cache_key, user_message, user_id)
 
-        reply = gpt_response.choices[0].message.content
+        reply = generate_gpt_reply(messages, cache_key)
         reply = add_affiliate_links(reply)
         reply = f"<strong>🍽️ Recipe: {user_message.title()}</strong><br><br>" + reply.replace("\n", "<br>")
 
-        try:
-            spoonacular_resp = requests.get(
-                "https://api.spoonacular.com/recipes/complexSearch",
-                params={'query': user_message, 'number': 1, 'addRecipeNutrition': True, 'apiKey': SPOONACULAR_API_KEY},
-                timeout=10
-            )
-            spoonacular_resp.raise_for_status()
-
-            image_url, nutrition, servings, time = None, None, None, None
-            if spoonacular_resp.status_code == 200:
-                res = spoonacular_resp.json()
-                if res.get('results'):
-                    item = res['results'][0]
-                    image_url = item.get('image')
-                    nutrition = item.get('nutrition', {}).get('nutrients')
-                    servings = item.get('servings')
-                    time = item.get('readyInMinutes')
-        except Exception as spoonacular_error:
-            logger.warning(f"Failed to get Spoonacular data: {str(spoonacular_error)}")
-            image_url, nutrition, servings, time = None, None, None, None
-
-        ingredients = extract_ingredients(reply)
+        spoonacular_data = get_spoonacular_data(user_message)
+
+        ingredient_details = parse_ingredients(reply)
 
         logger.info(f"Successfully generated response for user {user_id}")
         return jsonify({
             "reply": reply,
-            "image_url": image_url,
-            "nutrition": nutrition,
-            "servings": servings,
-            "time": time,
-            "ingredients": ingredients
+            **spoonacular_data,
+            "ingredients": [item['name'] for item in ingredient_details],
+            "ingredient_details": ingredient_details
         })
     except Exception as e:
         logger.error(f"Error in /ask_gpt: {str(e)}", exc_info=True)
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+@app.route('/ask_gpt/stream', methods=['POST', 'OPTIONS'])
+def ask_gpt_stream():
+    if request.method == 'OPTIONS':
+        return '', 200  # Respond to CORS preflight
+
+    logger.info("Request received at /ask_gpt/stream")
+    try:
+        user_id = get_request_user_id()
+
+        data = request.get_json()
+        messages = data.get('messages')
+        if not messages:
+            return jsonify({"error": "No messages provided"}), 400
+
+        user_message = [m['content'] for m in messages if m['role'] == 'user'][-1]
+        messages, cache_key = build_gpt_messages(user_id, messages)
+        return stream_gpt_reply(messages, cache_key, user_message, user_id)
+    except Exception as e:
+        logger.error(f"Error in /ask_gpt/stream: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
     app.run(host='0.0.0.0', port=port)
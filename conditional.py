@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+from werkzeug.http import http_date, parse_date, parse_etags
+
+# Per-user data: browsers may keep a copy but must revalidate it every time
+CACHE_CONTROL = 'private, no-cache'
+
+def make_etag(*parts):
+    """Hash any number of values (document ids, update times, payloads) into an ETag"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def payload_etag(payload):
+    """ETag for data without Firestore metadata, e.g. documents served from the user cache"""
+    return make_etag(json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str))
+
+def docs_etag(docs):
+    """ETag for Firestore snapshots, built from ids and update times only.
+
+    Lets routes answer 304 before calling to_dict() or serializing anything.
+    """
+    return make_etag(*(f"{doc.id}@{doc.update_time}" for doc in docs))
+
+def is_not_modified(headers, etag, last_modified=None):
+    """True when the client's cached copy, described by its request headers, is current.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted when
+    no ETag was sent, as RFC 9110 requires.
+    """
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    if last_modified is not None:
+        since = parse_date(headers.get('If-Modified-Since'))
+        return since is not None and last_modified.replace(microsecond=0) <= since
+    return False
+
+def cache_headers(etag, last_modified=None):
+    """Validator and Cache-Control headers shared by 200 and 304 responses"""
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': CACHE_CONTROL,
+        'Vary': 'Authorization'
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
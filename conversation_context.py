@@ -0,0 +1,145 @@
+import logging
+import math
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing the chat format adds around each message, and the
+# tokens that prime the reply (OpenAI's published accounting for gpt-3.5-turbo)
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMING_TOKENS = 3
+
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+def summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+class ContextTooLarge(Exception):
+    """Raised when even the system prompt and the latest message exceed the input budget"""
+
+class TokenCounter:
+    """Counts tokens with tiktoken when its encoding can be loaded, else estimates them.
+
+    The estimate (about 4 characters, or one word or punctuation mark, per
+    token, whichever is larger) errs high for English text, so a budget
+    enforced with it is still respected.
+    """
+
+    def __init__(self, model='gpt-3.5-turbo'):
+        self.encoding = None
+        try:
+            import tiktoken  # Optional dependency; the estimate is used without it
+            self.encoding = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            logger.warning(f"Counting tokens by estimate, tiktoken unavailable: {str(e)}")
+
+    def count(self, text):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return max(math.ceil(len(text) / 4), len(WORD_RE.findall(text)))
+
+    def count_messages(self, messages):
+        return sum(TOKENS_PER_MESSAGE + self.count(m['content']) for m in messages) + REPLY_PRIMING_TOKENS
+
+class ConversationContext:
+    """Fits a chat history into a fixed input-token budget.
+
+    The system prompt and the last keep_turns user turns (with the replies
+    that follow them) are sent verbatim. Everything older is replaced by one
+    summary message from summarize(previous_summary, messages, max_tokens),
+    cached by the exact history it covers, so each new turn only summarizes
+    the messages that left the window since the last request. That is at
+    most one summarize() call per request: if the result is still over
+    max_input_tokens, the oldest kept turns are dropped one at a time, then
+    the summary; if the latest user message alone does not fit,
+    ContextTooLarge is raised.
+    """
+
+    def __init__(self, counter, summarize, cache, keep_turns=6, max_input_tokens=3000,
+                 summary_max_tokens=250, max_summary_steps=4):
+        self.counter = counter
+        self.summarize = summarize
+        self.cache = cache
+        self.keep_turns = keep_turns
+        self.max_input_tokens = max_input_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.max_summary_steps = max_summary_steps
+
+    def build(self, system_prompt, messages):
+        """Return the messages to send: system prompt, optional summary, recent turns"""
+        turn_starts = [i for i, m in enumerate(messages) if m['role'] == 'user']
+        if not turn_starts:
+            return [system_prompt] + messages
+        keep = min(self.keep_turns, len(turn_starts))
+
+        # Anything before the first user turn stays verbatim until a turn is summarized
+        split = 0 if keep == len(turn_starts) else turn_starts[-keep]
+        prefix = [system_prompt]
+        if split:
+            summary = self._summary(messages[:split], turn_starts)
+            if summary:
+                prefix.append(summary_message(summary))
+
+        candidates = [prefix + messages[start:] for start in [split] + turn_starts[len(turn_starts) - keep + 1:]]
+        candidates.append([system_prompt] + messages[turn_starts[-1]:])
+        for candidate in candidates:
+            if self.counter.count_messages(candidate) <= self.max_input_tokens:
+                return candidate
+        raise ContextTooLarge(f"Conversation exceeds the {self.max_input_tokens} token input budget")
+
+    def compact(self, history, cut):
+        """One summary message to replace history[:cut] in a stored conversation.
+
+        cut should be a turn boundary that build() has already summarized, so
+        this is normally a cache hit. The newest cached summary of a longer
+        prefix is re-keyed onto the compacted history, so the next build()
+        still only summarizes the turns added since. Raises if the summary
+        cannot be made, so no history is dropped without one.
+        """
+        head = history[:cut]
+        message = summary_message(self._summary(head, [i for i, m in enumerate(head) if m['role'] == 'user'], strict=True))
+        boundaries = [i for i, m in enumerate(history) if m['role'] == 'user' and i > cut]
+        for boundary in reversed(boundaries[-(self.keep_turns + self.max_summary_steps):]):
+            summary = self.cache.get(self.cache.make_key(history[:boundary], kind='summary'))
+            if summary is not None:
+                self.cache.set(self.cache.make_key([message] + history[cut:boundary], kind='summary'), summary)
+                break
+        return message
+
+    def _summary(self, older, turn_starts, strict=False):
+        """Summary of older, extending the cached summary of its longest cached prefix"""
+        key = self.cache.make_key(older, kind='summary')
+        summary = self.cache.get(key)
+        if summary is not None:
+            return summary
+
+        # Walk back turn by turn to the newest prefix we have already summarized
+        boundaries = [i for i in turn_starts if 0 < i < len(older)]
+        previous, start = None, 0
+        for boundary in reversed(boundaries[-self.max_summary_steps:]):
+            cached = self.cache.get(self.cache.make_key(older[:boundary], kind='summary'))
+            if cached is not None:
+                previous, start = cached, boundary
+                break
+
+        try:
+            summary = self.summarize(previous, older[start:], self.summary_max_tokens)
+        except Exception as e:
+            if strict:
+                raise
+            logger.warning(f"Conversation summary failed, dropping older turns: {str(e)}")
+            return previous
+        self.cache.set(key, summary)
+        return summary
+
+def create_conversation_context(summarize, cache):
+    """Build the context manager from CONTEXT_* environment variables"""
+    return ConversationContext(
+        TokenCounter(),
+        summarize,
+        cache,
+        keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "6")),
+        max_input_tokens=int(os.getenv("CONTEXT_MAX_INPUT_TOKENS", "3000")),
+        summary_max_tokens=int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "250"))
+    )
@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class ConversationNotFound(Exception):
+    """Raised for a conversation_id that does not exist or has expired"""
+
+class MemoryConversationBackend:
+    """In-process store, private to one worker"""
+
+    def __init__(self, max_messages, ttl, max_conversations=10000):
+        self.max_messages = max_messages
+        self.conversations = TTLCache(maxsize=max_conversations, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def load(self, conversation_id):
+        with self.lock:
+            entry = self.conversations.get(conversation_id)
+            return (entry[0], list(entry[1])) if entry is not None else None
+
+    def append(self, conversation_id, messages, user_id=None):
+        with self.lock:
+            entry = self.conversations.get(conversation_id)
+            if entry is None:
+                entry = (user_id, deque(maxlen=self.max_messages))
+            entry[1].extend(messages)
+            # Re-setting the key restarts its TTL
+            self.conversations[conversation_id] = entry
+            return len(entry[1])
+
+    def compact(self, conversation_id, count, message):
+        with self.lock:
+            entry = self.conversations.get(conversation_id)
+            if entry is None:
+                return
+            kept = list(entry[1])[count:]
+            self.conversations[conversation_id] = (entry[0], deque([message] + kept, maxlen=self.max_messages))
+
+class SQLiteConversationBackend:
+    """One SQLite file in WAL mode, shared by the workers on a machine.
+
+    Rows beyond the newest max_messages of a conversation, and
+    conversations idle for longer than ttl, are deleted. compact() reuses
+    the seq of the last message it removes, so the summary sorts first.
+    """
+
+    def __init__(self, path, max_messages, ttl, purge_every=500):
+        self.path = path
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Not kept: connections are opened per thread, after any gunicorn fork
+        connection = sqlite3.connect(path, timeout=5)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS conversations (id TEXT PRIMARY KEY, user_id TEXT, updated REAL NOT NULL)"
+                )
+                columns = [row[1] for row in connection.execute("PRAGMA table_info(conversations)")]
+                if 'user_id' not in columns:
+                    connection.execute("ALTER TABLE conversations ADD COLUMN user_id TEXT")
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS conversation_messages ("
+                    "seq INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT NOT NULL, "
+                    "role TEXT NOT NULL, content TEXT NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS conversation_messages_by_id ON conversation_messages (conversation_id, seq)"
+                )
+        finally:
+            connection.close()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def load(self, conversation_id):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT user_id, updated FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None or row[1] + self.ttl <= time.time():
+            return None
+        rows = connection.execute(
+            "SELECT role, content FROM conversation_messages WHERE conversation_id = ? ORDER BY seq",
+            (conversation_id,)
+        ).fetchall()
+        return row[0], [{'role': role, 'content': content} for role, content in rows]
+
+    def append(self, conversation_id, messages, user_id=None):
+        with self._connection() as connection:
+            # The owner is fixed when the conversation is created
+            connection.execute(
+                "INSERT INTO conversations (id, user_id, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET updated = excluded.updated",
+                (conversation_id, user_id, time.time())
+            )
+            connection.executemany(
+                "INSERT INTO conversation_messages (conversation_id, role, content) VALUES (?, ?, ?)",
+                [(conversation_id, m['role'], m['content']) for m in messages]
+            )
+            connection.execute(
+                "DELETE FROM conversation_messages WHERE conversation_id = ? AND seq <= ("
+                "SELECT seq FROM conversation_messages WHERE conversation_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (conversation_id, conversation_id, self.max_messages)
+            )
+            length = connection.execute(
+                "SELECT COUNT(*) FROM conversation_messages WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0]
+        with self.lock:
+            self.writes += 1
+            purge = self.writes % self.purge_every == 0
+        if purge:
+            self.purge()
+        return length
+
+    def compact(self, conversation_id, count, message):
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT seq FROM conversation_messages WHERE conversation_id = ? ORDER BY seq LIMIT 1 OFFSET ?",
+                (conversation_id, count - 1)
+            ).fetchone()
+            if row is None:
+                return
+            connection.execute(
+                "DELETE FROM conversation_messages WHERE conversation_id = ? AND seq <= ?", (conversation_id, row[0])
+            )
+            connection.execute(
+                "INSERT INTO conversation_messages (seq, conversation_id, role, content) VALUES (?, ?, ?, ?)",
+                (row[0], conversation_id, message['role'], message['content'])
+            )
+
+    def purge(self):
+        cutoff = time.time() - self.ttl
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM conversation_messages WHERE conversation_id IN (SELECT id FROM conversations WHERE updated <= ?)",
+                (cutoff,)
+            )
+            connection.execute("DELETE FROM conversations WHERE updated <= ?", (cutoff,))
+
+class RedisConversationBackend:
+    """Shared store: one Redis list per conversation plus its owner, trimmed and expired on every append"""
+
+    def __init__(self, url, max_messages, ttl, prefix='conversation:'):
+        import redis  # Optional dependency, only needed for the shared backend
+        self.client = redis.Redis.from_url(url)
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def load(self, conversation_id):
+        key = self.prefix + conversation_id
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.get(key + ':owner')
+        pipeline.lrange(key, 0, -1)
+        owner, values = pipeline.execute()
+        if not values:
+            return None
+        return (owner.decode('utf-8') if owner else None), [json.loads(value) for value in values]
+
+    def append(self, conversation_id, messages, user_id=None):
+        key = self.prefix + conversation_id
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.rpush(key, *[json.dumps(m) for m in messages])
+        pipeline.ltrim(key, -self.max_messages, -1)
+        pipeline.expire(key, self.ttl)
+        if user_id:
+            # The owner is fixed when the conversation is created
+            pipeline.set(key + ':owner', user_id, nx=True)
+        pipeline.expire(key + ':owner', self.ttl)
+        length = pipeline.execute()[0]
+        return min(length, self.max_messages)
+
+    def compact(self, conversation_id, count, message):
+        key = self.prefix + conversation_id
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.ltrim(key, count, -1)
+        pipeline.lpush(key, json.dumps(message))
+        pipeline.execute()
+
+class ConversationStore:
+    """Server-side chat history, so /ask_gpt requests carry only the new message.
+
+    Messages are stored already sanitized. Once a conversation holds more
+    than max_messages, its oldest turns are replaced, at a turn boundary,
+    by the single summary message compact(history, cut) returns, leaving about
+    half of max_messages. The head of the history therefore only changes at
+    a compaction, so the summaries cached per history prefix keep matching
+    between turns. A conversation exists from its first append and expires
+    after ttl seconds without one.
+    """
+
+    def __init__(self, backend, max_messages, compact=None):
+        self.backend = backend
+        self.max_messages = max_messages
+        self.compact = compact
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(16)
+
+    def load(self, conversation_id, user_id=None):
+        """Stored messages, oldest first.
+
+        A conversation started by a signed-in user can only be loaded by that
+        user; ConversationNotFound is raised for anyone else, as for unknown
+        or expired ids.
+        """
+        entry = self.backend.load(conversation_id)
+        if entry is None or (entry[0] and entry[0] != user_id):
+            raise ConversationNotFound(conversation_id)
+        return entry[1]
+
+    def append(self, conversation_id, messages, user_id=None):
+        """Add messages; user_id becomes the owner if this creates the conversation"""
+        try:
+            length = self.backend.append(conversation_id, messages, user_id)
+        except Exception as e:
+            logger.warning(f"Conversation store write failed: {str(e)}")
+            return
+        if self.compact is not None and length > self.max_messages:
+            try:
+                self._compact(conversation_id)
+            except Exception as e:
+                logger.warning(f"Conversation compaction failed, keeping the full history: {str(e)}")
+
+    def _compact(self, conversation_id):
+        entry = self.backend.load(conversation_id)
+        history = entry[1] if entry else []
+        target = self.max_messages // 2
+        cut = next((i for i, m in enumerate(history) if i > 0 and m['role'] == 'user' and len(history) - i <= target), None)
+        if cut is None:
+            return
+        self.backend.compact(conversation_id, cut, self.compact(history, cut))
+
+def create_conversation_store(compact=None):
+    """Build the conversation store from CONVERSATION_* environment variables.
+
+    compact(history, cut) returns the summary message that replaces
+    history[:cut]; without it, history beyond the hard cap is simply dropped.
+    """
+    ttl = int(os.getenv("CONVERSATION_TTL_SECONDS", "86400"))
+    max_messages = int(os.getenv("CONVERSATION_MAX_MESSAGES", "100"))
+    # Backends only drop messages past this cap if compaction keeps failing
+    hard_cap = max_messages * 2
+    backend_name = os.getenv("CONVERSATION_BACKEND", "sqlite")
+    if backend_name == 'redis':
+        backend = RedisConversationBackend(os.getenv("CONVERSATION_REDIS_URL", "redis://localhost:6379/3"), hard_cap, ttl)
+    elif backend_name == 'sqlite':
+        backend = SQLiteConversationBackend(os.getenv("CONVERSATION_SQLITE_PATH", "conversations.sqlite3"), hard_cap, ttl)
+    elif backend_name == 'memory':
+        backend = MemoryConversationBackend(hard_cap, ttl)
+    else:
+        raise ValueError(f"Unknown CONVERSATION_BACKEND: {backend_name}")
+    logger.info(f"Conversations using {backend_name} backend (max {max_messages} messages, ttl={ttl}s)")
+    return ConversationStore(backend, max_messages, compact)
@@ -0,0 +1,35 @@
+"""Gunicorn settings for production: gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=asgi (default) serves asgi:application on uvicorn workers; each
+worker runs one event loop that can hold up to ASGI_LIMIT_CONCURRENCY
+requests in flight. SERVER_MODE=wsgi serves the Flask app directly on
+threaded workers with WSGI_THREADS threads each.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", min(multiprocessing.cpu_count(), 4)))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+server_mode = os.getenv("SERVER_MODE", "asgi")
+if server_mode == 'asgi':
+    from uvicorn.workers import UvicornWorker
+
+    class AsgiWorker(UvicornWorker):
+        CONFIG_KWARGS = {
+            **UvicornWorker.CONFIG_KWARGS,
+            "limit_concurrency": int(os.getenv("ASGI_LIMIT_CONCURRENCY", "500"))
+        }
+
+    worker_class = AsgiWorker
+    wsgi_app = "asgi:application"
+elif server_mode == 'wsgi':
+    worker_class = 'gthread'
+    threads = int(os.getenv("WSGI_THREADS", "8"))
+    wsgi_app = "app:app"
+else:
+    raise ValueError(f"Unknown SERVER_MODE: {server_mode}")
@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class TimeoutSession(requests.Session):
+    """Session that applies a default (connect, read) timeout to every call"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+def create_http_session(pool_maxsize=None, max_retries=None, backoff_factor=None, timeout=None):
+    """Build a keep-alive session with a bounded per-host pool and retry on 429/5xx.
+
+    Anything not passed in is read from HTTP_* environment variables.
+    """
+    pool_maxsize = pool_maxsize or int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+    max_retries = max_retries if max_retries is not None else int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    backoff_factor = backoff_factor if backoff_factor is not None else float(os.getenv("HTTP_BACKOFF_FACTOR", "0.3"))
+    timeout = timeout or (float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")), float(os.getenv("HTTP_READ_TIMEOUT", "10")))
+
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    # pool_block keeps the number of open connections per host at pool_maxsize
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, pool_block=True, max_retries=retry)
+
+    session = TimeoutSession(timeout)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """Return the process-wide outbound session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_http_session()
+                logger.info("Created shared outbound HTTP session")
+    return _session
@@ -0,0 +1,170 @@
+import re
+from fractions import Fraction
+from functools import lru_cache
+
+from metrics import timed
+
+UNICODE_FRACTIONS = {
+    '½': Fraction(1, 2), '⅓': Fraction(1, 3), '⅔': Fraction(2, 3), '¼': Fraction(1, 4),
+    '¾': Fraction(3, 4), '⅕': Fraction(1, 5), '⅖': Fraction(2, 5), '⅗': Fraction(3, 5),
+    '⅘': Fraction(4, 5), '⅙': Fraction(1, 6), '⅚': Fraction(5, 6), '⅛': Fraction(1, 8),
+    '⅜': Fraction(3, 8), '⅝': Fraction(5, 8), '⅞': Fraction(7, 8)
+}
+
+# Canonical unit -> every spelling we accept for it
+UNITS = {
+    'teaspoon': ['teaspoons', 'teaspoon', 'tsps', 'tsp'],
+    'tablespoon': ['tablespoons', 'tablespoon', 'tbsps', 'tbsp', 'tbs', 'tbl'],
+    'cup': ['cups', 'cup', 'c'],
+    'fluid ounce': ['fluid ounces', 'fluid ounce', 'fl oz', 'fl. oz'],
+    'ounce': ['ounces', 'ounce', 'oz'],
+    'pound': ['pounds', 'pound', 'lbs', 'lb'],
+    'gram': ['grams', 'gram', 'g'],
+    'kilogram': ['kilograms', 'kilogram', 'kg'],
+    'milligram': ['milligrams', 'milligram', 'mg'],
+    'milliliter': ['milliliters', 'milliliter', 'millilitres', 'millilitre', 'ml'],
+    'liter': ['liters', 'liter', 'litres', 'litre', 'l'],
+    'pint': ['pints', 'pint', 'pt'],
+    'quart': ['quarts', 'quart', 'qt'],
+    'gallon': ['gallons', 'gallon', 'gal'],
+    'pinch': ['pinches', 'pinch'],
+    'dash': ['dashes', 'dash'],
+    'clove': ['cloves', 'clove'],
+    'can': ['cans', 'can'],
+    'package': ['packages', 'package', 'pkg'],
+    'stick': ['sticks', 'stick'],
+    'slice': ['slices', 'slice'],
+    'sprig': ['sprigs', 'sprig'],
+    'bunch': ['bunches', 'bunch'],
+    'handful': ['handfuls', 'handful'],
+    'piece': ['pieces', 'piece']
+}
+UNIT_ALIASES = {alias: unit for unit, aliases in UNITS.items() for alias in aliases}
+
+FRACTION_CHARS = ''.join(UNICODE_FRACTIONS)
+NUMBER = rf"(?:\d+\s+\d+/\d+|\d+\s*[{FRACTION_CHARS}]|\d+/\d+|\d+(?:\.\d+)?|\.\d+|[{FRACTION_CHARS}])"
+
+LINE_SPLIT_RE = re.compile(r'\n|<br\s*/?>', re.IGNORECASE)
+BULLET_RE = re.compile(r'^\s*(?:(?P<symbol>[-*•])|(?P<number>\d+[.)]))\s+(?P<item>.*\S)\s*$')
+HEADING_RE = re.compile(r'^[\s#*_]*(?P<title>[A-Za-z ]+?)[\s:*_]*$')
+
+# Quantity (or range), optional parenthetical size, optional unit, then the rest, in one match
+ITEM_RE = re.compile(
+    rf"^(?:(?P<qty>{NUMBER})(?:\s*(?:-|–|—|to)\s*(?P<qty_max>{NUMBER}))?\s*(?:\((?P<paren>[^)]*)\)\s*)?)?"
+    r"(?:(?P<unit>" + "|".join(re.escape(a) for a in sorted(UNIT_ALIASES, key=len, reverse=True)) + r")\.?(?=[\s,]|$)\s*(?:of\s+)?)?"
+    r"(?P<rest>.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+# What a line must start with for ITEM_RE to find a quantity or unit; other
+# lines (most method steps and bare names) are all name and skip the match
+QUANTITY_START = '.' + FRACTION_CHARS
+UNIT_FIRST_WORDS = {alias.split()[0].rstrip('.') for alias in UNIT_ALIASES}
+FIRST_WORD_RE = re.compile(r'[^\s,]*')
+PAREN_RE = re.compile(r'\s*\(([^)]*)\)')
+EMPHASIS_RE = re.compile(r'[*_`]+')
+LINK_RE = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+
+INGREDIENT_HEADINGS = {'ingredients', 'ingredient', 'you will need', 'what you need'}
+OTHER_HEADINGS = {'instructions', 'directions', 'method', 'steps', 'preparation', 'notes', 'tips', 'equipment'}
+
+@lru_cache(maxsize=512)
+def parse_quantity(text):
+    """Turn '1 1/2', '1½', '3/4', '0.5' or '¾' into an int or a rounded float"""
+    text = text.strip()
+    if text[-1] in UNICODE_FRACTIONS:
+        whole = text[:-1].strip()
+        value = (Fraction(int(whole)) if whole else Fraction(0)) + UNICODE_FRACTIONS[text[-1]]
+    elif ' ' in text:
+        whole, frac = text.split(None, 1)
+        value = Fraction(int(whole)) + Fraction(frac)
+    else:
+        value = Fraction(text)
+    return int(value) if value.denominator == 1 else round(float(value), 3)
+
+def parse_ingredient_line(item):
+    """Split one ingredient line into quantity, unit, name and note"""
+    if '[' in item:
+        # Keep the text of affiliate/markdown links, drop the URL
+        item = LINK_RE.sub(r'\1', item)
+    if '*' in item or '_' in item or '`' in item:
+        item = EMPHASIS_RE.sub('', item)
+    item = item.strip()
+    if not might_have_quantity_or_unit(item):
+        return finish_record(item, None, None, None, [])
+
+    quantity = quantity_max = unit = None
+    notes = []
+    match = ITEM_RE.match(item)
+    if match.group('qty'):
+        try:
+            quantity = parse_quantity(match.group('qty'))
+            if match.group('qty_max'):
+                quantity_max = parse_quantity(match.group('qty_max'))
+        except ZeroDivisionError:
+            quantity = quantity_max = None
+        if match.group('paren'):
+            notes.append(match.group('paren').strip())
+    rest = match.group('rest')
+    if match.group('unit'):
+        # A bare 'c' or 'l' only counts as a unit right after a quantity
+        if match.group('qty') or len(match.group('unit')) > 1:
+            unit = UNIT_ALIASES[match.group('unit').lower()]
+        else:
+            rest = item[match.start('unit'):]
+    return finish_record(rest, quantity, quantity_max, unit, notes)
+
+def might_have_quantity_or_unit(item):
+    """False only when ITEM_RE certainly finds neither a quantity nor a unit at the start"""
+    if not item or item[0].isdecimal() or item[0] in QUANTITY_START:
+        return True
+    word = FIRST_WORD_RE.match(item).group()
+    return not word.isascii() or word.lower().rstrip('.') in UNIT_FIRST_WORDS
+
+def finish_record(rest, quantity, quantity_max, unit, notes):
+    """Pull parenthetical and trailing ', ...' notes off the name and build the record"""
+    if '(' in rest:
+        notes.extend(n.strip() for n in PAREN_RE.findall(rest))
+        rest = PAREN_RE.sub('', rest)
+    name, _, note = rest.partition(',')
+    if note.strip():
+        notes.append(note.strip())
+
+    return {
+        'quantity': quantity,
+        'quantity_max': quantity_max,
+        'unit': unit,
+        'name': name.strip(),
+        'note': '; '.join(notes) or None
+    }
+
+@timed('ingredients')
+def parse_ingredients(text):
+    """Parse every ingredient bullet in a reply into structured records.
+
+    Accepts '-', '*' and '•' bullets anywhere outside an instructions-style
+    section, and numbered bullets inside an 'Ingredients' section. Records are
+    deduplicated by name, keeping the first occurrence.
+    """
+    records = []
+    seen = set()
+    section = None
+    for line in LINE_SPLIT_RE.split(text):
+        bullet = BULLET_RE.match(line)
+        if not bullet:
+            heading = HEADING_RE.match(line) if len(line) < 40 else None
+            if heading:
+                title = heading.group('title').strip().lower()
+                if title in INGREDIENT_HEADINGS:
+                    section = 'ingredients'
+                elif title in OTHER_HEADINGS:
+                    section = 'other'
+            continue
+        if section == 'other' or (bullet.group('number') and section != 'ingredients'):
+            continue
+
+        record = parse_ingredient_line(bullet.group('item'))
+        key = record['name'].lower()
+        if key and key not in seen:
+            seen.add(key)
+            records.append(record)
+    return records
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from metrics import stage_timer, upstream_errors
+
+logger = logging.getLogger(__name__)
+
+class Mailer:
+    """Background mail dispatcher.
+
+    send() writes the message to a spool directory and puts it on a bounded
+    queue; worker threads deliver it over a long-lived, authenticated SMTP
+    connection and delete the spool file once the server accepts it. Failed
+    deliveries are retried with exponential backoff and, after max_attempts
+    or a permanent (5xx) rejection, moved to <spool_dir>/failed. Anything
+    still spooled when the process stops is sent again on the next start.
+    """
+
+    def __init__(self, server, port, username, password, starttls=True, spool_dir='mail_spool',
+                 workers=2, max_queue=1000, max_attempts=5, backoff=2.0, idle_timeout=60, timeout=30):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, 'failed')
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pending = set()  # spool files queued or waiting for a retry in this process
+        self.overflowed = False
+        self.started = False
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    def start(self):
+        """Claim spooled mail left by earlier runs and start the worker threads"""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        os.makedirs(self.failed_dir, exist_ok=True)
+        recovered = self._recover()
+        if recovered:
+            logger.info(f"Re-queued {recovered} spooled emails")
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"mailer-{i}", daemon=True).start()
+
+    def send(self, to_email, subject, body):
+        """Spool and queue an HTML email. Returns False only if it could not be spooled."""
+        message = {'to': to_email, 'subject': subject, 'body': body, 'attempts': 0}
+        name = f"{time.time():.6f}-{uuid.uuid4().hex}.json"
+        try:
+            path = self._write(name, message)
+        except OSError as e:
+            logger.error(f"Failed to spool email: {str(e)}")
+            return False
+        self._enqueue(path)
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'queued': self.queue.qsize(),
+                'pending': len(self.pending),
+                'sent': self.sent,
+                'failed': self.failed,
+                'retries': self.retries
+            }
+
+    # Spool files are <time>-<uuid>.json while unclaimed and get a .<pid>
+    # suffix once a process owns them, so gunicorn workers sharing the
+    # directory never send the same message twice.
+
+    def _write(self, name, message):
+        path = os.path.join(self.spool_dir, f"{name}.{os.getpid()}")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(message, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def _recover(self):
+        """Claim unowned spool files, and files owned by processes that no longer run"""
+        recovered = 0
+        for entry in sorted(os.listdir(self.spool_dir)):
+            if entry.endswith('.json'):
+                owner = None
+            elif '.json.' in entry and not entry.endswith('.tmp'):
+                owner = int(entry.rsplit('.', 1)[1])
+                if owner != os.getpid() and _process_alive(owner):
+                    continue
+            else:
+                continue
+            source = os.path.join(self.spool_dir, entry)
+            claimed = os.path.join(self.spool_dir, f"{entry.split('.json')[0]}.json.{os.getpid()}")
+            try:
+                if source != claimed:
+                    os.rename(source, claimed)
+            except FileNotFoundError:
+                continue  # Another worker claimed it first
+            with self.lock:
+                if claimed in self.pending:
+                    continue
+            self._enqueue(claimed)
+            recovered += 1
+        return recovered
+
+    def _enqueue(self, path):
+        with self.lock:
+            self.pending.add(path)
+        try:
+            self.queue.put_nowait(path)
+        except queue.Full:
+            # Stays on disk; picked up again once the queue drains
+            with self.lock:
+                self.pending.discard(path)
+                self.overflowed = True
+            logger.warning("Mail queue full, message left in the spool")
+
+    def _retry_later(self, path, attempts):
+        delay = self.backoff * (2 ** (attempts - 1))
+        with self.lock:
+            self.retries += 1
+        timer = threading.Timer(delay, self._requeue, args=(path,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, path):
+        with self.lock:
+            self.pending.discard(path)
+        self._enqueue(path)
+
+    def _work(self):
+        while True:
+            try:
+                path = self.queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                with self.lock:
+                    overflowed, self.overflowed = self.overflowed, False
+                if overflowed:
+                    self._recover()
+                continue
+            try:
+                self._deliver(path)
+            except Exception as e:
+                logger.error(f"Unexpected mailer error: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, path):
+        try:
+            with open(path, 'r') as f:
+                message = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Dropping unreadable spooled email {path}: {str(e)}")
+            with self.lock:
+                self.pending.discard(path)
+            return
+
+        try:
+            with stage_timer('smtp'):
+                self._send_message(message)
+        except Exception as e:
+            upstream_errors.inc(upstream='smtp')
+            message['attempts'] += 1
+            permanent = isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500 \
+                or isinstance(e, smtplib.SMTPRecipientsRefused)
+            if permanent or message['attempts'] >= self.max_attempts:
+                logger.error(f"Giving up on email to {message['to']} after {message['attempts']} attempts: {str(e)}")
+                os.replace(path, os.path.join(self.failed_dir, os.path.basename(path)))
+                with self.lock:
+                    self.failed += 1
+                    self.pending.discard(path)
+                return
+            logger.warning(f"Email to {message['to']} failed (attempt {message['attempts']}), retrying: {str(e)}")
+            self._write(os.path.basename(path).split('.json')[0] + '.json', message)
+            self._retry_later(path, message['attempts'])
+            return
+
+        os.remove(path)
+        with self.lock:
+            self.sent += 1
+            self.pending.discard(path)
+
+    def _send_message(self, message):
+        msg = MIMEMultipart()
+        msg['From'] = self.username
+        msg['To'] = message['to']
+        msg['Subject'] = message['subject']
+        msg.attach(MIMEText(message['body'], 'html'))
+        try:
+            self._connection().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped our idle connection; one fresh attempt
+            self._disconnect()
+            self._connection().send_message(msg)
+
+    def _connection(self):
+        """This worker's authenticated SMTP connection, opened on first use"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    connection.starttls()
+                connection.login(self.username, self.password)
+            except Exception:
+                connection.close()
+                raise
+            self.local.connection = connection
+        return connection
+
+    def _disconnect(self):
+        connection = getattr(self.local, 'connection', None)
+        self.local.connection = None
+        if connection is not None:
+            try:
+                connection.quit()
+            except Exception:
+                connection.close()
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def create_mailer(server, port, username, password):
+    """Build the mail dispatcher from SMTP_STARTTLS and MAIL_* environment variables"""
+    return Mailer(
+        server, port, username, password,
+        starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+        spool_dir=os.getenv("MAIL_SPOOL_DIR", "mail_spool"),
+        workers=int(os.getenv("MAIL_WORKERS", "2")),
+        max_queue=int(os.getenv("MAIL_QUEUE_SIZE", "1000")),
+        max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", "5")),
+        backoff=float(os.getenv("MAIL_RETRY_BACKOFF_SECONDS", "2"))
+    )
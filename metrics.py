@@ -0,0 +1,186 @@
+"""Process-local metrics rendered in the Prometheus text exposition format.
+
+Recording is a perf_counter() pair, a lock and a bisect, so it is cheap
+enough for the hot path. Gauges and counters that other modules already keep
+(cache stats()) are read through collectors at scrape time and cost nothing
+in between. Every gunicorn worker keeps its own numbers; Prometheus adds up
+the per-instance series.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Route (Flask endpoint) of the request being served, so helpers called from
+# many routes, like the user cache, can label their Firestore calls
+current_route = contextvars.ContextVar('current_route', default='none')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block took, whether or not it raised"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, label_names, buckets))
+
+    def _register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def register_stats(self, name, stats, prefix='kitchen_cache', label='cache', counters=('hits', 'misses', 'evictions')):
+        """Export a stats() callable (e.g. RecipeCache.stats) as labelled series at scrape time.
+
+        Keys listed in counters become <prefix>_<key>_total counters and every
+        other numeric key a <prefix>_<key> gauge, labelled {<label>="<name>"}.
+        """
+        with self.lock:
+            self.collectors.append((name, stats, prefix, label, counters))
+
+    def _render_collectors(self):
+        samples = {}
+        for name, stats, prefix, label, counters in list(self.collectors):
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                metric_type = 'counter' if key in counters else 'gauge'
+                metric_name = f"{prefix}_{key}_total" if metric_type == 'counter' else f"{prefix}_{key}"
+                samples.setdefault((metric_name, metric_type), []).append((label, name, value))
+        lines = []
+        for (metric_name, metric_type), values in sorted(samples.items()):
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+            lines.extend(f'{metric_name}{{{label}="{_escape(name)}"}} {_number(value)}' for label, name, value in values)
+        return lines
+
+    def render(self):
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        lines = []
+        for metric in list(self.metrics):
+            lines.extend(metric.render())
+        lines.extend(self._render_collectors())
+        return '\n'.join(lines) + '\n'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = Registry()
+
+request_seconds = registry.histogram(
+    'kitchen_request_duration_seconds', 'Time to produce a response, per route', ('route', 'method', 'status')
+)
+stage_seconds = registry.histogram(
+    'kitchen_stage_duration_seconds', 'Time spent in one stage of a request (openai, spoonacular, affiliate_links, ...)', ('stage',)
+)
+firestore_seconds = registry.histogram(
+    'kitchen_firestore_duration_seconds', 'Firestore call latency, per route and operation', ('route', 'operation')
+)
+cache_lookups = registry.counter(
+    'kitchen_cache_lookups_total', 'Lookups in caches that have no stats() of their own', ('cache', 'result')
+)
+upstream_errors = registry.counter(
+    'kitchen_upstream_errors_total', 'Failed calls to OpenAI, Spoonacular and SMTP', ('upstream',)
+)
+
+def stage_timer(stage):
+    return stage_seconds.time(stage=stage)
+
+def firestore_timer(operation):
+    """Time a Firestore read or write, labelled with the current route"""
+    return firestore_seconds.time(route=current_route.get(), operation=operation)
+
+def timed(stage):
+    """Decorator form of stage_timer"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with stage_seconds.time(stage=stage):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
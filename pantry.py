@@ -0,0 +1,52 @@
+from firebase_admin import firestore
+
+from metrics import firestore_timer
+
+LIST_OPERATIONS = ('add', 'remove', 'rename')
+
+class ListItemNotFound(Exception):
+    """Raised when a rename names an item that is not in the list"""
+
+def apply_list_delta(db, user_id, field, operation, items=(), rename_from=None, rename_to=None):
+    """Add, remove or rename entries of a list field on users/{user_id}.
+
+    Runs in a transaction, so concurrent edits from several devices are
+    applied one after another instead of overwriting each other. Every change
+    bumps ``<field>_version``. Returns (new_items, version); a no-op writes
+    nothing and returns the current version. Renaming an item that is not in
+    the list raises ListItemNotFound and writes nothing.
+    """
+    if operation not in LIST_OPERATIONS:
+        raise ValueError(f"Unknown list operation: {operation}")
+    user_ref = db.collection('users').document(user_id)
+    version_field = f"{field}_version"
+
+    @firestore.transactional
+    def run(transaction):
+        snapshot = user_ref.get(transaction=transaction)
+        data = snapshot.to_dict() if snapshot.exists else {}
+        current = list(data.get(field) or [])
+
+        if operation == 'add':
+            new_items = current + [item for item in dict.fromkeys(items) if item not in current]
+        elif operation == 'remove':
+            removed = set(items)
+            new_items = [item for item in current if item not in removed]
+        else:
+            if rename_from not in current:
+                raise ListItemNotFound(f"{rename_from} is not in {field}")
+            new_items = []
+            for item in current:
+                if item == rename_from:
+                    item = rename_to
+                if item not in new_items:
+                    new_items.append(item)
+
+        version = data.get(version_field, 0)
+        if new_items != current:
+            version += 1
+            transaction.set(user_ref, {field: new_items, version_field: version}, merge=True)
+        return new_items, version
+
+    with firestore_timer('transaction'):
+        return run(db.transaction())
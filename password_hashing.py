@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.hash import pbkdf2_sha256
+
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when too many hashes are already pending, or when one times out"""
+
+def _hash(password, rounds):
+    return pbkdf2_sha256.using(rounds=rounds).hash(password)
+
+def _verify(password, stored_hash):
+    return pbkdf2_sha256.verify(password, stored_hash)
+
+class PasswordHasher:
+    """pbkdf2_sha256 hashing on a process pool, off the request thread's GIL.
+
+    At most max_pending hashes may be queued or running; beyond that calls
+    raise PasswordHasherBusy right away so the route can answer 503 instead
+    of stalling. A hash counts against max_pending until it actually
+    finishes, even when the caller stopped waiting for it after timeout
+    seconds (which also raises PasswordHasherBusy). With workers=0 hashing
+    runs inline on the calling thread.
+    """
+
+    def __init__(self, rounds=None, workers=None, max_pending=None, timeout=10):
+        self.rounds = rounds or pbkdf2_sha256.default_rounds
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.executor = None
+        self.lock = threading.Lock()
+        self.rejected = 0
+        self.timed_out = 0
+        self.rehashed = 0
+
+    def _pool(self):
+        # Created on first use so every gunicorn worker has its own pool. By then
+        # the worker runs threads (mailer, pollers) whose held locks a plain fork
+        # would copy into the children, so they are started from a forkserver.
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('forkserver')
+                )
+            return self.executor
+
+    def _run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("Too many password hashes in progress")
+        if not self.workers:
+            try:
+                return fn(*args)
+            finally:
+                self.slots.release()
+
+        executor = self._pool()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException as e:
+            self.slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard(executor)
+            raise
+        # Free the slot when the hash is done, not when this caller stops waiting
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self.lock:
+                self.timed_out += 1
+            raise PasswordHasherBusy("Password hashing timed out")
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise
+
+    def _discard(self, executor):
+        # A worker died; start a fresh pool for the next call
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, stored_hash):
+        return self._run(_verify, password, stored_hash)
+
+    def needs_update(self, stored_hash):
+        """True when the stored hash was made with different rounds than configured"""
+        try:
+            return pbkdf2_sha256.from_string(stored_hash).rounds != self.rounds
+        except ValueError:
+            return False
+
+    def verify_and_update(self, password, stored_hash):
+        """Return (valid, new_hash); new_hash is set when the stored hash should be replaced"""
+        if not self.verify(password, stored_hash):
+            return False, None
+        if not self.needs_update(stored_hash):
+            return True, None
+        new_hash = self.hash(password)
+        with self.lock:
+            self.rehashed += 1
+        return True, new_hash
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'rounds': self.rounds,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'rehashed': self.rehashed
+            }
+
+def create_password_hasher():
+    """Build the hasher from PASSWORD_HASH_* environment variables.
+
+    The pool defaults to the cores divided among the gunicorn workers
+    (WEB_CONCURRENCY, defaulting as in gunicorn.conf.py), so a full instance
+    runs one hash per core at a time.
+    """
+    cores = os.cpu_count() or 1
+    default_workers = max(1, cores // int(os.getenv("WEB_CONCURRENCY", min(cores, 4))))
+    rounds = os.getenv("PASSWORD_HASH_ROUNDS")
+    max_pending = os.getenv("PASSWORD_HASH_MAX_PENDING")
+    return PasswordHasher(
+        rounds=int(rounds) if rounds else None,
+        workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(default_workers))),
+        max_pending=int(max_pending) if max_pending else None,
+        timeout=float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+    )
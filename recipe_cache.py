@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace so trivially different prompts share a key"""
+    return WHITESPACE_RE.sub(' ', str(text)).strip().lower()
+
+class MemoryCacheBackend:
+    """In-process TTL + LRU store, private to one worker"""
+
+    def __init__(self, max_entries, ttl):
+        self.cache = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.cache.get(key)
+
+    def set(self, key, value):
+        with self.lock:
+            self.cache[key] = value
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+class RedisCacheBackend:
+    """Shared store so every worker and instance sees the same entries"""
+
+    def __init__(self, url, ttl, prefix='recipe-cache:'):
+        import redis  # Optional dependency, only needed for the shared backend
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+class RecipeCache:
+    """Cache of GPT replies keyed on the normalized prompt"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(messages, **context):
+        """Build a stable key from the message list (system prompt included) and extra context"""
+        payload = {
+            'messages': [[m.get('role'), normalize_text(m.get('content', ''))] for m in messages],
+            'context': {name: sorted(normalize_text(v) for v in values) if isinstance(values, (list, tuple)) else normalize_text(values)
+                        for name, values in sorted(context.items())}
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Recipe cache read failed: {str(e)}")
+            value = None
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.warning(f"Recipe cache write failed: {str(e)}")
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+def create_recipe_cache():
+    """Build the recipe cache from RECIPE_CACHE_* environment variables"""
+    ttl = int(os.getenv("RECIPE_CACHE_TTL_SECONDS", "86400"))
+    backend_name = os.getenv("RECIPE_CACHE_BACKEND", "memory")
+    if backend_name == 'redis':
+        backend = RedisCacheBackend(os.getenv("RECIPE_CACHE_URL", "redis://localhost:6379/0"), ttl)
+    elif backend_name == 'memory':
+        backend = MemoryCacheBackend(int(os.getenv("RECIPE_CACHE_MAX_ENTRIES", "1000")), ttl)
+    else:
+        raise ValueError(f"Unknown RECIPE_CACHE_BACKEND: {backend_name}")
+    logger.info(f"Recipe cache using {backend_name} backend (ttl={ttl}s)")
+    return RecipeCache(backend)
@@ -0,0 +1,36 @@
+import re
+
+# A tag, then any character that could still open markup or a template/escape.
+# The old <script>...</script> pass is not needed: every "<script" that could
+# match it is already removed as a tag.
+TAG_RE = re.compile(r'<[^>]+>')
+UNSAFE_CHARS_RE = re.compile(r'[<>{}[\]\\]')
+
+# Joins a batch into one string; tags are not allowed to span it
+BATCH_SEPARATOR = '\x1f'
+BATCH_TAG_RE = re.compile(r'<[^>\x1f]+>')
+
+def sanitize_input(text):
+    """Basic input sanitization: strip HTML tags and the characters <>{}[]\\"""
+    if not isinstance(text, str):
+        return ""
+    # Most input has no markup at all, so skip the tag pass unless it could match
+    if '<' in text:
+        text = TAG_RE.sub('', text)
+    return UNSAFE_CHARS_RE.sub('', text).strip()
+
+def sanitize_inputs(items):
+    """sanitize_input over a list (pantry, grocery list, ingredients) in two regex calls.
+
+    The items are joined on a control character that tags cannot cross, so
+    each result is identical to sanitize_input(item). Batches that contain
+    the separator or non-strings fall back to sanitizing item by item.
+    """
+    if not items:
+        return []
+    if not all(isinstance(item, str) and BATCH_SEPARATOR not in item for item in items):
+        return [sanitize_input(item) for item in items]
+    text = BATCH_SEPARATOR.join(items)
+    if '<' in text:
+        text = BATCH_TAG_RE.sub('', text)
+    return [item.strip() for item in UNSAFE_CHARS_RE.sub('', text).split(BATCH_SEPARATOR)]
@@ -0,0 +1,174 @@
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Words that change how a request is phrased but not which recipe it asks for
+FILLER_WORDS = frozenset({
+    'a', 'an', 'the', 'of', 'for', 'to', 'me', 'my', 'i', 'you', 'can', 'could', 'please',
+    'want', 'need', 'give', 'show', 'make', 'how', 'do', 'some', 'any', 'recipe', 'recipes',
+    'easy', 'simple', 'best', 'good', 'great', 'delicious', 'tasty', 'classic', 'basic'
+})
+
+def content_words(text):
+    """Lowercased words of a prompt without filler words, plain plurals folded"""
+    for word in TOKEN_RE.findall(str(text).lower()):
+        if word in FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        yield word
+
+def key_terms(text):
+    """The set of content words, sorted.
+
+    Two prompts may only share a cached response when these are equal:
+    "without nuts", "vegan" or "for 20 people" each add a word, and a
+    near-identical embedding must not hide that.
+    """
+    return sorted(set(content_words(text)))
+
+class HashedNgramEmbedder:
+    """Offline text embedder: character n-grams of the content words, hashed
+    into a fixed-size, L2-normalized vector.
+
+    Anything with a ``dim`` attribute and an ``embed(text)`` method returning a
+    normalized float32 vector can replace it.
+    """
+
+    def __init__(self, dim=1024, ngram_sizes=(3, 4), word_weight=2.0):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+        self.word_weight = word_weight
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in content_words(text):
+            # zlib.crc32 rather than hash(), which is salted per process
+            vector[zlib.crc32(word.encode('utf-8')) % self.dim] += self.word_weight
+            padded = f" {word} "
+            for n in self.ngram_sizes:
+                for i in range(len(padded) - n + 1):
+                    vector[zlib.crc32(padded[i:i + n].encode('utf-8')) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+def context_id(context):
+    """64-bit id for a prompt's conversation (or its key_terms), so it fits a NumPy column"""
+    return int.from_bytes(hashlib.blake2b(str(context).encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+class SemanticCache:
+    """Fixed-capacity vector index of past prompts and the responses built for them.
+
+    lookup() returns the stored value of the most similar prompt when its
+    cosine similarity reaches the threshold, it was asked in the same
+    context (system prompt and earlier turns) and it has the same key_terms,
+    so only rephrasings (word order, filler words, plurals) share a response.
+    When full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, embedder, capacity=1000, threshold=0.95, ttl=86400):
+        self.embedder = embedder
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.vectors = np.zeros((capacity, embedder.dim), dtype=np.float32)
+        self.contexts = np.zeros(capacity, dtype=np.int64)
+        self.terms = np.zeros(capacity, dtype=np.int64)
+        self.expires = np.zeros(capacity)  # 0 marks an empty slot
+        self.last_used = np.zeros(capacity)
+        self.values = [None] * capacity
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _best_match(self, vector, context, terms, now):
+        """(slot, score) of the closest live entry with this context and terms, or (None, 0.0)"""
+        live = (self.expires > now) & (self.contexts == context) & (self.terms == terms)
+        if not live.any():
+            return None, 0.0
+        scores = self.vectors @ vector
+        scores[~live] = -1.0
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+    def lookup(self, text, context=''):
+        """Return (value, score) for a close enough past prompt, or (None, score)"""
+        vector = self.embedder.embed(text)
+        context = context_id(context)
+        terms = context_id(key_terms(text))
+        with self.lock:
+            now = time.monotonic()
+            slot, score = self._best_match(vector, context, terms, now)
+            if slot is None or score < self.threshold:
+                self.misses += 1
+                return None, score
+            self.hits += 1
+            self.last_used[slot] = now
+            return copy.deepcopy(self.values[slot]), score
+
+    def store(self, text, value, context=''):
+        vector = self.embedder.embed(text)
+        if not vector.any():
+            return
+        context = context_id(context)
+        terms = context_id(key_terms(text))
+        with self.lock:
+            now = time.monotonic()
+            slot, score = self._best_match(vector, context, terms, now)
+            if slot is None or score < self.threshold:
+                free = np.flatnonzero(self.expires <= now)
+                if free.size:
+                    slot = int(free[0])
+                else:
+                    slot = int(np.argmin(self.last_used))
+                    self.evictions += 1
+            self.vectors[slot] = vector
+            self.contexts[slot] = context
+            self.terms[slot] = terms
+            self.expires[slot] = now + self.ttl
+            self.last_used[slot] = now
+            self.values[slot] = copy.deepcopy(value)
+
+    def clear(self):
+        with self.lock:
+            self.expires[:] = 0
+            self.values = [None] * self.capacity
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': int(np.count_nonzero(self.expires > time.monotonic())),
+                'capacity': self.capacity,
+                'evictions': self.evictions
+            }
+
+def create_semantic_cache(embedder=None):
+    """Build the semantic cache from SEMANTIC_CACHE_* environment variables, or None when disabled"""
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    embedder = embedder or HashedNgramEmbedder(dim=int(os.getenv("SEMANTIC_CACHE_DIM", "1024")))
+    threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    capacity = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "1000"))
+    logger.info(f"Semantic cache enabled (capacity={capacity}, threshold={threshold})")
+    return SemanticCache(
+        embedder,
+        capacity=capacity,
+        threshold=threshold,
+        ttl=int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+    )
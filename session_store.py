@@ -0,0 +1,215 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask.sessions import SessionInterface, SessionMixin
+
+logger = logging.getLogger(__name__)
+
+class RedisSessionBackend:
+    """Shared store so every worker and instance sees the same sessions; Redis expires them"""
+
+    def __init__(self, url, prefix='session:'):
+        import redis  # Optional dependency, only needed for the shared backend
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        value = self.client.get(self.prefix + sid)
+        return json.loads(value) if value is not None else None
+
+    def set(self, sid, data, ttl):
+        self.client.set(self.prefix + sid, json.dumps(data), ex=ttl)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+class SQLiteSessionBackend:
+    """One SQLite file in WAL mode, shared by the workers on a machine.
+
+    Rows carry their expiry time; reads ignore expired rows and every
+    purge_every writes one statement deletes them.
+    """
+
+    def __init__(self, path, purge_every=500):
+        self.path = path
+        self.purge_every = purge_every
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Not kept: connections are opened per thread, after any gunicorn fork
+        connection = sqlite3.connect(path, timeout=5)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+                )
+        finally:
+            connection.close()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, sid):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires > ?", (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid, data, ttl):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                (sid, json.dumps(data), time.time() + ttl)
+            )
+        with self.lock:
+            self.writes += 1
+            purge = self.writes % self.purge_every == 0
+        if purge:
+            self.purge()
+
+    def delete(self, sid):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def purge(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+class LazySession(SessionMixin):
+    """Session whose data is only fetched from the backend when a route touches it"""
+
+    def __init__(self, sid=None, loader=None):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        self.stale_sid = None
+        self._loader = loader
+        self._data = None
+
+    def _load(self):
+        self.accessed = True
+        if self._data is None:
+            data = None
+            if self._loader is not None:
+                try:
+                    data = self._loader(self.sid)
+                except Exception as e:
+                    logger.warning(f"Session read failed: {str(e)}")
+            if not data and self.sid:
+                # Never adopt an id the store does not know: a planted cookie must not become a session
+                self.sid = None
+                self.new = True
+            self._data = data or {}
+        return self._data
+
+    def regenerate(self):
+        """Move the data to a fresh id on the next save and drop the old one (call on login)"""
+        self._load()
+        if self.sid:
+            self.stale_sid = self.sid
+        self.sid = None
+        self.new = True
+        self.modified = True
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._load()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+class StoredSessionInterface(SessionInterface):
+    """Server-side sessions: the cookie carries only a random id.
+
+    Nothing is read unless the route uses ``session`` and nothing is written
+    unless it changes it, so routes authenticated by JWT alone do no session
+    I/O. With no backend (stateless mode) sessions last for one request only
+    and no cookie is ever set.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        if self.backend is None:
+            return LazySession()
+        sid = request.cookies.get(self.get_cookie_name(app))
+        return LazySession(sid, self.backend.get) if sid else LazySession()
+
+    def get_expiration_time(self, app, session):
+        # Sessions are permanent unless SESSION_PERMANENT is turned off, as with Flask-Session
+        if app.config.get('SESSION_PERMANENT', True) or session.permanent:
+            return datetime.now(timezone.utc) + app.permanent_session_lifetime
+        return None
+
+    def save_session(self, app, session, response):
+        if self.backend is None or not session.modified:
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        try:
+            if not session:
+                stored = [sid for sid in (session.sid, session.stale_sid) if sid]
+                for sid in stored:
+                    self.backend.delete(sid)
+                if stored:
+                    response.delete_cookie(name, domain=domain, path=path)
+                return
+            sid = session.sid or secrets.token_urlsafe(32)
+            ttl = int(app.permanent_session_lifetime.total_seconds())
+            self.backend.set(sid, dict(session), ttl)
+            if session.stale_sid:
+                self.backend.delete(session.stale_sid)
+        except Exception as e:
+            logger.warning(f"Session write failed: {str(e)}")
+            return
+        response.set_cookie(
+            name, sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            domain=domain,
+            path=path
+        )
+
+def create_session_interface():
+    """Build the session interface from SESSION_* environment variables"""
+    backend_name = os.getenv("SESSION_BACKEND", "sqlite")
+    if backend_name == 'redis':
+        backend = RedisSessionBackend(os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/2"))
+    elif backend_name == 'sqlite':
+        backend = SQLiteSessionBackend(os.getenv("SESSION_SQLITE_PATH", "sessions.sqlite3"))
+    elif backend_name == 'stateless':
+        backend = None
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend_name}")
+    logger.info(f"Sessions using {backend_name} backend")
+    return StoredSessionInterface(backend)
@@ -0,0 +1,221 @@
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+
+from http_client import get_http_session
+from metrics import cache_lookups, stage_timer, upstream_errors
+
+logger = logging.getLogger(__name__)
+
+SPOONACULAR_BASE_URL = "https://api.spoonacular.com"
+EMPTY_RESULT = {"image_url": None, "nutrition": None, "servings": None, "time": None}
+
+QUERY_STRIP_RE = re.compile(r'[^\w\s]')
+WHITESPACE_RE = re.compile(r'\s+')
+
+class SpoonacularUnavailable(Exception):
+    """Raised when a lookup failed (now or within error_ttl), as opposed to finding nothing"""
+
+def normalize_query(query):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return WHITESPACE_RE.sub(' ', QUERY_STRIP_RE.sub(' ', str(query).lower())).strip()
+
+class SpoonacularCache:
+    """SQLite-backed cache of Spoonacular lookups, shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lookups (
+                query TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                status TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS query_stats (
+                query TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0,
+                last_seen REAL NOT NULL
+            );
+        """)
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, query):
+        """Return (data, status) for a normalized query, or None if missing or expired"""
+        row = self._connect().execute(
+            "SELECT data, status FROM lookups WHERE query = ? AND expires_at > ?", (query, time.time())
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, query, data, ttl, status):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO lookups (query, data, status, expires_at) VALUES (?, ?, ?, ?)",
+            (query, json.dumps(data), status, time.time() + ttl)
+        )
+
+    def record_query(self, query):
+        """Count a lookup so warm-up knows which queries are popular"""
+        self._connect().execute(
+            "INSERT INTO query_stats (query, count, last_seen) VALUES (?, 1, ?) "
+            "ON CONFLICT(query) DO UPDATE SET count = count + 1, last_seen = excluded.last_seen",
+            (query, time.time())
+        )
+
+    def top_queries(self, limit):
+        rows = self._connect().execute(
+            "SELECT query FROM query_stats ORDER BY count DESC, last_seen DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def purge_expired(self):
+        return self._connect().execute("DELETE FROM lookups WHERE expires_at <= ?", (time.time(),)).rowcount
+
+class SpoonacularClient:
+    """complexSearch lookups with a persistent cache.
+
+    Found recipes are kept for ``ttl`` seconds. Queries with no results are
+    kept for ``empty_ttl`` and failed calls for ``error_ttl``, so an outage or
+    an unknown dish does not turn every request into another upstream call.
+    """
+
+    def __init__(self, api_key, cache, ttl, empty_ttl, error_ttl, timeout=10, http=requests, base_url=SPOONACULAR_BASE_URL):
+        self.api_key = api_key
+        self.search_url = base_url.rstrip('/') + "/recipes/complexSearch"
+        self.cache = cache
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.http = http
+
+    def lookup(self, query, timeout=None):
+        """Return image_url, nutrition, servings and time for a recipe query.
+
+        Raises SpoonacularUnavailable when the call failed, so callers can
+        tell an outage apart from a dish Spoonacular does not know.
+        """
+        key = normalize_query(query)
+        if not key:
+            return dict(EMPTY_RESULT)
+
+        try:
+            self.cache.record_query(key)
+            cached = self.cache.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Spoonacular cache read failed: {str(e)}")
+            cached = None
+        if cached is not None:
+            cache_lookups.inc(cache='spoonacular', result='hit')
+            data, status = cached
+            if status == 'error':
+                raise SpoonacularUnavailable(f"Spoonacular failed for {key!r} recently")
+            return data
+
+        cache_lookups.inc(cache='spoonacular', result='miss')
+        return self.fetch(key, timeout)
+
+    def fetch(self, key, timeout=None):
+        """Call Spoonacular for a normalized query and cache whatever comes back"""
+        try:
+            with stage_timer('spoonacular'):
+                spoonacular_resp = self.http.get(
+                    self.search_url,
+                    params={'query': key, 'number': 1, 'addRecipeNutrition': True, 'apiKey': self.api_key},
+                    timeout=timeout or self.timeout
+                )
+                spoonacular_resp.raise_for_status()
+                res = spoonacular_resp.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            upstream_errors.inc(upstream='spoonacular')
+            logger.error(f"Spoonacular API error: {str(e)}")
+            self._store(key, dict(EMPTY_RESULT), self.error_ttl, 'error')
+            raise SpoonacularUnavailable(str(e)) from e
+
+        if not res.get('results'):
+            self._store(key, dict(EMPTY_RESULT), self.empty_ttl, 'empty')
+            return dict(EMPTY_RESULT)
+
+        item = res['results'][0]
+        data = {
+            "image_url": item.get('image'),
+            "nutrition": item.get('nutrition', {}).get('nutrients'),
+            "servings": item.get('servings'),
+            "time": item.get('readyInMinutes')
+        }
+        self._store(key, data, self.ttl, 'ok')
+        return data
+
+    def _store(self, key, data, ttl, status):
+        try:
+            self.cache.set(key, data, ttl, status)
+        except sqlite3.Error as e:
+            logger.warning(f"Spoonacular cache write failed: {str(e)}")
+
+    def warm(self, queries):
+        """Preload queries that are not already cached, returning how many were fetched"""
+        fetched = 0
+        for query in queries:
+            key = normalize_query(query)
+            if key and self.cache.get(key) is None:
+                try:
+                    self.fetch(key)
+                except SpoonacularUnavailable:
+                    continue
+                fetched += 1
+        return fetched
+
+def create_spoonacular_client(api_key, http=None):
+    """Build a client from SPOONACULAR_BASE_URL and SPOONACULAR_CACHE_* environment variables.
+
+    Calls go through the shared pooled session unless ``http`` is given.
+    """
+    return SpoonacularClient(
+        api_key,
+        SpoonacularCache(os.getenv("SPOONACULAR_CACHE_PATH", "spoonacular_cache.sqlite3")),
+        ttl=int(os.getenv("SPOONACULAR_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        empty_ttl=int(os.getenv("SPOONACULAR_EMPTY_TTL_SECONDS", "3600")),
+        error_ttl=int(os.getenv("SPOONACULAR_ERROR_TTL_SECONDS", "60")),
+        http=http or get_http_session(),
+        base_url=os.getenv("SPOONACULAR_BASE_URL", SPOONACULAR_BASE_URL)
+    )
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Manage the Spoonacular lookup cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm_parser = subparsers.add_parser("warm", help="Preload the most requested queries")
+    warm_parser.add_argument("--top", type=int, default=100, help="Number of queries to preload")
+    warm_parser.add_argument("--file", help="Newline-separated queries to use instead of recorded popularity")
+    subparsers.add_parser("purge", help="Delete expired cache entries")
+    args = parser.parse_args()
+
+    client = create_spoonacular_client(os.getenv("SPOONACULAR_API_KEY"))
+    if args.command == "warm":
+        if args.file:
+            with open(args.file, "r") as f:
+                queries = [line.strip() for line in f if line.strip()][:args.top]
+        else:
+            queries = client.cache.top_queries(args.top)
+        print(f"Fetched {client.warm(queries)} of {len(queries)} queries")
+    elif args.command == "purge":
+        print(f"Removed {client.cache.purge_expired()} expired entries")
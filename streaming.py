@@ -0,0 +1,83 @@
+import json
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # Stop nginx/Render proxies from buffering the stream
+}
+
+def sse_event(data, event=None):
+    """Format a payload as a single Server-Sent Events message"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    for line in json.dumps(data).split('\n'):
+        lines.append(f"data: {line}")
+    return '\n'.join(lines) + '\n\n'
+
+def wants_event_stream(accept):
+    """True when the Accept header value prefers text/event-stream over JSON.
+
+    Takes the raw header so the Flask and ASGI routes apply the same rule:
+    the highest-quality media type wins, as in Werkzeug's accept_mimetypes.
+    """
+    return parse_accept_header(accept, MIMEAccept).best == 'text/event-stream'
+
+class AffiliateLinkStream:
+    """Apply affiliate links to a reply that arrives in chunks.
+
+    Text is held back until no keyword can still be completed by the next
+    chunk, so a keyword split across chunk boundaries is linked exactly as it
+    would be in the finished reply. Linking rules are the matcher's: first
+    occurrence of each keyword, longest keyword wins, at most max_links.
+    """
+
+    def __init__(self, matcher):
+        self.links = matcher.links
+        self.max_links = matcher.max_links
+        self.pattern = matcher.pattern
+        self.holdback = matcher.longest
+        self.linked = set()
+        self.buffer = ''
+
+    def _link(self, text, final):
+        """Link keywords in text, returning (linked_text, consumed_length)"""
+        cut = len(text) if final else len(text) - self.holdback
+        if cut <= 0:
+            return '', 0
+        if not final:
+            # Only cut on whitespace so the next buffer never starts mid-word
+            cut = max(text.rfind(' ', 0, cut), text.rfind('\n', 0, cut)) + 1
+            if cut <= 0:
+                return '', 0
+        out = []
+        pos = 0
+        for match in self.pattern.finditer(text):
+            if match.start() >= cut:
+                break
+            # Never leave half a keyword behind for the next buffer
+            cut = max(cut, match.end())
+            keyword = match.group(1).lower()
+            if keyword in self.linked or len(self.linked) >= self.max_links:
+                continue
+            self.linked.add(keyword)
+            out.append(text[pos:match.start()])
+            out.append(f"[{match.group(1)}]({self.links[keyword]})")
+            pos = match.end()
+        out.append(text[pos:cut])
+        return ''.join(out), cut
+
+    def feed(self, chunk):
+        """Add a chunk and return whatever text is now safe to emit"""
+        self.buffer += chunk
+        out, consumed = self._link(self.buffer, final=False)
+        self.buffer = self.buffer[consumed:]
+        return out
+
+    def flush(self):
+        """Emit everything still held back once the stream has ended"""
+        out, _ = self._link(self.buffer, final=True)
+        self.buffer = ''
+        return out
@@ -0,0 +1,118 @@
+"""Boot app.py offline: Firebase swapped for the in-memory Firestore used by the
+benchmarks, every store on its in-process backend, rate limiting off.
+
+OpenAI and Spoonacular are replaced per test by the openai_stub and
+spoonacular_stub fixtures, so no test touches the network.
+"""
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+TMP_DIR = tempfile.mkdtemp(prefix="kitchen-tests-")
+
+for name, value in {
+    "OPENAI_API_KEY": "sk-test",
+    "SPOONACULAR_API_KEY": "test",
+    "JWT_SECRET_KEY": "test-secret",
+    "SMTP_SERVER": "127.0.0.1",
+    "SMTP_PORT": "2525",
+    "SMTP_USERNAME": "test@example.com",
+    "SMTP_PASSWORD": "test",
+    "APP_URL": "http://127.0.0.1",
+    "SESSION_BACKEND": "stateless",
+    "CONVERSATION_BACKEND": "memory",
+    "RECIPE_CACHE_BACKEND": "memory",
+    "PASSWORD_HASH_WORKERS": "0",
+    "SPOONACULAR_CACHE_PATH": os.path.join(TMP_DIR, "spoonacular.sqlite3"),
+    "MAIL_SPOOL_DIR": os.path.join(TMP_DIR, "mail_spool"),
+}.items():
+    os.environ.setdefault(name, value)
+
+import firebase_admin  # noqa: E402
+from firebase_admin import credentials, firestore, firestore_async  # noqa: E402
+
+from fake_firestore import FakeFirestore, transactional  # noqa: E402
+
+db = FakeFirestore()
+credentials.Certificate = lambda *args, **kwargs: None
+firebase_admin.initialize_app = lambda *args, **kwargs: None
+firestore.client = lambda *args, **kwargs: db
+firestore.transactional = transactional
+# The native ASGI routes get no async client; tests of them must not reach Firestore
+firestore_async.client = lambda *args, **kwargs: None
+
+import app as kitchen  # noqa: E402  (must come after the patches above)
+
+kitchen.limiter.enabled = False
+
+class OpenAIStub:
+    """Stands in for openai_client: replies with reply_for(messages) and records every call"""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @staticmethod
+    def reply_for(messages):
+        return f"Recipe for {messages[-1]['content']}\n\nIngredients:\n- 2 cups flour\n- 1 egg\n\nInstructions:\n1. Mix in a mixing bowl."
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls.append(messages)
+        content = self.reply_for(messages)
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    @property
+    def prompts(self):
+        return [messages[-1]['content'] for messages in self.calls]
+
+class SpoonacularStub:
+    """Stands in for spoonacular_client: returns result, or raises error when it is set"""
+
+    def __init__(self):
+        self.result = dict(kitchen.EMPTY_RESULT)
+        self.error = None
+
+    def lookup(self, query, timeout=None):
+        if self.error is not None:
+            raise self.error
+        return dict(self.result)
+
+@pytest.fixture
+def app_module():
+    return kitchen
+
+@pytest.fixture
+def client():
+    return kitchen.app.test_client()
+
+@pytest.fixture
+def asgi_client():
+    from starlette.testclient import TestClient
+
+    import asgi
+    with TestClient(asgi.application) as test_client:
+        yield test_client
+
+@pytest.fixture
+def openai_stub(monkeypatch):
+    stub = OpenAIStub()
+    monkeypatch.setattr(kitchen, 'openai_client', stub)
+    kitchen.recipe_cache.backend.clear()
+    if kitchen.semantic_cache:
+        kitchen.semantic_cache.clear()
+    return stub
+
+@pytest.fixture
+def spoonacular_stub(monkeypatch):
+    stub = SpoonacularStub()
+    monkeypatch.setattr(kitchen, 'spoonacular_client', stub)
+    return stub
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from flask import Flask
+
+import asgi
+
+def test_overlapping_fallback_requests_run_concurrently():
+    flask_app = Flask(__name__)
+    threads = set()
+
+    @flask_app.route('/slow')
+    def slow():
+        threads.add(threading.current_thread().name)
+        time.sleep(0.3)
+        return {'ok': True}
+
+    async def run():
+        async with asgi.lifespan(None):
+            transport = httpx.ASGITransport(app=asgi.PooledWsgiToAsgi(flask_app))
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                started = time.perf_counter()
+                responses = await asyncio.gather(*(client.get('/slow') for _ in range(4)))
+                return time.perf_counter() - started, responses
+
+    elapsed, responses = asyncio.run(run())
+    assert [r.json() for r in responses] == [{'ok': True}] * 4
+    assert len(threads) == 4
+    assert all(name.startswith('wsgi') for name in threads)
+    # Serialized on one thread this takes 1.2s
+    assert elapsed < 0.9
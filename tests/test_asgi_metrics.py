@@ -0,0 +1,16 @@
+import metrics
+
+def count(histogram, *labels):
+    series = histogram.series.get(labels)
+    return sum(series[:-1]) if series else 0
+
+def test_native_routes_record_request_and_firestore_timings(app_module, asgi_client):
+    token = app_module.generate_token('metrics-user')
+    app_module.user_cache.invalidate('metrics-user')
+    requests = count(metrics.request_seconds, 'get_pantry', 'GET', 500)
+    reads = count(metrics.firestore_seconds, 'get_pantry', 'read')
+    # The tests run without an async Firestore client, so the read fails after being timed
+    response = asgi_client.get('/get_pantry', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 500
+    assert count(metrics.request_seconds, 'get_pantry', 'GET', 500) == requests + 1
+    assert count(metrics.firestore_seconds, 'get_pantry', 'read') == reads + 1
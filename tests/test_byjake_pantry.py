@@ -0,0 +1,50 @@
+import importlib.util
+import json
+import os
+
+import pytest
+
+import auth_cache
+from conftest import ROOT, db
+
+@pytest.fixture(scope='module')
+def byjake(tmp_path_factory):
+    """byjake.app.py, loaded with a throwaway credentials file and no certificate prefetch"""
+    directory = tmp_path_factory.mktemp('byjake')
+    (directory / 'firebase-credentials.json').write_text(json.dumps({'project_id': 'test-project'}))
+    patch = pytest.MonkeyPatch()
+    patch.setattr(auth_cache.FirebaseTokenVerifier, 'start', lambda self: None)
+    patch.chdir(directory)
+    try:
+        spec = importlib.util.spec_from_file_location('byjake_app', os.path.join(ROOT, 'byjake.app.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        patch.undo()
+    return module
+
+@pytest.fixture
+def client(byjake, monkeypatch):
+    monkeypatch.setattr(byjake, 'verify_firebase_token', lambda: 'byjake-user')
+    db.collection('users').document('byjake-user').set({'pantry': ['flour', 'eggs'], 'pantry_version': 3})
+    byjake.user_cache.invalidate('byjake-user')
+    return byjake.app.test_client()
+
+def test_rename_missing_item_is_not_found(client):
+    response = client.post('/pantry/items/rename', json={'from': 'sugar', 'to': 'brown sugar'})
+    assert response.status_code == 404
+    assert db.collection('users').document('byjake-user').get().to_dict()['pantry_version'] == 3
+
+def test_rename_existing_item(client):
+    response = client.post('/pantry/items/rename', json={'from': 'eggs', 'to': 'duck eggs'})
+    assert response.get_json() == {'pantry': ['flour', 'duck eggs'], 'version': 4}
+
+@pytest.mark.parametrize("path, method", [('/pantry/items', 'DELETE'), ('/pantry/items', 'POST'), ('/pantry/items/rename', 'POST')])
+def test_preflight_is_answered_before_auth(byjake, path, method):
+    response = byjake.app.test_client().options(path, headers={
+        'Origin': 'https://byjake.com',
+        'Access-Control-Request-Method': method,
+        'Access-Control-Request-Headers': 'authorization, content-type',
+    })
+    assert response.status_code == 200
+    assert response.headers['Access-Control-Allow-Origin'] == 'https://byjake.com'
@@ -0,0 +1,85 @@
+import pytest
+
+from conversation_context import ConversationContext, TokenCounter
+from conversation_store import ConversationNotFound, ConversationStore, MemoryConversationBackend, SQLiteConversationBackend
+from recipe_cache import MemoryCacheBackend, RecipeCache
+
+SYSTEM_PROMPT = {"role": "system", "content": "You are a cooking assistant."}
+
+def turn(n):
+    return [
+        {"role": "user", "content": f"question {n} " + "x" * 200},
+        {"role": "assistant", "content": f"answer {n} " + "y" * 800},
+    ]
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryConversationBackend(max_messages=200, ttl=3600)
+    return SQLiteConversationBackend(str(tmp_path / "conversations.sqlite3"), max_messages=200, ttl=3600)
+
+def test_compact_replaces_head_with_summary(backend):
+    for n in range(3):
+        backend.append('c', turn(n))
+    summary = {"role": "system", "content": "Summary of the earlier conversation: two questions"}
+    backend.compact('c', 4, summary)
+    assert backend.load('c') == (None, [summary] + turn(2))
+    backend.append('c', turn(3))
+    assert backend.load('c') == (None, [summary] + turn(2) + turn(3))
+
+def test_owner_is_fixed_at_creation(backend):
+    store = ConversationStore(backend, max_messages=100)
+    store.append('c', turn(0), 'alice')
+    store.append('c', turn(1), 'bob')
+    assert store.load('c', 'alice') == turn(0) + turn(1)
+    for user_id in ('bob', None):
+        with pytest.raises(ConversationNotFound):
+            store.load('c', user_id)
+
+def test_long_conversation_summarizes_one_turn_per_request(backend):
+    summarized = []
+
+    def summarize(previous, messages, max_tokens):
+        summarized.append(len(messages))
+        return f"{previous or ''} +{len(messages)}"
+
+    context = ConversationContext(TokenCounter(), summarize, RecipeCache(MemoryCacheBackend(1000, 3600)))
+    store = ConversationStore(backend, max_messages=100, compact=context.compact)
+
+    for n in range(150):
+        history = backend.load('c')[1] if n else []
+        calls = len(summarized)
+        context.build(dict(SYSTEM_PROMPT), history + turn(n)[:1])
+        store.append('c', turn(n))
+        assert len(history) <= 100
+        # Once the window is full, each request folds in exactly the turn that left it
+        assert len(summarized) - calls == (1 if n >= context.keep_turns else 0)
+        assert all(count == 2 for count in summarized[calls:])
+    assert backend.load('c')[1][0]['content'].startswith("Summary of the earlier conversation:")
+
+def test_failed_compaction_keeps_history(backend):
+    def compact(history, cut):
+        raise RuntimeError("summary unavailable")
+
+    store = ConversationStore(backend, max_messages=4, compact=compact)
+    for n in range(4):
+        store.append('c', turn(n))
+    assert len(backend.load('c')[1]) == 8
+
+def test_over_budget_context_summarizes_once_then_drops_turns():
+    summarized = []
+
+    def summarize(previous, messages, max_tokens):
+        summarized.append(len(messages))
+        return "short"
+
+    context = ConversationContext(TokenCounter(), summarize, RecipeCache(MemoryCacheBackend(1000, 3600)),
+                                  keep_turns=6, max_input_tokens=500)
+    history = [message for n in range(10) for message in turn(n)]
+    messages = context.build(dict(SYSTEM_PROMPT), history + turn(10)[:1])
+    assert len(summarized) == 1
+    assert messages[1]['content'] == "Summary of the earlier conversation: short"
+    # Only the newest turns that fit are kept, oldest dropped first
+    assert messages[2:] == turn(9) + turn(10)[:1]
+    assert context.build(dict(SYSTEM_PROMPT), history + turn(10)[:1]) == messages
+    assert len(summarized) == 1
@@ -0,0 +1,37 @@
+def ask(client, message, conversation_id=None, token=None):
+    body = {'message': message}
+    if conversation_id:
+        body['conversation_id'] = conversation_id
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    return client.post('/ask_gpt', json=body, headers=headers)
+
+def stored_replies(app_module, conversation_id):
+    _, messages = app_module.conversation_store.backend.load(conversation_id)
+    return [m['content'] for m in messages if m['role'] == 'assistant']
+
+def test_every_path_records_the_raw_reply(app_module, client, openai_stub, spoonacular_stub):
+    first = ask(client, "banana bread").get_json()
+    assert "](https://amzn.to/" in first['reply']
+    raw = openai_stub.reply_for([{'role': 'user', 'content': "banana bread"}])
+    assert stored_replies(app_module, first['conversation_id']) == [raw]
+
+    # Served from the semantic cache, but stored exactly as the GPT path stored it
+    second = ask(client, "easy banana bread").get_json()
+    assert len(openai_stub.calls) == 1
+    assert stored_replies(app_module, second['conversation_id']) == [raw]
+
+def test_conversation_is_bound_to_its_user(app_module, client, openai_stub, spoonacular_stub):
+    owner = app_module.generate_token('conversation-owner')
+    other = app_module.generate_token('someone-else')
+    conversation_id = ask(client, "banana bread", token=owner).get_json()['conversation_id']
+
+    assert ask(client, "make it vegan", conversation_id, token=other).status_code == 404
+    assert ask(client, "make it vegan", conversation_id).status_code == 404
+    assert ask(client, "make it vegan", conversation_id, token=owner).status_code == 200
+
+def test_anonymous_conversation_stays_open_to_its_id(client, openai_stub, spoonacular_stub):
+    conversation_id = ask(client, "banana bread").get_json()['conversation_id']
+    assert ask(client, "make it vegan", conversation_id).status_code == 200
+
+def test_unknown_conversation_is_not_found(client, openai_stub, spoonacular_stub):
+    assert ask(client, "banana bread", "no-such-conversation").status_code == 404
@@ -0,0 +1,18 @@
+import pytest
+
+from conftest import db
+
+@pytest.fixture
+def headers(app_module):
+    db.collection('users').document('pantry-user').set({'pantry': ['flour', 'eggs'], 'pantry_version': 3})
+    app_module.user_cache.invalidate('pantry-user')
+    return {'Authorization': f"Bearer {app_module.generate_token('pantry-user')}"}
+
+def test_rename_missing_item_is_not_found_and_keeps_version(client, headers):
+    response = client.post('/pantry/items/rename', json={'from': 'sugar', 'to': 'brown sugar'}, headers=headers)
+    assert response.status_code == 404
+    assert db.collection('users').document('pantry-user').get().to_dict() == {'pantry': ['flour', 'eggs'], 'pantry_version': 3}
+
+def test_rename_existing_item_bumps_version(client, headers):
+    response = client.post('/pantry/items/rename', json={'from': 'eggs', 'to': 'duck eggs'}, headers=headers)
+    assert response.get_json() == {'pantry': ['flour', 'duck eggs'], 'version': 4}
@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import password_hashing
+from password_hashing import PasswordHasher, PasswordHasherBusy
+
+def slow_hash(password, rounds):
+    time.sleep(0.5)
+    return 'hashed'
+
+@pytest.fixture
+def hasher(monkeypatch):
+    monkeypatch.setattr(password_hashing, '_hash', slow_hash)
+    hasher = PasswordHasher(rounds=1000, workers=1, max_pending=1, timeout=0.05)
+    # Threads instead of processes, so the monkeypatched _hash is the one that runs
+    hasher.executor = ThreadPoolExecutor(max_workers=1)
+    yield hasher
+    hasher.executor.shutdown(wait=True)
+
+def test_timeout_raises_busy_and_keeps_the_slot_until_the_hash_finishes(hasher):
+    with pytest.raises(PasswordHasherBusy, match="timed out"):
+        hasher.hash('secret')
+    # The timed-out hash is still running, so the queue is still full
+    with pytest.raises(PasswordHasherBusy, match="in progress"):
+        hasher.hash('secret')
+    assert hasher.stats()['timed_out'] == 1
+    assert hasher.stats()['rejected'] == 1
+
+    time.sleep(0.6)
+    hasher.timeout = 5
+    assert hasher.hash('secret') == 'hashed'
+
+def test_register_answers_503_when_hashing_times_out(client, app_module, monkeypatch):
+    def timed_out(password):
+        raise PasswordHasherBusy("Password hashing timed out")
+
+    monkeypatch.setattr(app_module.password_hasher, 'hash', timed_out)
+    monkeypatch.setattr(app_module, 'validate_email', lambda email: None)  # no DNS lookups in tests
+    response = client.post('/register', json={
+        'username': 'slowhash', 'email': 'slowhash@example.com', 'password': 'Str0ng!Passw0rd'
+    })
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+def test_pool_workers_are_not_forked_from_the_threaded_parent():
+    hasher = PasswordHasher(rounds=1000, workers=1)
+    try:
+        hashed = hasher.hash('secret')
+        assert hasher.verify('secret', hashed)
+        assert hasher.executor._mp_context.get_start_method() == 'forkserver'
+    finally:
+        hasher.executor.shutdown(wait=True)
@@ -0,0 +1,29 @@
+import pytest
+
+@pytest.fixture
+def limiter(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.limiter, 'enabled', True)
+    app_module.limiter.reset()
+    yield app_module.limiter
+    app_module.limiter.reset()
+
+def counters(limiter):
+    return {key: len(events) for key, events in limiter.storage.events.items() if events}
+
+def test_flask_and_asgi_share_route_limit_counters(limiter, app_module, client, asgi_client, openai_stub, spoonacular_stub):
+    body = {'messages': [{'role': 'user', 'content': 'banana bread'}]}
+    headers = {'Authorization': f"Bearer {app_module.generate_token('rate-limit-user')}"}
+    assert client.post('/ask_gpt', json=body, headers=headers).status_code == 200
+    flask_counters = counters(limiter)
+    assert list(flask_counters) == ['LIMITER/kitchen/user:rate-limit-user/ask_gpt/10/1/minute']
+
+    assert asgi_client.post('/ask_gpt', json=body, headers=headers).status_code == 200
+    assert counters(limiter) == {key: 2 for key in flask_counters}
+
+def test_asgi_applies_default_limits_with_flask_keys(limiter, app_module, asgi_client):
+    token = app_module.generate_token('rate-limit-user')
+    asgi_client.get('/get_pantry', headers={'Authorization': f'Bearer {token}'})
+    assert sorted(counters(limiter)) == [
+        'LIMITER/kitchen/user:rate-limit-user/get_pantry/200/1/day',
+        'LIMITER/kitchen/user:rate-limit-user/get_pantry/50/1/hour',
+    ]
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+import pytest
+
+import asgi
+from conftest import db
+
+@pytest.fixture
+def headers(app_module):
+    recipes = db.collection('users').document('recipe-user').collection('recipes')
+    for n in range(5):
+        recipes.document(f"r{n}").set({'title': f"Recipe {n}", 'created_at': f"2026-01-0{n + 1}"})
+    return {'Authorization': f"Bearer {app_module.generate_token('recipe-user')}"}
+
+@pytest.mark.parametrize("query", ["limit=2", "limit=2&start_after=r1", "limit=5", "order_by=-created_at&limit=3", ""])
+def test_streamed_recipes_match_the_paged_response(client, headers, query):
+    paged = client.get(f"/get_recipes?{query}", headers=headers).get_json()
+    streamed = client.get(f"/get_recipes?{query}&stream=1", headers=headers)
+    assert json.loads(streamed.get_data(as_text=True)) == paged
+
+def test_streamed_page_ends_with_next_cursor(client, headers):
+    body = json.loads(client.get("/get_recipes?limit=2&stream=1", headers=headers).get_data(as_text=True))
+    assert [r['id'] for r in body['recipes']] == ['r0', 'r1']
+    assert body['next_cursor'] == 'r1'
+
+def test_asgi_stream_ends_with_next_cursor(headers):
+    async def docs():
+        for doc in db.collection('users').document('recipe-user').collection('recipes').stream():
+            yield doc
+
+    async def body(limit):
+        return json.loads(''.join([part async for part in asgi.stream_recipes(docs(), limit)]))
+
+    page = asyncio.run(body(2))
+    assert [r['id'] for r in page['recipes']] == ['r0', 'r1']
+    assert page['next_cursor'] == 'r1'
+    assert asyncio.run(body(5))['next_cursor'] is None
+    assert [r['id'] for r in asyncio.run(body(None))] == ['r0', 'r1', 'r2', 'r3', 'r4']
@@ -0,0 +1,24 @@
+import pytest
+
+@pytest.fixture
+def register(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'validate_email', lambda email: None)  # no DNS lookups in tests
+    monkeypatch.setattr(app_module, 'send_email', lambda *args, **kwargs: None)
+    hashes = []
+    monkeypatch.setattr(app_module.password_hasher, 'hash', lambda password: hashes.append(password) or 'hashed')
+
+    def post(username, email):
+        return client.post('/register', json={'username': username, 'email': email, 'password': 'Str0ng!Passw0rd'})
+
+    post.hashes = hashes
+    return post
+
+def test_taken_username_or_email_is_rejected_before_hashing(register):
+    assert register('taken-name', 'taken@example.com').status_code == 201
+    assert len(register.hashes) == 1
+
+    response = register('taken-name', 'other@example.com')
+    assert (response.status_code, response.get_json()) == (400, {'error': 'Username already exists'})
+    response = register('other-name', 'taken@example.com')
+    assert (response.status_code, response.get_json()) == (400, {'error': 'Email already exists'})
+    assert len(register.hashes) == 1
@@ -0,0 +1,33 @@
+import time
+
+from auth_cache import RevocationList, token_digest
+from fake_firestore import FakeFirestore
+
+def stored(db):
+    return {doc.id for doc in db.collection('revoked_tokens').stream()}
+
+def test_workers_poll_only_new_revocations():
+    db = FakeFirestore()
+    now = time.time()
+    worker, other = RevocationList(db, overlap=0), RevocationList(db, overlap=0)
+    other.revoke('old-token', now + 3600)
+    worker.load()
+    assert worker.is_revoked('old-token')
+
+    other.revoke('new-token', now + 3600)
+    # Backdated past the last poll, so an incremental poll must skip it
+    db.collection('revoked_tokens').document('backdated').set({'exp': now + 3600, 'created_at': now - 600})
+    worker.load()
+    assert worker.is_revoked('new-token')
+    assert 'backdated' not in worker.revoked
+
+def test_entries_are_deleted_after_token_exp():
+    db = FakeFirestore()
+    revocations = RevocationList(db)
+    revocations.revoke('expiring', time.time() + 0.05)
+    revocations.revoke('live', time.time() + 3600)
+    time.sleep(0.1)
+    revocations.load()
+    assert not revocations.is_revoked('expiring')
+    assert revocations.is_revoked('live')
+    assert stored(db) == {token_digest('live')}
@@ -0,0 +1,52 @@
+import random
+import re
+
+import pytest
+
+from sanitize import BATCH_SEPARATOR, sanitize_input, sanitize_inputs
+
+def legacy_sanitize_input(text):
+    """The implementation sanitize_input replaced"""
+    if not isinstance(text, str):
+        return ""
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'<script.*?>.*?</script>', '', text, flags=re.DOTALL)
+    text = re.sub(r'[<>{}[\]\\]', '', text)
+    return text.strip()
+
+EDGE_CASES = [
+    "", "   ", "plain text", "  padded  ", "<>", "<<>>", "a < b > c", "a<b", "a>b", "<", ">",
+    "<b>bold</b>", "<script>alert(1)</script>", "<script src=x>alert(1)</script>after",
+    "<scr<script>ipt>alert(1)</script>", "<a<b>c>", "<<script>>", "</script>", "<script",
+    "<img src='x' onerror='alert(1)'>", "{{ template }}", "[link](url)", "back\\slash",
+    "multi\nline <i\n>tag</i>", "tab\there", "ünïcödé <b>tëxt</b> ✓",
+    "2 cups flour", "1 tbsp butter, softened", "salt [to taste]", "<p>Mix {well}</p>\\n",
+    None, 42, ["not", "a", "string"],
+]
+
+# Inputs containing the batch separator, which sanitize_inputs must not split or strip on
+SEPARATOR_CASES = [
+    "\x1f", "\x1f edge \x1f", "a\x1fb", "a\x1fb<c\x1fd>e", "<b\x1f>x</b>", "\x1f<i>\x1f</i>\x1f", "  \x1f  ",
+]
+
+@pytest.mark.parametrize("text", EDGE_CASES + SEPARATOR_CASES)
+def test_matches_legacy_output(text):
+    assert sanitize_input(text) == legacy_sanitize_input(text)
+
+@pytest.mark.parametrize("items", [EDGE_CASES, SEPARATOR_CASES, EDGE_CASES + SEPARATOR_CASES, ["x", "\x1f", "<b>y</b>"], []])
+def test_batch_matches_item_by_item(items):
+    assert sanitize_inputs(items) == [legacy_sanitize_input(item) for item in items]
+
+def test_tags_never_span_batch_items():
+    assert BATCH_SEPARATOR == "\x1f"
+    assert sanitize_inputs(["a <b", "c> d"]) == ["a b", "c d"]
+
+# With and without the separator, so both the joined fast path and the fallback are fuzzed
+@pytest.mark.parametrize("alphabet", ["ab <>/{}[]\\\n\tscript", "ab <>/{}[]\\\n\tscript\x1f"])
+def test_fuzzed_batches_match_legacy_output(alphabet):
+    rng = random.Random(42)
+    for _ in range(5000):
+        batch = [''.join(rng.choice(alphabet) for _ in range(rng.randrange(0, 24))) for _ in range(rng.randrange(1, 6))]
+        expected = [legacy_sanitize_input(item) for item in batch]
+        assert [sanitize_input(item) for item in batch] == expected, repr(batch)
+        assert sanitize_inputs(batch) == expected, repr(batch)
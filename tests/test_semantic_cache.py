@@ -0,0 +1,75 @@
+import pytest
+
+from semantic_cache import HashedNgramEmbedder, SemanticCache, key_terms
+from spoonacular import SpoonacularUnavailable
+
+NEAR_MISSES = [
+    ("banana bread with nuts", "banana bread without nuts"),
+    ("banana bread", "vegan banana bread"),
+    ("banana bread", "banana bread for 20 people"),
+    ("gluten free pancakes", "pancakes"),
+    ("chicken curry for 2", "chicken curry for 4"),
+]
+
+REPHRASINGS = [
+    ("easy banana bread", "simple banana bread recipe"),
+    ("Banana Bread!", "banana bread"),
+    ("please give me a chocolate chip cookies recipe", "chocolate chip cookie"),
+]
+
+@pytest.fixture
+def cache():
+    return SemanticCache(HashedNgramEmbedder(), capacity=16)
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES)
+def test_near_miss_prompts_do_not_share_a_response(cache, stored, asked):
+    cache.store(stored, {'reply': stored})
+    value, _ = cache.lookup(asked)
+    assert value is None
+
+@pytest.mark.parametrize("stored, asked", REPHRASINGS)
+def test_rephrasings_share_a_response(cache, stored, asked):
+    cache.store(stored, {'reply': stored})
+    value, score = cache.lookup(asked)
+    assert value == {'reply': stored}
+    assert score >= cache.threshold
+
+def test_key_terms_keep_negation_diet_and_quantity_words():
+    assert key_terms("banana bread with nuts") != key_terms("banana bread without nuts")
+    assert key_terms("Banana breads for 20 people") == ['20', 'banana', 'bread', 'people']
+
+def test_context_must_match(cache):
+    cache.store("banana bread", {'reply': 'x'}, context='a')
+    assert cache.lookup("banana bread", context='b')[0] is None
+    assert cache.lookup("banana bread", context='a')[0] == {'reply': 'x'}
+
+def ask(client, prompt):
+    response = client.post('/ask_gpt', json={'messages': [{'role': 'user', 'content': prompt}]})
+    assert response.status_code == 200
+    return response.get_json()
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES)
+def test_ask_gpt_calls_openai_again_for_near_miss(client, openai_stub, spoonacular_stub, stored, asked):
+    first = ask(client, stored)
+    second = ask(client, asked)
+    assert openai_stub.prompts == [stored, asked]
+    assert f"Recipe for {stored}\n" in first['reply']
+    assert f"Recipe for {asked}\n" in second['reply']
+
+def test_ask_gpt_serves_rephrasing_from_cache(client, openai_stub, spoonacular_stub):
+    ask(client, "easy banana bread")
+    second = ask(client, "simple banana bread recipe")
+    assert openai_stub.prompts == ["easy banana bread"]
+    assert second['reply'].startswith("🍽️ Recipe: Simple Banana Bread Recipe")
+
+def test_ask_gpt_caches_answer_without_spoonacular_results(client, openai_stub, spoonacular_stub):
+    ask(client, "grandmas mystery stew")
+    ask(client, "easy grandmas mystery stew")
+    assert len(openai_stub.calls) == 1
+
+def test_ask_gpt_does_not_cache_after_spoonacular_error(client, openai_stub, spoonacular_stub):
+    spoonacular_stub.error = SpoonacularUnavailable("down")
+    ask(client, "banana bread")
+    spoonacular_stub.error = None
+    ask(client, "easy banana bread")
+    assert len(openai_stub.calls) == 2
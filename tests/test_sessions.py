@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+import pytest
+from flask import Flask, session
+
+from session_store import SQLiteSessionBackend, StoredSessionInterface
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteSessionBackend(str(tmp_path / "sessions.sqlite3"))
+
+@pytest.fixture
+def client(backend):
+    app = Flask(__name__)
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
+    app.session_interface = StoredSessionInterface(backend)
+
+    @app.route('/visit')
+    def visit():
+        session['visits'] = session.get('visits', 0) + 1
+        return {'visits': session['visits']}
+
+    @app.route('/login')
+    def login():
+        session.regenerate()
+        session['user_id'] = 'alice'
+        return {}
+
+    return app.test_client()
+
+def sid_cookie(response):
+    cookie = response.headers['Set-Cookie']
+    return cookie.split(';')[0].split('=', 1)[1], cookie
+
+def test_unknown_session_id_is_replaced(client, backend):
+    client.set_cookie('session', 'planted-by-attacker')
+    response = client.get('/visit')
+    sid, _ = sid_cookie(response)
+    assert sid != 'planted-by-attacker'
+    assert backend.get('planted-by-attacker') is None
+    assert backend.get(sid) == {'visits': 1}
+
+def test_login_rotates_session_id(client, backend):
+    before, _ = sid_cookie(client.get('/visit'))
+    after, _ = sid_cookie(client.get('/login'))
+    assert after != before
+    assert backend.get(before) is None
+    assert backend.get(after) == {'visits': 1, 'user_id': 'alice'}
+    assert client.get('/visit').get_json() == {'visits': 2}
+
+def test_cookie_expires_with_permanent_session_lifetime(client):
+    _, cookie = sid_cookie(client.get('/visit'))
+    expires = parsedate_to_datetime(cookie.split('Expires=')[1].split(';')[0])
+    assert abs(expires - (datetime.now(timezone.utc) + timedelta(days=7))) < timedelta(minutes=1)
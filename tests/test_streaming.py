@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+
+import asgi
+from streaming import wants_event_stream
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, False),
+    ("application/json", False),
+    ("text/event-stream", True),
+    ("application/json, text/event-stream", False),
+    ("application/json;q=0.5, text/event-stream", True),
+    ("text/event-stream;q=0.1, application/json", False),
+])
+def test_highest_quality_type_wins(accept, expected):
+    assert wants_event_stream(accept) is expected
+
+class AsyncOpenAIStub:
+    def __init__(self, sync_stub):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.sync_stub = sync_stub
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        response = self.sync_stub.create(model, messages, stream=stream, **kwargs)
+        if not stream:
+            return response
+
+        async def chunks():
+            for chunk in response:
+                yield chunk
+        return chunks()
+
+@pytest.mark.parametrize("accept", ["application/json;q=0.5, text/event-stream", "text/event-stream;q=0.1, application/json"])
+def test_flask_and_asgi_routes_agree_on_streaming(client, asgi_client, openai_stub, spoonacular_stub, monkeypatch, accept):
+    monkeypatch.setattr(asgi, 'async_openai_client', AsyncOpenAIStub(openai_stub))
+    body = {'messages': [{'role': 'user', 'content': 'banana bread'}]}
+    flask_type = client.post('/ask_gpt', json=body, headers={'Accept': accept}).headers['Content-Type']
+    asgi_type = asgi_client.post('/ask_gpt', json=body, headers={'Accept': accept}).headers['content-type']
+    assert flask_type.split(';')[0] == asgi_type.split(';')[0]
@@ -0,0 +1,113 @@
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from cachetools import TTLCache
+
+from metrics import firestore_timer
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()  # Cached marker for "this user document does not exist"
+
+class UserDocCache:
+    """Short-lived, in-process cache of users/{user_id} documents.
+
+    Reads go through get(); routes that write a user document call update()
+    or invalidate() so their own changes are visible immediately. Writes made
+    by other workers are picked up when the TTL expires, or straight away when
+    snapshot listeners are enabled.
+    """
+
+    def __init__(self, db, ttl=30, max_entries=1000, listen=False, max_listeners=200, collection='users'):
+        self.db = db
+        self.collection = collection
+        self.cache = TTLCache(maxsize=max_entries, ttl=ttl)
+        self.lock = threading.Lock()
+        self.listen = listen
+        self.max_listeners = max_listeners
+        self.listeners = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Return a copy of the user's document data, or None if it does not exist"""
+        found, data = self.lookup(user_id)
+        if found:
+            return data
+        with firestore_timer('read'):
+            doc = self.db.collection(self.collection).document(user_id).get()
+        return self.store(user_id, doc.to_dict() if doc.exists else None)
+
+    def lookup(self, user_id):
+        """Return (found, data) without touching Firestore, for callers that do their own reads"""
+        with self.lock:
+            data = self.cache.get(user_id)
+            if data is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, None if data is MISSING else copy.deepcopy(data)
+
+    def store(self, user_id, data):
+        """Cache data read from Firestore (None for a missing document) and return a copy"""
+        with self.lock:
+            self.cache[user_id] = MISSING if data is None else copy.deepcopy(data)
+        if self.listen:
+            self._watch(user_id)
+        return data
+
+    def update(self, user_id, fields):
+        """Apply fields we just wrote to Firestore to the cached copy"""
+        with self.lock:
+            data = self.cache.get(user_id)
+            if data is None or data is MISSING:
+                # Nothing cached, or the write created the document; read it fresh next time
+                self.cache.pop(user_id, None)
+                return
+            data.update(copy.deepcopy(fields))
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.cache.pop(user_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.cache), 'listeners': len(self.listeners)}
+
+    def _watch(self, user_id):
+        """Keep the entry fresh from a Firestore snapshot listener"""
+        with self.lock:
+            if user_id in self.listeners:
+                self.listeners.move_to_end(user_id)
+                return
+            evicted = self.listeners.popitem(last=False) if len(self.listeners) >= self.max_listeners else None
+
+        if evicted:
+            evicted[1].unsubscribe()
+
+        def on_snapshot(doc_snapshots, changes, read_time):
+            for snapshot in doc_snapshots:
+                with self.lock:
+                    if user_id in self.cache:
+                        self.cache[user_id] = snapshot.to_dict() if snapshot.exists else MISSING
+
+        try:
+            watch = self.db.collection(self.collection).document(user_id).on_snapshot(on_snapshot)
+        except Exception as e:
+            logger.warning(f"Failed to watch user document: {str(e)}")
+            return
+        with self.lock:
+            self.listeners[user_id] = watch
+
+def create_user_cache(db):
+    """Build the user document cache from USER_CACHE_* environment variables"""
+    return UserDocCache(
+        db,
+        ttl=int(os.getenv("USER_CACHE_TTL_SECONDS", "30")),
+        max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "1000")),
+        listen=os.getenv("USER_CACHE_LISTEN", "false").lower() == "true",
+        max_listeners=int(os.getenv("USER_CACHE_MAX_LISTENERS", "200"))
+    )
@@ -0,0 +1,194 @@
+"""Lookup documents that resolve usernames, emails and one-time tokens to users.
+
+usernames/{username} and emails/{email} hold {'user_id'}, so a login or a
+uniqueness check is a direct document get instead of a query on users.
+tokens/{sha256(token)} holds {'user_id', 'purpose', 'expires_at'} for
+outstanding email verification and password reset links; the token itself
+stays on the user document, and only the copy there is trusted.
+
+Users registered before these collections existed are still found through
+the old field queries while USER_INDEX_LEGACY_LOOKUPS is on (the default);
+a hit writes the missing index document. Run ``python user_index.py`` once
+to index every existing user, after which the fallback can be switched off.
+"""
+import hashlib
+import logging
+import os
+from datetime import datetime
+from urllib.parse import quote
+
+from firebase_admin import firestore
+
+from metrics import firestore_timer
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLLECTIONS = {'username': 'usernames', 'email': 'emails'}
+TOKEN_FIELDS = {'verify': 'verification_token', 'reset': 'reset_token'}
+
+LEGACY_LOOKUPS = os.getenv("USER_INDEX_LEGACY_LOOKUPS", "true").lower() == "true"
+
+class AlreadyRegistered(Exception):
+    """Raised by create_user when the username or email is already taken"""
+
+    def __init__(self, field):
+        super().__init__(f"{field} already registered")
+        self.field = field
+
+def index_key(value):
+    # Document ids may not contain '/'; escape it (and '%') rather than reject it
+    return quote(value, safe='')
+
+def token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def index_ref(db, field, value):
+    return db.collection(INDEX_COLLECTIONS[field]).document(index_key(value))
+
+def token_ref(db, token):
+    return db.collection('tokens').document(token_key(token))
+
+def token_entry(user_id, purpose, expires_at):
+    return {'user_id': user_id, 'purpose': purpose, 'expires_at': expires_at}
+
+def check_available(db, user_data):
+    """Raise AlreadyRegistered if the username or email is already taken.
+
+    One get_all of the index documents (plus the legacy queries while they
+    are on), cheap enough to run before hashing the password. It is only a
+    pre-check: create_user's transaction still decides.
+    """
+    refs = [(field, index_ref(db, field, user_data[field])) for field in INDEX_COLLECTIONS]
+    with firestore_timer('read'):
+        taken = {snapshot.reference.path for snapshot in db.get_all([ref for _, ref in refs]) if snapshot.exists}
+    for field, ref in refs:
+        if ref.path in taken:
+            raise AlreadyRegistered(field)
+    if LEGACY_LOOKUPS:
+        for field, _ in refs:
+            if _legacy_query(db, field, user_data[field]) is not None:
+                raise AlreadyRegistered(field)
+
+def create_user(db, user_id, user_data, verification_expires=None):
+    """Create users/{user_id} and its index documents in one transaction.
+
+    The username and email claims are read and written in the same
+    transaction, so two concurrent registrations cannot both take a name.
+    Raises AlreadyRegistered naming the field that is taken. Users that
+    exist only under the legacy fields are caught by check_available, which
+    callers run first.
+    """
+    user_ref = db.collection('users').document(user_id)
+    claims = [(field, index_ref(db, field, user_data[field])) for field in INDEX_COLLECTIONS]
+
+    @firestore.transactional
+    def run(transaction):
+        refs = [ref for _, ref in claims]
+        taken = {snapshot.reference.path for snapshot in db.get_all(refs, transaction=transaction) if snapshot.exists}
+        for field, ref in claims:
+            if ref.path in taken:
+                raise AlreadyRegistered(field)
+        transaction.create(user_ref, user_data)
+        for _, ref in claims:
+            transaction.create(ref, {'user_id': user_id})
+        token = user_data.get('verification_token')
+        if token:
+            transaction.set(token_ref(db, token), token_entry(user_id, 'verify', verification_expires))
+
+    with firestore_timer('transaction'):
+        run(db.transaction())
+
+def find_user(db, field, value):
+    """users/{id} snapshot for the user with this username or email, or None"""
+    with firestore_timer('read'):
+        entry = index_ref(db, field, value).get()
+        if entry.exists:
+            user_doc = db.collection('users').document(entry.get('user_id')).get()
+            if user_doc.exists and user_doc.to_dict().get(field) == value:
+                return user_doc
+            return None
+    if not LEGACY_LOOKUPS:
+        return None
+    user_doc = _legacy_query(db, field, value)
+    if user_doc is not None:
+        with firestore_timer('write'):
+            index_ref(db, field, value).set({'user_id': user_doc.id})
+    return user_doc
+
+def find_token_user(db, purpose, token):
+    """users/{id} snapshot whose current verification or reset token is this one, or None"""
+    field = TOKEN_FIELDS[purpose]
+    with firestore_timer('read'):
+        entry = token_ref(db, token).get()
+        if entry.exists:
+            if entry.get('purpose') != purpose:
+                return None
+            user_doc = db.collection('users').document(entry.get('user_id')).get()
+            # A newer token replaces the old one on the user document
+            if user_doc.exists and user_doc.to_dict().get(field) == token:
+                return user_doc
+            return None
+    if not LEGACY_LOOKUPS:
+        return None
+    return _legacy_query(db, field, token)
+
+def issue_token(db, user_doc, purpose, token, expires_at):
+    """Store a new verification or reset token on the user and in tokens/, replacing any previous one"""
+    field = TOKEN_FIELDS[purpose]
+    batch = db.batch()
+    previous = user_doc.to_dict().get(field)
+    if previous:
+        batch.delete(token_ref(db, previous))
+    batch.update(user_doc.reference, {field: token, f"{field}_expires": expires_at.isoformat()})
+    batch.set(token_ref(db, token), token_entry(user_doc.id, purpose, expires_at))
+    with firestore_timer('write'):
+        batch.commit()
+
+def consume_token(db, user_doc, purpose, updates):
+    """Apply updates to the user, clear the token and delete its tokens/ document, in one batch"""
+    field = TOKEN_FIELDS[purpose]
+    token = user_doc.to_dict().get(field)
+    batch = db.batch()
+    batch.update(user_doc.reference, {**updates, field: None, f"{field}_expires": None})
+    if token:
+        batch.delete(token_ref(db, token))
+    with firestore_timer('write'):
+        batch.commit()
+
+def _legacy_query(db, field, value):
+    with firestore_timer('read'):
+        query = db.collection('users').where(field, '==', value).limit(1).get()
+    return query[0] if len(query) > 0 else None
+
+def backfill(db, batch_size=200):
+    """Write index and token documents for every existing user; returns the number of users"""
+    count = 0
+    batch = db.batch()
+    pending = 0
+    for user_doc in db.collection('users').stream():
+        data = user_doc.to_dict()
+        for field in INDEX_COLLECTIONS:
+            if data.get(field):
+                batch.set(index_ref(db, field, data[field]), {'user_id': user_doc.id})
+                pending += 1
+        for purpose, field in TOKEN_FIELDS.items():
+            if data.get(field) and data.get(f"{field}_expires"):
+                expires_at = datetime.fromisoformat(data[f"{field}_expires"])
+                batch.set(token_ref(db, data[field]), token_entry(user_doc.id, purpose, expires_at))
+                pending += 1
+        count += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return count
+
+if __name__ == "__main__":
+    import firebase_admin
+    from firebase_admin import credentials
+
+    logging.basicConfig(level=logging.INFO)
+    firebase_admin.initialize_app(credentials.Certificate("firebase-service-account.json"))
+    logger.info(f"Indexed {backfill(firestore.client())} users")